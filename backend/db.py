@@ -1,8 +1,18 @@
+import logging
 import os
+import time
+from typing import Any, Callable, Optional
 from urllib.parse import quote_plus
 from dotenv import load_dotenv
 from sqlalchemy import create_engine, event
+from sqlalchemy.exc import DisconnectionError
 from sqlalchemy.orm import sessionmaker
+from starlette.requests import Request
+
+from utils.read_replicas import Replica, ReplicaSet, StickyWrites, client_key, parse_hosts
+
+
+logger = logging.getLogger(__name__)
 
 """Carga robusta del .env con fallback de codificación (Windows cp1252, latin-1)."""
 # Cargar .env desde la carpeta backend
@@ -30,45 +40,329 @@ DB_CLIENT_ENCODING = os.getenv("DB_CLIENT_ENCODING", "UTF8")
 os.environ["PGCLIENTENCODING"] = DB_CLIENT_ENCODING
 
 
-def _make_engine():
+def _env_number(name: str, default, cast=int):
+    try:
+        return cast(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+# Pool de conexiones (por proceso). Con varios workers de uvicorn el maximo de
+# conexiones a PostgreSQL es workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) por motor.
+DB_POOL_SIZE = max(1, _env_number("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = max(0, _env_number("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = max(0.0, _env_number("DB_POOL_TIMEOUT", 30.0, float))
+DB_POOL_RECYCLE = _env_number("DB_POOL_RECYCLE", 1800)
+# always: SELECT 1 en cada checkout; idle: solo si la conexion llevaba
+# DB_POOL_PRE_PING_IDLE segundos sin usarse; never: sin pre-ping.
+DB_POOL_PRE_PING = (os.getenv("DB_POOL_PRE_PING", "always") or "always").strip().lower()
+DB_POOL_PRE_PING_IDLE = max(0.0, _env_number("DB_POOL_PRE_PING_IDLE", 30.0, float))
+
+
+def _pool_kwargs(base_pool) -> dict:
+    from utils.pool_metrics import timed_pool_class
+
+    return {
+        "poolclass": timed_pool_class(base_pool),
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING not in {"idle", "never", "false", "0", "no"},
+    }
+
+
+def _instrument(name: str, eng) -> None:
+    from utils.pool_metrics import instrument_engine
+    from utils.sql_instrumentation import instrument_sql
+
+    instrument_engine(name, eng, DB_POOL_PRE_PING_IDLE if DB_POOL_PRE_PING == "idle" else None)
+    instrument_sql(eng)
+
+
+def _set_client_encoding(dbapi_connection, connection_record):
+    try:
+        dbapi_connection.set_client_encoding(DB_CLIENT_ENCODING)
+    except Exception:
+        pass
+
+
+def _connect_timeout_args(driver: str, seconds: Optional[float]) -> dict:
+    if not seconds:
+        return {}
+    # libpq (psycopg2/psycopg) usa segundos enteros; asyncpg y pg8000 aceptan "timeout".
+    if driver.startswith("psycopg"):
+        return {"connect_timeout": max(1, int(round(seconds)))}
+    return {"timeout": float(seconds)}
+
+
+def _make_engine(host: str = DB_HOST, port: str = DB_PORT, name: str = "sync", connect_timeout: Optional[float] = None):
+    from sqlalchemy.pool import QueuePool
+
     if DB_DRIVER == "psycopg2":
         connect_args = {
             "user": DB_USER,
             "password": DB_PASS,
-            "host": DB_HOST,
+            "host": host,
             "dbname": DB_NAME,
             "options": f"-c client_encoding={DB_CLIENT_ENCODING}",
+            **_connect_timeout_args(DB_DRIVER, connect_timeout),
         }
-        if DB_PORT:
+        if port:
             try:
-                connect_args["port"] = int(DB_PORT)
+                connect_args["port"] = int(port)
             except ValueError:
                 pass
-        eng = create_engine("postgresql+psycopg2://", connect_args=connect_args, pool_pre_ping=True)
+        eng = create_engine("postgresql+psycopg2://", connect_args=connect_args, **_pool_kwargs(QueuePool))
     else:
         url = (
             f"postgresql+{DB_DRIVER}://{quote_plus(DB_USER)}:{quote_plus(DB_PASS)}@"
-            f"{DB_HOST}:{DB_PORT}/{DB_NAME}"
+            f"{host}:{port}/{DB_NAME}"
         )
-        eng = create_engine(url, pool_pre_ping=True)
+        eng = create_engine(url, connect_args=_connect_timeout_args(DB_DRIVER, connect_timeout), **_pool_kwargs(QueuePool))
+    event.listen(eng, "connect", _set_client_encoding)
+    _instrument(name, eng)
     return eng
 
 
+# Replicas: "host[:puerto],host[:puerto]". Vacio = todo va al primario.
+read_replicas = ReplicaSet(
+    parse_hosts(os.getenv("DB_READ_HOSTS", ""), DB_PORT),
+    retry_seconds=max(1.0, _env_number("DB_READ_RETRY_SECONDS", 30.0, float)),
+)
+sticky_writes = StickyWrites(max(0.0, _env_number("DB_READ_STICKY_SECONDS", 10.0, float)))
+# Una replica caida se detecta al conectar: sin tope, la peticion esperaria el timeout TCP del sistema.
+DB_READ_CONNECT_TIMEOUT = max(1.0, _env_number("DB_READ_CONNECT_TIMEOUT", 3.0, float))
+
 engine = _make_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
-@event.listens_for(engine, "connect")
-def _set_client_encoding(dbapi_connection, connection_record):
+def get_db(request: Request = None):  # type: ignore[assignment]
+    db = SessionLocal()
+    # Tras un commit, las lecturas de este cliente van al primario un rato (read-your-writes).
+    db.info["client_key"] = client_key(request)
     try:
-        dbapi_connection.set_client_encoding(DB_CLIENT_ENCODING)
-    except Exception:
-        pass
+        yield db
+    finally:
+        db.close()
 
 
-def get_db():
-    db = SessionLocal()
+# --- Replicas de lectura (DB_READ_HOSTS) ---
+@event.listens_for(SessionLocal, "after_commit")
+def _mark_sticky_after_commit(session) -> None:
+    if read_replicas and session.info.get("client_key"):
+        sticky_writes.mark(session.info["client_key"])
+
+
+def _fall_back_to_primary(eng, replica: Replica) -> None:
+    """La replica se elige al abrir la sesion pero solo se conecta con la primera consulta real:
+    si esa conexion falla, la replica queda fuera y la consulta sigue en el primario."""
+    sync_engine = getattr(eng, "sync_engine", eng)
+
+    @event.listens_for(sync_engine, "do_connect")
+    def _connect(dialect, connection_record, cargs, cparams):
+        try:
+            dbapi_connection = dialect.connect(*cargs, **cparams)
+        except Exception as exc:
+            read_replicas.mark_failed(replica, exc)
+            primary = {k: v for k, v in cparams.items() if k not in {"connect_timeout", "timeout"}}
+            primary["host"] = DB_HOST
+            if DB_PORT.isdigit():
+                primary["port"] = int(DB_PORT)
+            connection_record.info["mb_primary_fallback"] = True
+            return dialect.connect(*cargs, **primary)
+        read_replicas.mark_ok(replica)
+        return dbapi_connection
+
+    @event.listens_for(sync_engine.pool, "checkout")
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        # Conexion al primario guardada en el pool de la replica: se rehace cuando la replica vuelve al turno.
+        if connection_record.info.get("mb_primary_fallback") and replica.healthy(time.monotonic()):
+            raise DisconnectionError("replica disponible de nuevo")
+
+
+def _replica_session_factory(replica: Replica):
+    if replica.session_factory is None:
+        replica_engine = _make_engine(
+            replica.host, replica.port, f"replica:{replica.label}", connect_timeout=DB_READ_CONNECT_TIMEOUT
+        )
+        _fall_back_to_primary(replica_engine, replica)
+        replica.session_factory = sessionmaker(autocommit=False, autoflush=False, bind=replica_engine)
+    return replica.session_factory
+
+
+def _pick_replica(request: Optional[Request]) -> Optional[Replica]:
+    """Siguiente replica sana (sin conectar todavia), o None para leer del primario."""
+    key = client_key(request)
+    if not read_replicas or (key and sticky_writes.active(key)):
+        return None
+    candidates = read_replicas.candidates()
+    if not candidates:
+        return None
+    read_replicas.mark_selected(candidates[0])
+    return candidates[0]
+
+
+def _open_read_session(request: Optional[Request]):
+    replica = _pick_replica(request)
+    if replica is not None:
+        try:
+            return _replica_session_factory(replica)()
+        except Exception as exc:
+            read_replicas.mark_failed(replica, exc)
+    return SessionLocal()
+
+
+def get_read_db(request: Request = None):  # type: ignore[assignment]
+    """Sesion de solo lectura: una replica sana (round-robin) o el primario."""
+    db = _open_read_session(request)
     try:
         yield db
     finally:
         db.close()
+
+
+# --- Capa asincrona (asyncpg) para las rutas de lectura ---
+# Los scripts y las rutas de escritura siguen usando ``engine``/``get_db``.
+DB_ASYNC_DRIVER = (os.getenv("DB_ASYNC_DRIVER", "asyncpg") or "asyncpg").strip()
+_async_sessionmaker = None
+_async_unavailable: Optional[str] = None
+
+
+def async_db_enabled() -> bool:
+    return os.getenv("DB_ASYNC", "true").lower() in {"1", "true", "yes"}
+
+
+def _make_async_engine(
+    host: str = DB_HOST, port_value: str = DB_PORT, name: str = "async", connect_timeout: Optional[float] = None
+):
+    from sqlalchemy.engine import URL
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+    port: Optional[int] = None
+    try:
+        port = int(port_value) if port_value else None
+    except ValueError:
+        port = None
+    url = URL.create(
+        f"postgresql+{DB_ASYNC_DRIVER}",
+        username=DB_USER,
+        password=DB_PASS,
+        host=host,
+        port=port,
+        database=DB_NAME,
+    )
+    eng = create_async_engine(
+        url, connect_args=_connect_timeout_args(DB_ASYNC_DRIVER, connect_timeout), **_pool_kwargs(AsyncAdaptedQueuePool)
+    )
+    _instrument(name, eng)
+    return eng
+
+
+def get_async_sessionmaker():
+    """async_sessionmaker sobre asyncpg, o None si el driver no esta instalado."""
+    global _async_sessionmaker, _async_unavailable
+    if _async_sessionmaker is None and _async_unavailable is None and async_db_enabled():
+        try:
+            import greenlet  # noqa: F401  (run_sync lo necesita)
+            from sqlalchemy.ext.asyncio import async_sessionmaker
+
+            _async_sessionmaker = async_sessionmaker(_make_async_engine(), autoflush=False, expire_on_commit=False)
+        except Exception as exc:  # asyncpg o greenlet ausentes
+            _async_unavailable = str(exc)
+            logger.warning("Capa asincrona de BD no disponible (%s); se usara el motor sincrono en hilos", exc)
+    return _async_sessionmaker
+
+
+class ThreadedSession:
+    """Misma interfaz ``run_sync`` que ``AsyncSession`` pero sobre una sesion sincrona en el threadpool."""
+
+    def __init__(self, session: Optional[Any] = None) -> None:
+        self._session = session if session is not None else SessionLocal()
+
+    async def run_sync(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        from starlette.concurrency import run_in_threadpool
+
+        return await run_in_threadpool(fn, self._session, *args, **kwargs)
+
+    async def close(self) -> None:
+        self._session.close()
+
+
+try:
+    from sqlalchemy.ext.asyncio import AsyncSession as AsyncDB
+except ImportError:  # sin greenlet
+    AsyncDB = ThreadedSession  # type: ignore[misc,assignment]
+
+
+async def _ensure_schema_off_loop() -> None:
+    # La primera reflexion del esquema usa el motor sincrono: dentro de AsyncSession.run_sync
+    # bloquearia el event loop, asi que se hace antes en el threadpool.
+    from starlette.concurrency import run_in_threadpool
+    from utils.schema_registry import schema_registry
+
+    if not schema_registry.loaded:
+        try:
+            await run_in_threadpool(schema_registry.ensure, engine)
+        except Exception as exc:
+            logger.warning("No se pudo reflejar el esquema: %s", exc)
+
+
+async def get_async_db():
+    """Sesion para rutas ``async def``: ``await db.run_sync(helper, ...)`` ejecuta el helper sincrono
+    sobre la conexion asyncpg sin ocupar un hilo del threadpool."""
+    await _ensure_schema_off_loop()
+    factory = get_async_sessionmaker()
+    session = factory() if factory is not None else ThreadedSession()
+    try:
+        yield session
+    finally:
+        await session.close()
+
+
+async def _open_async_read_session(request: Optional[Request]):
+    factory = get_async_sessionmaker()
+    replica = _pick_replica(request)
+    if replica is not None:
+        try:
+            if factory is None:
+                return ThreadedSession(_replica_session_factory(replica)())
+            if replica.async_session_factory is None:
+                from sqlalchemy.ext.asyncio import async_sessionmaker
+
+                replica_engine = _make_async_engine(
+                    replica.host,
+                    replica.port,
+                    f"replica-async:{replica.label}",
+                    connect_timeout=DB_READ_CONNECT_TIMEOUT,
+                )
+                _fall_back_to_primary(replica_engine, replica)
+                replica.async_session_factory = async_sessionmaker(
+                    replica_engine, autoflush=False, expire_on_commit=False
+                )
+            return replica.async_session_factory()
+        except Exception as exc:
+            read_replicas.mark_failed(replica, exc)
+    return factory() if factory is not None else ThreadedSession()
+
+
+async def get_async_read_db(request: Request = None):  # type: ignore[assignment]
+    """Como ``get_async_db`` pero en una replica sana cuando hay ``DB_READ_HOSTS``."""
+    await _ensure_schema_off_loop()
+    session = await _open_async_read_session(request)
+    try:
+        yield session
+    finally:
+        await session.close()
+
+
+def get_threaded_read_db(request: Request = None):  # type: ignore[assignment]
+    """Sesion de lectura con ``run_sync`` en el threadpool, para rutas que ademas de consultar arman,
+    renderizan y serializan respuestas grandes: en ``AsyncSession.run_sync`` ese trabajo ocupa el event loop."""
+    db = _open_read_session(request)
+    try:
+        yield ThreadedSession(db)
+    finally:
+        db.close()
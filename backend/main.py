@@ -7,7 +7,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 from pydantic import ValidationError
 
-from db import get_db
+from db import get_read_db
 from routes import chat as chat_routes
 from routes import auth as auth_routes
 from routes import account as account_routes
@@ -15,6 +15,14 @@ from routes import users as users_routes
 from routes import alumnos as alumnos_routes
 from routes import lessons as lessons_routes
 from routes import teachers as teachers_routes
+from routes import admin as admin_routes
+from services.lesson_aliases import load_alias_index_at_startup
+from services.lesson_bm25 import load_bm25_index_at_startup
+from services.lesson_embeddings import load_semantic_index_at_startup
+from services.lesson_suggest import load_suggest_index_at_startup
+from services.lesson_corpus import load_lesson_corpus_at_startup
+from utils.schema_registry import load_schema_registry_at_startup
+from utils.sql_instrumentation import SQLTimingMiddleware
 
 
 app = FastAPI(title="MathBot.IA Backend")
@@ -31,7 +39,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
+app.add_middleware(SQLTimingMiddleware)
 
 app.include_router(chat_routes.router, prefix="/chat", tags=["chat"])
 app.include_router(auth_routes.router, prefix="/auth", tags=["auth"])
@@ -40,6 +50,17 @@ app.include_router(users_routes.router, prefix="/users", tags=["users"])
 app.include_router(alumnos_routes.router, prefix="/alumnos", tags=["alumnos"])
 app.include_router(teachers_routes.router, prefix="/teachers", tags=["teachers"])
 app.include_router(lessons_routes.router, prefix="/lessons", tags=["lessons"])
+app.include_router(admin_routes.router, prefix="/admin", tags=["admin"])
+
+
+@app.on_event("startup")
+def _warm_caches() -> None:
+    load_schema_registry_at_startup()
+    load_lesson_corpus_at_startup()
+    load_alias_index_at_startup()
+    load_bm25_index_at_startup()
+    load_semantic_index_at_startup()
+    load_suggest_index_at_startup()
 
 
 @app.get("/health")
@@ -78,7 +99,7 @@ def _normalize_payload(data: Dict[str, Any]) -> Dict[str, Any]:
 
 
 @app.post("/preguntar")
-async def preguntar(request: Request, db: Session = Depends(get_db)):
+async def preguntar(request: Request, db: Session = Depends(get_read_db)):
     raw_payload = await _extract_payload(request)
     payload = _normalize_payload(raw_payload)
     try:
@@ -0,0 +1,144 @@
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from sqlalchemy.orm import Session
+
+from db import get_db, read_replicas, sticky_writes
+from services.lesson_aliases import get_alias_index
+from services.lesson_bm25 import get_bm25_index
+from services.lesson_catalogue import catalogue_cache, invalidate_catalogue_cache, lesson_detail_cache
+from services.lesson_embeddings import get_semantic_index
+from services.lesson_suggest import get_suggest_index
+from services.speculative import final_answer_runner
+from services.lesson_corpus import corpus_enabled, get_lesson_corpus, reload_lesson_corpus
+from utils.accounts_repo import get_user_by_id
+from utils.pool_metrics import pool_metrics_info
+from utils.schema_registry import schema_registry
+from utils.security import decode_access_token
+from utils.slow_queries import slow_query_sampler
+
+
+router = APIRouter()
+
+
+def _admin_roles() -> set:
+    roles = {"administrador", "admin", "administrator"}
+    configured = (os.getenv("ROLE_ADMIN") or "").strip().lower()
+    if configured:
+        roles.add(configured)
+    return roles
+
+
+def _resolve_token(request: Request, authorization: Optional[str]) -> Optional[str]:
+    if authorization:
+        parts = authorization.split()
+        if len(parts) == 2 and parts[0].lower() == "bearer":
+            return parts[1]
+    try:
+        cookie_token = request.cookies.get("access_token")
+        if cookie_token:
+            return cookie_token
+    except Exception:
+        pass
+    return None
+
+
+def _admin_subject(
+    request: Request,
+    authorization: Optional[str] = Header(default=None),
+    db: Session = Depends(get_db),
+) -> int:
+    token = _resolve_token(request, authorization)
+    if not token:
+        raise HTTPException(status_code=401, detail="Falta token de acceso")
+    claims = decode_access_token(token)
+    if not claims or claims.get("id") is None:
+        raise HTTPException(status_code=401, detail="Token invalido o expirado")
+    user = get_user_by_id(db, claims["id"])
+    if not user:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+    role = str(user.get("rol") or "").strip().lower()
+    if role not in _admin_roles():
+        raise HTTPException(status_code=403, detail="Se requiere rol administrador")
+    return claims["id"]
+
+
+@router.get("/lesson-corpus")
+def lesson_corpus_info(_admin_id: int = Depends(_admin_subject)):
+    corpus = get_lesson_corpus()
+    aliases = get_alias_index()
+    bm25 = get_bm25_index()
+    semantic = get_semantic_index()
+    suggest_index = get_suggest_index()
+    return {
+        "enabled": corpus_enabled(),
+        "corpus": corpus.info() if corpus is not None else None,
+        "aliases": aliases.info() if aliases is not None else None,
+        "bm25": bm25.info() if bm25 is not None else None,
+        "semantic": semantic.info() if semantic is not None else None,
+        "catalogue": catalogue_cache.info(),
+        "lesson_detail": lesson_detail_cache.info(),
+        "suggest": suggest_index.info() if suggest_index is not None else None,
+    }
+
+
+@router.post("/lesson-corpus/reload")
+def lesson_corpus_reload(_admin_id: int = Depends(_admin_subject), db: Session = Depends(get_db)):
+    if not corpus_enabled():
+        raise HTTPException(status_code=409, detail="Cache de lecciones deshabilitada (LESSON_CORPUS_CACHE)")
+    try:
+        corpus = reload_lesson_corpus(db)
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=f"lesson_corpus_reload error: {exc}") from exc
+    return {"corpus": corpus.info()}
+
+
+@router.post("/lesson-catalogue/invalidate")
+def lesson_catalogue_invalidate(_admin_id: int = Depends(_admin_subject)):
+    invalidate_catalogue_cache()
+    return {"catalogue": catalogue_cache.info(), "lesson_detail": lesson_detail_cache.info()}
+
+
+@router.get("/db-pool")
+def db_pool_info(_admin_id: int = Depends(_admin_subject)):
+    return {
+        "pools": pool_metrics_info(),
+        "read_replicas": read_replicas.info(),
+        "read_your_writes": sticky_writes.info(),
+    }
+
+
+@router.get("/speculative")
+def speculative_info(_admin_id: int = Depends(_admin_subject)):
+    return final_answer_runner.stats()
+
+
+@router.get("/slow-queries")
+def slow_queries_info(
+    limit: int = Query(default=20, ge=1, le=200),
+    order: str = Query(default="total_ms", description="total_ms, max_ms, mean_ms, count o slow"),
+    _admin_id: int = Depends(_admin_subject),
+):
+    return slow_query_sampler.info(limit, order)
+
+
+@router.post("/slow-queries/reset")
+def slow_queries_reset(_admin_id: int = Depends(_admin_subject)):
+    slow_query_sampler.reset()
+    return slow_query_sampler.info()
+
+
+@router.get("/schema")
+def schema_info(_admin_id: int = Depends(_admin_subject)):
+    return schema_registry.info()
+
+
+@router.post("/schema/refresh")
+def schema_refresh(_admin_id: int = Depends(_admin_subject), db: Session = Depends(get_db)):
+    try:
+        schema_registry.refresh(db.get_bind())
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=f"schema_refresh error: {exc}") from exc
+    invalidate_catalogue_cache()
+    return schema_registry.info()
@@ -12,7 +12,16 @@ from sqlalchemy.orm import Session
 from sqlalchemy import text as _sql_text
 
 from services.ai import compose_system_prompt, chat_completion
-from db import get_db
+from services.speculative import final_answer_runner, speculative_enabled, speculative_wait_seconds
+from services.lesson_corpus import get_lesson_corpus
+from services.lesson_aliases import get_alias_index, parse_lesson_ref
+from services.lesson_bm25 import search_bm25
+from services.lesson_catalogue import catalogue_cache
+from services.lesson_chunks import pack_lesson_context
+from services.lesson_embeddings import search_semantic
+from services.lesson_search import fulltext_available, fuzzy_title_candidates, search_lecciones_fulltext, search_lessons_table_fulltext
+from utils.schema_registry import get_schema
+from db import get_read_db
 
 router = APIRouter()
 
@@ -34,6 +43,7 @@ class ChatRequest(BaseModel):
     max_context: Optional[int] = 1
     modo: Optional[str] = None
     chat_id: Optional[str] = None
+    leccion_text: Optional[str] = None
 
 @router.get("/instructions")
 def get_instructions():
@@ -41,11 +51,13 @@ def get_instructions():
 
 def _has_table(db: Session, table_name: str) -> bool:
     try:
-        q = _sql_text(
-            "SELECT COUNT(*) FROM information_schema.tables WHERE table_schema='public' AND table_name=:t"
-        )
-        c = db.execute(q, {"t": table_name}).scalar() or 0
-        return int(c) > 0
+        return get_schema(db.get_bind()).has_table(table_name)
+    except Exception:
+        return False
+
+def _has_column(db: Session, table_name: str, column: str) -> bool:
+    try:
+        return column in get_schema(db.get_bind()).columns(table_name)
     except Exception:
         return False
 
@@ -592,6 +604,16 @@ def _compose_final_answer_user_prompt(original_question: str) -> str:
     return "\n".join(lines)
 
 
+def _compose_final_answer_messages(system_msg: Dict[str, str], original_question: str, hist: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    messages: List[Dict[str, str]] = [
+        system_msg,
+        {"role": "system", "content": _compose_final_answer_system_instruction(original_question)},
+    ]
+    messages.extend(hist)
+    messages.append({"role": "user", "content": _compose_final_answer_user_prompt(original_question)})
+    return messages
+
+
 def _shift_numeric_value(raw: str) -> str:
     try:
         normalized = raw.replace(",", ".")
@@ -690,27 +712,6 @@ def _split_sentences(text: str) -> List[str]:
     raw = re.split(r"(?<=[.!?])\s+", text.replace("\r", " ").replace("\n", " ").strip())
     return [chunk.strip() for chunk in raw if chunk and chunk.strip()]
 
-def _build_context_snippet(item: Dict[str, Any], limit: int = 1500) -> str:
-    unidad = item.get("unidad") or "?"
-    leccion = item.get("leccion") or "?"
-    titulo = _clean_text(item.get("titulo")) or "Sin titulo"
-    tema = _clean_text(item.get("tema"))
-    suffix = f" (Tema: {tema})" if tema else ""
-    lines = [f"Unidad {unidad} - Leccion {leccion}: {titulo}{suffix}"]
-    for key, label in (
-        ("objetivo", "Objetivo principal"),
-        ("teoria", "Teoria base"),
-        ("formulas", "Formulas clave"),
-        ("actividades", "Actividades sugeridas"),
-    ):
-        value = _clean_text(item.get(key))
-        if value:
-            lines.append(f"{label}: {value}")
-    snippet = "\n".join(lines).strip()
-    if len(snippet) > limit:
-        snippet = snippet[: max(0, limit - 3)] + "..."
-    return snippet
-
 def _compose_context_answer(items: List[Dict[str, Any]]) -> str:
     if not items:
         return ""
@@ -771,6 +772,25 @@ def _compose_context_answer(items: List[Dict[str, Any]]) -> str:
     lines.append("Sigue preguntando si deseas profundizar en un subtema o ver otro ejemplo.")
     return "\n".join(lines)
 
+def _context_summary(item: Dict[str, Any], with_score: bool = False) -> Dict[str, Any]:
+    summary = {"unidad": item.get("unidad"), "leccion": item.get("leccion"), "titulo": item.get("titulo")}
+    if with_score:
+        summary["id"] = item.get("id")
+        summary["tema"] = item.get("tema") or None
+        summary["score"] = item.get("score")
+    return summary
+
+def _compose_clarification_message(candidates: List[Dict[str, Any]]) -> str:
+    lines = ["Encontre varias lecciones que coinciden con tu referencia. Cual quieres revisar?", ""]
+    for it in candidates:
+        titulo = _clean_text(it.get("titulo")) or "Sin titulo"
+        tema = _clean_text(it.get("tema"))
+        suffix = f" (Tema: {tema})" if tema else ""
+        lines.append(f"- Unidad {it.get('unidad')} - Leccion {it.get('leccion')}: {titulo}{suffix}")
+    lines.append("")
+    lines.append("Indica la unidad y la leccion, por ejemplo: \"unidad 2, leccion 4.1\".")
+    return "\n".join(lines)
+
 def _general_math_fallback(question: str) -> str:
     topic = _extract_topic_from_question(question or "")
     topic_label = topic.title() if topic else "el tema consultado"
@@ -794,261 +814,195 @@ def _general_math_fallback(question: str) -> str:
         "- **Practica y extension:** crea una variacion del ejemplo, analiza posibles errores y relaciona el tema con otra unidad que ya conozcas.\n"
     )
     return default_template.format(topic=topic_label, topic_lower=topic_lower)
-def _fetch_teoria_from_db(db: Session, unidad: Optional[int], leccion: Optional[int], tema: Optional[int] = None) -> Optional[Dict[str, Any]]:
-
-    if unidad is None or leccion is None:
-
-        return None
-
-    lnum = f"{unidad}.{leccion}"
-
-    lnum_full = f"{tema}.{leccion}" if tema is not None else None
-
-    try:
-
-        if _has_table(db, "lessons"):
-
-            if lnum_full is not None:
-
-                row = db.execute(
-
-                    _sql_text(
-
-                        """
-
-                        SELECT unit_number AS unidad,
-
-                               lesson_number AS leccion,
-
-                               COALESCE(lesson_title,'') AS titulo,
-
-                               COALESCE(objective,'') AS objetivo,
-
-                               COALESCE(theory,'') AS teoria,
-
-                               COALESCE(key_formulas,'') AS formulas,
-
-                               COALESCE(suggested_activities,'') AS actividades
-
-                        FROM lessons
-
-                        WHERE CAST(unit_number AS VARCHAR)=:u
-
-                          AND REPLACE(REPLACE(REPLACE(TRIM(lesson_number),' ',''),'/','.'),'-','.')=:ln
-
-                        LIMIT 1
-
-                        """
-
-                    ),
-
-                    {"u": str(unidad), "ln": _norm_lesson_str(lnum_full)},
-
-                ).first()
-
-            else:
-
-                row = db.execute(
-
-                    _sql_text(
-
-                        """
-
-                        SELECT unit_number AS unidad,
-
-                               lesson_number AS leccion,
-
-                               COALESCE(lesson_title,'') AS titulo,
-
-                               COALESCE(objective,'') AS objetivo,
-
-                               COALESCE(theory,'') AS teoria,
-
-                               COALESCE(key_formulas,'') AS formulas,
-
-                               COALESCE(suggested_activities,'') AS actividades
-
-                        FROM lessons
-
-                        WHERE CAST(unit_number AS VARCHAR)=:u
-
-                          AND (
-
-                            REPLACE(REPLACE(REPLACE(TRIM(lesson_number),' ',''),'/','.'),'-','.') LIKE :suf
-
-                            OR REPLACE(REPLACE(REPLACE(TRIM(lesson_number),' ',''),'/','.'),'-','.') = :eq
-
-                          )
+_LESSON_NORM_SQL = "REPLACE(REPLACE(REPLACE(TRIM(lesson_number),' ',''),'/','.'),'-','.')"
 
-                        ORDER BY lesson_number ASC
-
-                        LIMIT 1
-
-                        """
-
-                    ),
-
-                    {"u": str(unidad), "suf": f"%.{leccion}", "eq": str(leccion)},
-
-                ).first()
-
-            if row:
-
-                m = row._mapping if hasattr(row, "_mapping") else None
-
-                return {
-
-                    "unidad": int(m["unidad"]) if m else int(row[0]),
-
-                    "leccion": (m["leccion"] if m else row[1]) or lnum,
-
-                    "titulo": (m["titulo"] if m else row[2]) or "",
-
-                    "tema": "",
-
-                    "teoria": (m["teoria"] if m else row[4]) or "",
+_RESOLVE_LESSONS_COLUMNS = (
+    "CAST(unit_number AS VARCHAR) AS unidad, CAST(lesson_number AS VARCHAR) AS leccion, "
+    "COALESCE(lesson_title,'') AS titulo, '' AS tema, COALESCE(theory,'') AS teoria, "
+    "COALESCE(objective,'') AS objetivo, COALESCE(key_formulas,'') AS formulas, "
+    "COALESCE(suggested_activities,'') AS actividades"
+)
 
-                    "objetivo": (m["objetivo"] if m else row[3]) or "",
+_RESOLVE_LECCIONES_COLUMNS = (
+    "CAST(u.numero AS VARCHAR) AS unidad, CAST(l.numero AS VARCHAR) AS leccion, "
+    "COALESCE(l.nombre,'') AS titulo, COALESCE(t.titulo,'') AS tema, COALESCE(l.teoria,'') AS teoria, "
+    "'' AS objetivo, '' AS formulas, '' AS actividades"
+)
 
-                    "formulas": (m["formulas"] if m else row[5]) or "",
+_RESOLVE_LECCIONES_FROM = (
+    "FROM lecciones l JOIN temas t ON l.id_tema=t.id_tema JOIN unidades u ON t.id_unidad=u.id_unidad"
+)
 
-                    "actividades": (m["actividades"] if m else row[6]) or "",
 
-                }
+def _lesson_resolution_branches(
+    db: Session, idx: int, unidad: int, leccion: int, tema: Optional[int], params: Dict[str, Any]
+) -> List[str]:
+    """Subconsultas (una por estrategia) para resolver una referencia unidad/tema/leccion.
 
+    Conservan el orden de la cascada anterior: ``lessons`` por numero exacto o
+    sufijo, luego ``lecciones`` por numero exacto y por ultimo por sufijo.
+    """
+    p = f"c{idx}_"
+    lnum_full = f"{tema}.{leccion}" if tema is not None else None
+    params.update({
+        p + "u": str(unidad),
+        p + "ui": int(unidad),
+        p + "li": int(leccion),
+        p + "ti": int(tema) if tema is not None else int(unidad),
+        p + "ln": lnum_full or f"{unidad}.{leccion}",
+        p + "lnn": _norm_lesson_str(lnum_full) if lnum_full else "",
+        p + "suf": f"%.{leccion}",
+        p + "eq": str(leccion),
+    })
+    branches: List[Tuple[str, str, str]] = []
+
+    if _has_table(db, "lessons"):
+        lessons_ord = _has_column(db, "lessons", "lesson_ord")
         if lnum_full is not None:
-
-            row = db.execute(
-
-                _sql_text(
-
-                    """
-
-                    SELECT u.numero AS unidad, l.numero AS leccion,
-
-                           COALESCE(l.nombre,'') AS titulo,
-
-                           COALESCE(t.titulo,'') AS tema,
-
-                           COALESCE(l.teoria,'') AS teoria
-
-                    FROM lecciones l
-
-                    JOIN temas t ON l.id_tema=t.id_tema
-
-                    JOIN unidades u ON t.id_unidad=u.id_unidad
-
-                    WHERE CAST(u.numero AS VARCHAR)=:u AND l.numero=:ln
-
-                    LIMIT 1
-
-                    """
-
-                ),
-
-                {"u": str(unidad), "ln": lnum_full},
-
-            ).first()
-
+            where = (
+                f"unit_ord=:{p}ui AND lesson_tema_ord=:{p}ti AND lesson_ord=:{p}li"
+                if lessons_ord
+                else f"CAST(unit_number AS VARCHAR)=:{p}u AND {_LESSON_NORM_SQL}=:{p}lnn"
+            )
+            branches.append(("lessons_tema_leccion", f"FROM lessons WHERE {where}", _RESOLVE_LESSONS_COLUMNS))
         else:
+            where = (
+                f"unit_ord=:{p}ui AND lesson_ord=:{p}li ORDER BY lesson_sort ASC"
+                if lessons_ord
+                else f"CAST(unit_number AS VARCHAR)=:{p}u AND ({_LESSON_NORM_SQL} LIKE :{p}suf "
+                f"OR {_LESSON_NORM_SQL} = :{p}eq) ORDER BY lesson_number ASC"
+            )
+            branches.append(("lessons_leccion", f"FROM lessons WHERE {where}", _RESOLVE_LESSONS_COLUMNS))
 
-            row = db.execute(
-
-                _sql_text(
-
-                    """
-
-                    SELECT u.numero AS unidad, l.numero AS leccion,
-
-                           COALESCE(l.nombre,'') AS titulo,
-
-                           COALESCE(t.titulo,'') AS tema,
-
-                           COALESCE(l.teoria,'') AS teoria
-
-                    FROM lecciones l
-
-                    JOIN temas t ON l.id_tema=t.id_tema
-
-                    JOIN unidades u ON t.id_unidad=u.id_unidad
-
-                    WHERE CAST(u.numero AS VARCHAR)=:u AND l.numero=:ln
-
-                    LIMIT 1
-
-                    """
-
-                ),
-
-                {"u": str(unidad), "ln": lnum},
-
-            ).first()
-
-        if not row:
-
-            row = db.execute(
-
-                _sql_text(
-
-                    """
-
-                    SELECT u.numero AS unidad, l.numero AS leccion,
-
-                           COALESCE(l.nombre,'') AS titulo,
-
-                           COALESCE(t.titulo,'') AS tema,
-
-                           COALESCE(l.teoria,'') AS teoria
-
-                    FROM lecciones l
-
-                    JOIN temas t ON l.id_tema=t.id_tema
-
-                    JOIN unidades u ON t.id_unidad=u.id_unidad
+    if _has_table(db, "lecciones"):
+        legacy_ord = all(
+            _has_column(db, table, column)
+            for table, column in (("unidades", "numero_ord"), ("temas", "numero_ord"), ("lecciones", "leccion_ord"))
+        )
+        if legacy_ord:
+            exact = f"u.numero_ord=:{p}ui AND l.tema_ord=:{p}ti AND l.leccion_ord=:{p}li"
+            suffix = f"u.numero_ord=:{p}ui AND l.leccion_ord=:{p}li ORDER BY t.numero_ord ASC"
+        else:
+            exact = f"CAST(u.numero AS VARCHAR)=:{p}u AND l.numero=:{p}ln"
+            suffix = (
+                f"CAST(u.numero AS VARCHAR)=:{p}u "
+                f"AND NULLIF(regexp_replace(split_part(l.numero,'.',2),'\\D','','g'),'')::int=:{p}li "
+                "ORDER BY NULLIF(regexp_replace(t.numero::text,'\\D','','g'),'')::int ASC"
+            )
+        branches.append(("lecciones_numero", f"{_RESOLVE_LECCIONES_FROM} WHERE {exact}", _RESOLVE_LECCIONES_COLUMNS))
+        branches.append(("lecciones_sufijo", f"{_RESOLVE_LECCIONES_FROM} WHERE {suffix}", _RESOLVE_LECCIONES_COLUMNS))
 
-                    WHERE CAST(u.numero AS VARCHAR)=:u AND split_part(l.numero,'.',2)::int=:lec
+    return [
+        f"SELECT * FROM (SELECT {idx * 10 + rank} AS prioridad, '{label}' AS estrategia, {columns} {body} LIMIT 1) r{idx}_{rank}"
+        for rank, (label, body, columns) in enumerate(branches)
+    ]
 
-                    ORDER BY t.numero::int ASC
 
-                    LIMIT 1
+def _resolve_lesson_in_db(db: Session, candidates: List[Tuple[int, int, Optional[int]]]) -> Optional[Dict[str, Any]]:
+    """Evalua todas las estrategias de todas las referencias candidatas en una sola consulta."""
+    params: Dict[str, Any] = {}
+    branches: List[str] = []
+    for idx, (unidad, leccion, tema) in enumerate(candidates):
+        branches.extend(_lesson_resolution_branches(db, idx, unidad, leccion, tema, params))
+    if not branches:
+        return None
+    sql = "SELECT * FROM (" + " UNION ALL ".join(branches) + ") resolucion ORDER BY prioridad ASC LIMIT 1"
+    try:
+        row = db.execute(_sql_text(sql), params).mappings().first()
+    except Exception as exc:
+        logger.warning("Resolucion de leccion fallo: %s", exc)
+        try:
+            db.rollback()
+        except Exception:
+            pass
+        return None
+    if not row:
+        return None
+    unidad, leccion, _tema = candidates[int(row["prioridad"]) // 10]
+    return {
+        "unidad": int(row["unidad"]),
+        "leccion": row["leccion"] or f"{unidad}.{leccion}",
+        "titulo": row["titulo"] or "",
+        "tema": row["tema"] or "",
+        "teoria": row["teoria"] or "",
+        "objetivo": row["objetivo"] or "",
+        "formulas": row["formulas"] or "",
+        "actividades": row["actividades"] or "",
+        "estrategia": row["estrategia"],
+    }
+
+
+def _fetch_first_teoria(db: Session, candidates: List[Tuple[Optional[int], Optional[int], Optional[int]]]) -> Optional[Dict[str, Any]]:
+    """Primera referencia que se resuelve, en orden. Una sola ida a la BD si no hay corpus en memoria."""
+    valid: List[Tuple[int, int, Optional[int]]] = []
+    for unidad, leccion, tema in candidates:
+        if unidad is None or leccion is None:
+            continue
+        if (unidad, leccion, tema) not in valid:
+            valid.append((unidad, leccion, tema))
+    if not valid:
+        return None
+    corpus = get_lesson_corpus()
+    if corpus is not None:
+        for unidad, leccion, tema in valid:
+            found = corpus.lookup(unidad, leccion, tema)
+            if found:
+                return found
+        return None
+    return _resolve_lesson_in_db(db, valid)
 
-                    """
 
-                ),
+def _fetch_teoria_from_db(db: Session, unidad: Optional[int], leccion: Optional[int], tema: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    return _fetch_first_teoria(db, [(unidad, leccion, tema)])
 
-                {"u": str(unidad), "lec": int(leccion)},
 
-            ).first()
+def _lesson_item_key(item: Dict[str, Any]) -> Tuple[Any, ...]:
+    return (item.get("source"), item.get("id"), item.get("unidad"), item.get("leccion"))
 
-        if not row:
 
+def _lesson_reference_key(data: "ChatRequest", message_text: str, lesson_ref: Any = None) -> Optional[Tuple[Any, ...]]:
+    """Leccion a la que apunta el turno actual, o None si el mensaje no menciona ninguna."""
+    explicit_fields = any(v is not None for v in (data.unidad, data.tema, data.leccion, data.leccion_text))
+    if lesson_ref is not None:
+        if lesson_ref.empty or not (lesson_ref.explicit or explicit_fields):
             return None
+        return (lesson_ref.unidad, lesson_ref.tema, lesson_ref.leccion, lesson_ref.numero)
+    pu, pt, pl = _parse_structure_from_text(message_text)
+    key = (
+        data.unidad if data.unidad is not None else pu,
+        data.tema if data.tema is not None else pt,
+        data.leccion if data.leccion is not None else pl,
+        _parse_leccion_text(message_text) or data.leccion_text,
+    )
+    return None if all(v is None for v in key) else key
 
-        m = row._mapping if hasattr(row, "_mapping") else None
-
-        return {
-
-            "unidad": int(m["unidad"]) if m else int(row[0]),
-
-            "leccion": (m["leccion"] if m else row[1]) or lnum,
-
-            "titulo": (m["titulo"] if m else row[2]) or "",
 
-            "tema": (m["tema"] if m else row[3]) or "",
+# Otra leccion debe puntuar al menos esto por encima de la guardada para cambiar de tema.
+_TOPIC_SWITCH_MARGIN = 1.5
 
-            "teoria": (m["teoria"] if m else row[4]) or "",
 
-            "objetivo": "",
+def _lesson_match_key(item: Dict[str, Any]) -> Tuple[Any, str]:
+    return (item.get("unidad"), str(item.get("leccion") or ""))
 
-            "formulas": "",
 
-            "actividades": "",
+def _is_topic_switch(message_text: str, cached_items: List[Dict[str, Any]]) -> bool:
+    """True si BM25 sobre el corpus en memoria pone otra leccion claramente por encima de la guardada."""
+    ranked = search_bm25(message_text, limit=10) if message_text else None
+    if not ranked:
+        return False
+    cached_keys = {_lesson_match_key(it) for it in cached_items}
+    top = ranked[0]
+    if _lesson_match_key(top) in cached_keys:
+        return False
+    cached_score = max((hit["score"] for hit in ranked if _lesson_match_key(hit) in cached_keys), default=0.0)
+    return top["score"] > _TOPIC_SWITCH_MARGIN * cached_score
 
-        }
 
-    except Exception:
+def _lesson_context_generation() -> Tuple[Optional[int], int]:
+    # Cambia al recargar el corpus o el esquema: el contexto guardado ya no vale.
+    corpus = get_lesson_corpus()
+    return (corpus.version if corpus is not None else None, catalogue_cache.generation)
 
-        return None
 
 def _parse_leccion_text(q: str) -> Optional[str]:
     if not q:
@@ -1114,63 +1068,85 @@ def _search_lessons(db: Session, query: Optional[str], unidad: Optional[int], le
 
             return results
 
-        legacy_rows = db.execute(
+        bm25_found = None if fulltext_available(db) else search_bm25(query.strip(), max(1, limit), unidad)
+
+        if bm25_found is not None:
+
+            results.extend(bm25_found)
+
+        legacy_found = search_lecciones_fulltext(db, query.strip(), max(1, limit)) if bm25_found is None else None
+
+        if legacy_found is not None:
+
+            results.extend(legacy_found)
+
+        elif bm25_found is None:
+
+            legacy_rows = db.execute(
 
-            _sql_text(
+                _sql_text(
 
-                """
+                    """
 
-                SELECT u.numero AS unidad, l.numero AS leccion,
+                    SELECT u.numero AS unidad, l.numero AS leccion,
 
-                       COALESCE(l.nombre,'') AS titulo,
+                           COALESCE(l.nombre,'') AS titulo,
 
-                       COALESCE(t.titulo,'') AS tema,
+                           COALESCE(t.titulo,'') AS tema,
 
-                       COALESCE(l.teoria,'') AS teoria
+                           COALESCE(l.teoria,'') AS teoria
 
-                FROM lecciones l
+                    FROM lecciones l
 
-                JOIN temas t ON l.id_tema=t.id_tema
+                    JOIN temas t ON l.id_tema=t.id_tema
 
-                JOIN unidades u ON t.id_unidad=u.id_unidad
+                    JOIN unidades u ON t.id_unidad=u.id_unidad
 
-                WHERE (l.nombre ILIKE :q OR t.titulo ILIKE :q OR u.titulo ILIKE :q OR l.teoria ILIKE :q OR l.numero ILIKE :q)
+                    WHERE (l.nombre ILIKE :q OR t.titulo ILIKE :q OR u.titulo ILIKE :q OR l.teoria ILIKE :q OR l.numero ILIKE :q)
 
-                LIMIT :lim
+                    LIMIT :lim
 
-                """
+                    """
 
-            ),
+                ),
 
-            {"q": f"%{query.strip()}%", "lim": max(1, limit)},
+                {"q": f"%{query.strip()}%", "lim": max(1, limit)},
 
-        ).fetchall()
+            ).fetchall()
 
-        for row in legacy_rows:
+            for row in legacy_rows:
 
-            m = row._mapping if hasattr(row, "_mapping") else None
+                m = row._mapping if hasattr(row, "_mapping") else None
 
-            results.append({
+                results.append({
 
-                "unidad": int(m["unidad"]) if m else int(row[0]),
+                    "unidad": int(m["unidad"]) if m else int(row[0]),
 
-                "leccion": (m["leccion"] if m else row[1]),
+                    "leccion": (m["leccion"] if m else row[1]),
 
-                "titulo": (m["titulo"] if m else row[2]) or "",
+                    "titulo": (m["titulo"] if m else row[2]) or "",
 
-                "tema": (m["tema"] if m else row[3]) or "",
+                    "tema": (m["tema"] if m else row[3]) or "",
 
-                "teoria": (m["teoria"] if m else row[4]) or "",
+                    "teoria": (m["teoria"] if m else row[4]) or "",
 
-                "objetivo": "",
+                    "objetivo": "",
 
-                "formulas": "",
+                    "formulas": "",
 
-                "actividades": "",
+                    "actividades": "",
 
-            })
+                })
 
-        if _has_table(db, "lessons"):
+        # BM25 solo sustituye la busqueda en lecciones; la tabla lessons se consulta siempre.
+
+        lessons_found = search_lessons_table_fulltext(db, query.strip(), unidad, max(1, limit)) if _has_table(db, "lessons") else None
+
+        if lessons_found is not None:
+
+            results.extend(lessons_found)
+
+        elif _has_table(db, "lessons"):
 
             try:
 
@@ -1250,6 +1226,14 @@ def _search_lessons(db: Session, query: Optional[str], unidad: Optional[int], le
 
                 pass
 
+        if len(results) < max(1, limit):
+
+            results.extend(search_semantic(query.strip(), max(1, limit), unidad))
+
+        if not results:
+
+            results.extend(fuzzy_title_candidates(db, query.strip(), limit=max(1, limit)))
+
         unique: List[Dict[str, Any]] = []
 
         seen = set()
@@ -1273,7 +1257,7 @@ def _search_lessons(db: Session, query: Optional[str], unidad: Optional[int], le
         return results
 
 @router.post("/send")
-def chat_send(data: ChatRequest, db: Session = Depends(get_db)):
+def chat_send(data: ChatRequest, db: Session = Depends(get_read_db)):
     try:
         # Validacion de usuario (opcional)
         if os.getenv("CHAT_REQUIRE_KNOWN_USER", "false").lower() in {"1", "true", "yes"}:
@@ -1346,12 +1330,68 @@ def chat_send(data: ChatRequest, db: Session = Depends(get_db)):
             session["exercise_variant"] = ""
             session["exercise_variant_mapping"] = {}
 
+        # Respuesta final especulada tras el ejemplo guiado: solo es valida para
+        # el mensaje inmediatamente siguiente sobre el mismo ejercicio.
+        speculative_task = session.pop("speculative_final", None)
+        speculative_text: Optional[str] = None
+        if final_answer_request and speculative_task is not None:
+            speculative_text = final_answer_runner.take(
+                speculative_task,
+                str(session.get("exercise_prompt", "")),
+                len(hist),
+                speculative_wait_seconds(),
+            )
+        elif speculative_task is not None:
+            final_answer_runner.cancel(speculative_task)
+
         context_items: List[Dict[str, Any]] = []
         resolved_unidad = data.unidad
         resolved_tema = data.tema
         resolved_leccion = data.leccion
 
-        if mode == "leccion":
+        clarification: List[Dict[str, Any]] = []
+        lesson_ref = None
+        alias_index = get_alias_index() if mode == "leccion" else None
+        if alias_index is not None:
+            lesson_ref = parse_lesson_ref(" ".join(filter(None, [message_text, data.leccion_text])))
+            lesson_ref = lesson_ref._replace(
+                unidad=data.unidad if data.unidad is not None else lesson_ref.unidad,
+                tema=data.tema if data.tema is not None else lesson_ref.tema,
+                leccion=data.leccion if data.leccion is not None else lesson_ref.leccion,
+            )
+
+        # Contexto ya resuelto en turnos anteriores de esta conversacion.
+        cached_lesson = session.get("lesson_context") if mode == "leccion" else None
+        if cached_lesson is not None and cached_lesson.get("generation") != _lesson_context_generation():
+            session.pop("lesson_context", None)
+            cached_lesson = None
+        lesson_reference = _lesson_reference_key(data, message_text, lesson_ref) if mode == "leccion" else None
+        packed_ctx: Optional[str] = None
+
+        same_lesson = cached_lesson is not None and (
+            (lesson_reference is None and not _is_topic_switch(data.query or message_text, cached_lesson["items"]))
+            or (lesson_reference is not None and lesson_reference == cached_lesson["ref"])
+        )
+        if same_lesson:
+            # Seguimiento sin referencia a otra leccion: se reutilizan los items y el contexto empaquetado.
+            context_items.extend(cached_lesson["items"])
+            packed_ctx = cached_lesson["ctx"]
+            lesson_reference = cached_lesson["ref"]
+        elif mode == "leccion" and lesson_ref is not None and not lesson_ref.empty:
+            # Resolucion en memoria: sin consultas; si la referencia es ambigua se pregunta.
+            resolution = alias_index.resolve(lesson_ref)
+            exact = resolution.item
+            if exact:
+                context_items.append(exact)
+            elif resolution.ambiguous and lesson_ref.explicit:
+                clarification = resolution.candidates
+            else:
+                q = (data.query or message_text).strip()
+                if q:
+                    context_items.extend(
+                        _search_lessons(db, q, lesson_ref.unidad, None, limit=max(1, data.max_context or 1))
+                    )
+        elif mode == "leccion":
             if message_text:
                 pu, pt, pl = _parse_structure_from_text(message_text)
                 if resolved_unidad is None and pu is not None:
@@ -1361,15 +1401,18 @@ def chat_send(data: ChatRequest, db: Session = Depends(get_db)):
                 if resolved_leccion is None and pl is not None:
                     resolved_leccion = pl
 
-            exact = _fetch_teoria_from_db(db, resolved_unidad, resolved_leccion, tema=resolved_tema)
-            if not exact and message_text:
-                ltxt = _parse_leccion_text(message_text)
-                if ltxt and (resolved_unidad is not None):
-                    try:
-                        a_str, b_str = ltxt.split(".", 1)
-                        exact = _fetch_teoria_from_db(db, resolved_unidad, int(b_str), tema=int(a_str))
-                    except Exception:
-                        pass
+            # Todas las lecturas posibles de la referencia se resuelven en una sola consulta.
+            candidates = [(resolved_unidad, resolved_leccion, resolved_tema)]
+            ltxt = _parse_leccion_text(message_text) if message_text else None
+            if ltxt and (resolved_unidad is not None):
+                try:
+                    a_str, b_str = ltxt.split(".", 1)
+                    candidates.append((resolved_unidad, int(b_str), int(a_str)))
+                except Exception:
+                    pass
+            if resolved_tema is not None:
+                candidates.append((resolved_unidad, resolved_leccion, None))
+            exact = _fetch_first_teoria(db, candidates)
             if exact:
                 context_items.append(exact)
             if not exact:
@@ -1380,13 +1423,39 @@ def chat_send(data: ChatRequest, db: Session = Depends(get_db)):
                             db,
                             q,
                             resolved_unidad,
-                            resolved_leccion,
+                            None,
                             limit=max(1, data.max_context or 1),
                         )
                     )
         else:
             exact = None
 
+        if packed_ctx is None and cached_lesson is not None and context_items:
+            if cached_lesson["ids"] == [_lesson_item_key(it) for it in context_items]:
+                packed_ctx = cached_lesson["ctx"]
+
+        # La Session solo toma una conexion del pool en su primera consulta (modo
+        # general: ninguna). Se devuelve aqui, antes de la llamada al modelo (5-30 s);
+        # si algo posterior consultara la BD, la Session abriria otra transaccion.
+        db.close()
+
+        if clarification:
+            ai_text = _compose_clarification_message(clarification)
+            hist.append({"role": "user", "content": message_text})
+            hist.append({"role": "assistant", "content": ai_text})
+            session["last_mode"] = mode
+            session["last_context"] = False
+            session.pop("lesson_context", None)
+            matches = [_context_summary(it, with_score=True) for it in clarification]
+            return {
+                "respuesta": ai_text,
+                "usando_contexto": False,
+                "contexto_items": matches,
+                "modo_usado": mode,
+                "needs_clarification": True,
+                "debug": {"matches": matches, "ltxt": lesson_ref.text if lesson_ref is not None else None},
+            }
+
         base_system = compose_system_prompt()
         if mode == "general":
             system_msg = {
@@ -1408,12 +1477,15 @@ def chat_send(data: ChatRequest, db: Session = Depends(get_db)):
         elif final_answer_request:
             messages.append({"role": "system", "content": _compose_final_answer_system_instruction(exercise_prompt or message_text)})
         if mode == "leccion" and context_items and not data.solo_bd:
-            ctx = "\n\n---\n\n".join(_build_context_snippet(it) for it in context_items)
-            db_context_msg = {
-                "role": "system",
-                "content": "Usa el siguiente contexto de BD como base y completa con explicaciones claras.\n\n" + ctx,
-            }
-            messages.append(db_context_msg)
+            if packed_ctx is None:
+                packed_ctx = pack_lesson_context(context_items, data.query or message_text)
+            ctx = packed_ctx
+            if ctx:
+                db_context_msg = {
+                    "role": "system",
+                    "content": "Usa el siguiente contexto de BD como base y completa con explicaciones claras.\n\n" + ctx,
+                }
+                messages.append(db_context_msg)
 
         if hist:
             messages.extend(hist)
@@ -1441,7 +1513,7 @@ def chat_send(data: ChatRequest, db: Session = Depends(get_db)):
 
 
         try:
-            ai_text = chat_completion(messages)
+            ai_text = speculative_text or chat_completion(messages)
         except Exception as exc:
             logger.warning("chat_completion fallo (modo=%s, contexto=%s): %s", mode, bool(context_items), exc)
             if mode == "leccion" and context_items:
@@ -1457,15 +1529,35 @@ def chat_send(data: ChatRequest, db: Session = Depends(get_db)):
         hist.append({"role": "user", "content": message_text})
         hist.append({"role": "assistant", "content": ai_text})
 
+        if guided_example and speculative_enabled():
+            stored_prompt = str(session.get("exercise_prompt", ""))
+            task = final_answer_runner.submit(
+                stored_prompt,
+                len(hist),
+                chat_completion,
+                _compose_final_answer_messages(system_msg, stored_prompt, list(hist)),
+            )
+            if task is not None:
+                session["speculative_final"] = task
+
         session["last_mode"] = mode
         session["last_context"] = bool(context_items)
+        if mode == "leccion" and context_items:
+            session["lesson_context"] = {
+                "ref": lesson_reference,
+                "generation": _lesson_context_generation(),
+                "ids": [_lesson_item_key(it) for it in context_items],
+                "items": list(context_items),
+                "ctx": packed_ctx,
+            }
+        else:
+            session.pop("lesson_context", None)
         return {
             "respuesta": ai_text,
             "usando_contexto": bool(context_items) and mode == "leccion",
-            "contexto_items": [
-                {"unidad": it.get("unidad"), "leccion": it.get("leccion"), "titulo": it.get("titulo")} for it in context_items
-            ],
+            "contexto_items": [_context_summary(it) for it in context_items],
             "modo_usado": mode,
+            "needs_clarification": False,
         }
     except RuntimeError as e:
         raise HTTPException(status_code=500, detail=str(e))
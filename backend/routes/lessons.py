@@ -1,14 +1,41 @@
-﻿from typing import Any, Dict, List, Optional, Tuple
+﻿import base64
+import json
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
 
 from html import escape
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import inspect, text
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import bindparam, text
 from sqlalchemy.orm import Session, selectinload
 
-from db import get_db
-from models.models import Unidad, Tema, Leccion
-
+from db import AsyncDB, SessionLocal, ThreadedSession, get_async_read_db, get_threaded_read_db
+from models.models import AreaEnum, Unidad, Tema, Leccion
+from services.lesson_catalogue import (
+    CatalogueCache,
+    CatalogueEntry,
+    catalogue_cache,
+    catalogue_cache_enabled,
+    catalogue_cache_ttl,
+    etag_matches,
+    lesson_detail_cache,
+    serialize_payload,
+)
+from services.lesson_suggest import (
+    claim_suggest_rebuild,
+    get_suggest_index,
+    rebuild_suggest_index,
+    record_lesson_view,
+    release_suggest_rebuild,
+    suggest,
+)
+from utils.schema_registry import SchemaRegistry, get_schema
+
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -146,21 +173,139 @@ def _payload_from_models(unidades: List[Unidad]) -> Tuple[List[Dict[str, Any]],
     return payload, total_lessons
 
 
-def _payload_from_subtemas(db: Session, inspector, area: Optional[str]) -> Tuple[List[Dict[str, Any]], int]:
-    columns_unidad = {col["name"] for col in inspector.get_columns("unidades")}
-    has_area = "area" in columns_unidad
+def _natural_order_ready(schema: SchemaRegistry, lessons_table: str) -> bool:
+    """True si la migracion lesson_numbers creo las columnas de orden natural."""
+    return "numero_ord" in schema.columns("temas") and "numero_sort" in schema.columns(lessons_table)
+
+
+_ORDERED_CATALOGUE_SQL = """
+    SELECT u.id_unidad AS unidad_id, u.numero AS unidad_numero, u.titulo AS unidad_titulo,
+           {area_col} AS unidad_area,
+           t.id_tema AS tema_id, t.numero AS tema_numero, t.titulo AS tema_titulo,
+           l.id_leccion AS leccion_id, l.numero AS leccion_numero, l.nombre AS leccion_nombre,
+           LEFT(l.teoria, 1000) AS leccion_teoria
+    FROM unidades u
+    LEFT JOIN temas t ON t.id_unidad = u.id_unidad
+    LEFT JOIN lecciones l ON l.id_tema = t.id_tema
+    {where}
+    ORDER BY u.numero_ord NULLS FIRST, u.titulo, u.id_unidad,
+             t.numero_ord NULLS FIRST, t.titulo, t.id_tema,
+             l.numero_sort NULLS FIRST, l.nombre, l.id_leccion
+"""
+
+
+def _payload_from_ordered_rows(rows: List[Any]) -> Tuple[List[Dict[str, Any]], int]:
+    """Arma unidades/temas/lecciones a partir de filas ya ordenadas por SQL."""
+    payload: List[Dict[str, Any]] = []
+    total_lessons = 0
+    unidad_payload: Optional[Dict[str, Any]] = None
+    tema_payload: Optional[Dict[str, Any]] = None
+
+    for row in rows:
+        if unidad_payload is None or unidad_payload["id"] != row["unidad_id"]:
+            area_value = row.get("unidad_area")
+            unidad_payload = {
+                "id": row["unidad_id"],
+                "numero": row.get("unidad_numero"),
+                "titulo": row.get("unidad_titulo"),
+                "area": str(area_value) if area_value is not None else None,
+                "temas": [],
+                "temas_count": 0,
+                "lecciones_count": 0,
+            }
+            payload.append(unidad_payload)
+            tema_payload = None
+        if row.get("tema_id") is None:
+            continue
+        if tema_payload is None or tema_payload["id"] != row["tema_id"]:
+            tema_payload = {
+                "id": row["tema_id"],
+                "numero": row.get("tema_numero"),
+                "titulo": row.get("tema_titulo"),
+                "lecciones": [],
+                "lecciones_count": 0,
+            }
+            unidad_payload["temas"].append(tema_payload)
+            unidad_payload["temas_count"] += 1
+        if row.get("leccion_id") is None:
+            continue
+        tema_payload["lecciones"].append({
+            "id": row["leccion_id"],
+            "numero": row.get("leccion_numero"),
+            "nombre": row.get("leccion_nombre"),
+            "tema_id": row["tema_id"],
+            "unidad_numero": row.get("unidad_numero"),
+            "tema_numero": row.get("tema_numero"),
+            "preview": _build_preview(row.get("leccion_teoria")),
+        })
+        tema_payload["lecciones_count"] += 1
+        unidad_payload["lecciones_count"] += 1
+        total_lessons += 1
+
+    return payload, total_lessons
+
+
+def _payload_ordered_in_sql(db: Session, schema: SchemaRegistry, area: Optional[str]) -> Tuple[List[Dict[str, Any]], int]:
+    has_area = "area" in schema.columns("unidades")
+    params: Dict[str, Any] = {}
+    where = ""
+    if area:
+        if not has_area:
+            return [], 0
+        where = "WHERE CAST(u.area AS TEXT) = :area"
+        params["area"] = area
+    sql = _ORDERED_CATALOGUE_SQL.format(area_col="u.area" if has_area else "NULL", where=where)
+    rows = db.execute(text(sql), params).mappings().all()
+    return _payload_from_ordered_rows(rows)
+
+
+_FIRST_SECTION_PREVIEW_SQL = """
+    SELECT id_subtema, contenido
+    FROM (
+        SELECT id_subtema,
+               SUBSTR(contenido, 1, 1000) AS contenido,
+               ROW_NUMBER() OVER (PARTITION BY id_subtema ORDER BY id_seccion) AS rn
+        FROM secciones
+        WHERE contenido IS NOT NULL AND TRIM(contenido) != ''
+    ) s
+    WHERE rn = 1
+"""
+
+
+def _payload_from_subtemas(db: Session, schema: SchemaRegistry, area: Optional[str]) -> Tuple[List[Dict[str, Any]], int]:
+    """Catalogo del esquema subtemas/secciones con cuatro consultas, sin importar su tamano."""
+    has_area = "area" in schema.columns("unidades")
 
     if area and not has_area:
         return [], 0
 
+    ordered = _natural_order_ready(schema, "subtemas") and "numero_ord" in schema.columns("unidades")
+
     unit_sql = (
         "SELECT id_unidad, numero, titulo"
         + (", area" if has_area else "")
         + " FROM unidades"
+        + (" ORDER BY numero_ord NULLS FIRST, titulo, id_unidad" if ordered else "")
     )
     unit_rows = db.execute(text(unit_sql)).mappings().all()
+    topic_rows = db.execute(
+        text(
+            "SELECT id_tema, id_unidad, numero, titulo FROM temas"
+            + (" ORDER BY numero_ord NULLS FIRST, titulo, id_tema" if ordered else "")
+        )
+    ).mappings().all()
+    lesson_rows = db.execute(
+        text(
+            "SELECT id_subtema, id_tema, numero, titulo FROM subtemas"
+            + (" ORDER BY numero_sort NULLS FIRST, titulo, id_subtema" if ordered else "")
+        )
+    ).mappings().all()
+    previews = {
+        row["id_subtema"]: row["contenido"]
+        for row in db.execute(text(_FIRST_SECTION_PREVIEW_SQL)).mappings()
+    }
 
-    units_sorted = sorted(
+    units_sorted = unit_rows if ordered else sorted(
         unit_rows,
         key=lambda u: (
             _coerce_int(u.get("numero")),
@@ -168,6 +313,30 @@ def _payload_from_subtemas(db: Session, inspector, area: Optional[str]) -> Tuple
             _coerce_int(u.get("id_unidad")),
         ),
     )
+    topics_sorted = topic_rows if ordered else sorted(
+        topic_rows,
+        key=lambda t: (
+            _coerce_int(t.get("numero")),
+            (t.get("titulo") or ""),
+            _coerce_int(t.get("id_tema")),
+        ),
+    )
+    lessons_sorted = lesson_rows if ordered else sorted(
+        lesson_rows,
+        key=lambda l: (
+            _lesson_order_key(l.get("numero")),
+            (l.get("titulo") or ""),
+            _coerce_int(l.get("id_subtema")),
+        ),
+    )
+
+    # Agrupar conservando el orden global de cada nivel.
+    topics_by_unit: Dict[Any, List[Any]] = {}
+    for tema in topics_sorted:
+        topics_by_unit.setdefault(tema["id_unidad"], []).append(tema)
+    lessons_by_topic: Dict[Any, List[Any]] = {}
+    for lesson in lessons_sorted:
+        lessons_by_topic.setdefault(lesson["id_tema"], []).append(lesson)
 
     payload: List[Dict[str, Any]] = []
     total_lessons = 0
@@ -178,65 +347,22 @@ def _payload_from_subtemas(db: Session, inspector, area: Optional[str]) -> Tuple
         if area_lower and str(unidad_area).lower() != area_lower:
             continue
 
-        topic_rows = db.execute(
-            text(
-                "SELECT id_tema, numero, titulo FROM temas WHERE id_unidad = :unit_id"
-            ),
-            {"unit_id": unidad["id_unidad"]},
-        ).mappings().all()
-
-        topics_sorted = sorted(
-            topic_rows,
-            key=lambda t: (
-                _coerce_int(t.get("numero")),
-                (t.get("titulo") or ""),
-                _coerce_int(t.get("id_tema")),
-            ),
-        )
-
         temas_payload: List[Dict[str, Any]] = []
         unidad_lessons = 0
 
-        for tema in topics_sorted:
-            lesson_rows = db.execute(
-                text(
-                    "SELECT id_subtema, numero, titulo FROM subtemas WHERE id_tema = :topic_id"
-                ),
-                {"topic_id": tema["id_tema"]},
-            ).mappings().all()
-
-            lessons_sorted = sorted(
-                lesson_rows,
-                key=lambda l: (
-                    _lesson_order_key(l.get("numero")),
-                    (l.get("titulo") or ""),
-                    _coerce_int(l.get("id_subtema")),
-                ),
-            )
-
-            lecciones_payload: List[Dict[str, Any]] = []
-
-            for lesson in lessons_sorted:
-                preview_text = db.execute(
-                    text(
-                        "SELECT contenido FROM secciones "
-                        "WHERE id_subtema = :lesson_id "
-                        "AND contenido IS NOT NULL "
-                        "AND TRIM(contenido) != '' "
-                        "ORDER BY id_seccion ASC LIMIT 1"
-                    ),
-                    {"lesson_id": lesson["id_subtema"]},
-                ).scalar()
-
-                lecciones_payload.append({
+        for tema in topics_by_unit.get(unidad["id_unidad"], ()):
+            lecciones_payload: List[Dict[str, Any]] = [
+                {
                     "id": lesson["id_subtema"],
                     "numero": lesson.get("numero"),
                     "nombre": lesson.get("titulo"),
                     "tema_id": tema["id_tema"],
                     "unidad_numero": unidad.get("numero"),
                     "tema_numero": tema.get("numero"),
-                    "preview": _build_preview(preview_text),
-                })
+                    "preview": _build_preview(previews.get(lesson["id_subtema"])),
+                }
+                for lesson in lessons_by_topic.get(tema["id_tema"], ())
+            ]
 
             unidad_lessons += len(lecciones_payload)
             temas_payload.append({
@@ -261,9 +387,11 @@ def _payload_from_subtemas(db: Session, inspector, area: Optional[str]) -> Tuple
     return payload, total_lessons
 
 
-def _detail_from_subtemas(db: Session, inspector, lesson_id: int) -> Optional[Dict[str, Any]]:
-    columns_unidad = {col["name"] for col in inspector.get_columns("unidades")}
-    has_area = "area" in columns_unidad
+def _details_from_subtemas(db: Session, schema: SchemaRegistry, lesson_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """Detalles de varias lecciones del esquema subtemas/secciones con dos consultas."""
+    if not lesson_ids:
+        return {}
+    has_area = "area" in schema.columns("unidades")
 
     area_clause = ", u.area AS unidad_area" if has_area else ""
     detail_sql = (
@@ -281,58 +409,98 @@ def _detail_from_subtemas(db: Session, inspector, lesson_id: int) -> Optional[Di
         "FROM subtemas s "
         "JOIN temas t ON t.id_tema = s.id_tema "
         "JOIN unidades u ON u.id_unidad = t.id_unidad "
-        "WHERE s.id_subtema = :lesson_id"
+        "WHERE s.id_subtema IN :lesson_ids"
     )
 
-    row = db.execute(text(detail_sql), {"lesson_id": lesson_id}).mappings().first()
-    if not row:
-        return None
+    params = {"lesson_ids": list(lesson_ids)}
+    rows = db.execute(
+        text(detail_sql).bindparams(bindparam("lesson_ids", expanding=True)), params
+    ).mappings().all()
+    if not rows:
+        return {}
 
-    sections = db.execute(
+    sections_by_lesson: Dict[Any, List[Any]] = {}
+    section_rows = db.execute(
         text(
-            "SELECT tipo_seccion, contenido, formula, imagen_url "
-            "FROM secciones WHERE id_subtema = :lesson_id "
+            "SELECT id_subtema, tipo_seccion, contenido, formula, imagen_url "
+            "FROM secciones WHERE id_subtema IN :lesson_ids "
             "ORDER BY id_seccion ASC"
-        ),
-        {"lesson_id": lesson_id},
+        ).bindparams(bindparam("lesson_ids", expanding=True)),
+        params,
     ).mappings().all()
+    for section in section_rows:
+        sections_by_lesson.setdefault(section["id_subtema"], []).append(section)
+
+    details: Dict[int, Dict[str, Any]] = {}
+    for row in rows:
+        teoria_html = _compose_sections_html(sections_by_lesson.get(row["lesson_id"], []))
+        unidad_area = row.get("unidad_area") if has_area else None
+        details[row["lesson_id"]] = {
+            "id": row["lesson_id"],
+            "numero": row.get("lesson_numero"),
+            "nombre": row.get("lesson_nombre"),
+            "teoria": teoria_html or None,
+            "tema": {
+                "id": row["tema_id"],
+                "numero": row.get("tema_numero"),
+                "titulo": row.get("tema_titulo"),
+            },
+            "unidad": {
+                "id": row["unidad_id"],
+                "numero": row.get("unidad_numero"),
+                "titulo": row.get("unidad_titulo"),
+                "area": str(unidad_area) if unidad_area is not None else None,
+            },
+        }
+    return details
 
-    teoria_html = _compose_sections_html(sections)
-    unidad_area = row.get("unidad_area") if has_area else None
 
+def _detail_from_subtemas(db: Session, schema: SchemaRegistry, lesson_id: int) -> Optional[Dict[str, Any]]:
+    return _details_from_subtemas(db, schema, [lesson_id]).get(lesson_id)
+
+
+def _detail_from_models(lesson: Leccion, topic: Tema, unit: Unidad) -> Dict[str, Any]:
     return {
-        "id": row["lesson_id"],
-        "numero": row.get("lesson_numero"),
-        "nombre": row.get("lesson_nombre"),
-        "teoria": teoria_html or None,
-        "tema": {
-            "id": row["tema_id"],
-            "numero": row.get("tema_numero"),
-            "titulo": row.get("tema_titulo"),
+        'id': lesson.id_leccion,
+        'numero': lesson.numero,
+        'nombre': lesson.nombre,
+        'teoria': lesson.teoria,
+        'tema': {
+            'id': topic.id_tema,
+            'numero': topic.numero,
+            'titulo': topic.titulo,
         },
-        "unidad": {
-            "id": row["unidad_id"],
-            "numero": row.get("unidad_numero"),
-            "titulo": row.get("unidad_titulo"),
-            "area": str(unidad_area) if unidad_area is not None else None,
+        'unidad': {
+            'id': unit.id_unidad,
+            'numero': unit.numero,
+            'titulo': unit.titulo,
+            'area': str(getattr(unit, 'area', None)) if getattr(unit, 'area', None) is not None else None,
         },
     }
 
 
-@router.get("/")
-def list_lessons(
-    area: Optional[str] = Query(default=None, description="Filter by area identifier"),
-    db: Session = Depends(get_db),
-):
+def _build_catalogue(db: Session, area: Optional[str]) -> Dict[str, Any]:
     try:
-        bind = db.get_bind()
-        inspector = inspect(bind)
+        schema = get_schema(db.get_bind())
     except HTTPException:
         raise
     except Exception as exc:
         raise HTTPException(status_code=500, detail=f"lessons_list error: {exc}") from exc
 
-    if inspector.has_table("lecciones"):
+    if schema.has_table("lecciones") and _natural_order_ready(schema, "lecciones") and "numero_ord" in schema.columns("unidades"):
+        try:
+            payload, total_lessons = _payload_ordered_in_sql(db, schema, area)
+            return {
+                "unidades": payload,
+                "total_unidades": len(payload),
+                "total_lecciones": total_lessons,
+            }
+        except HTTPException:
+            raise
+        except Exception as exc:
+            raise HTTPException(status_code=500, detail=f"lessons_list error: {exc}") from exc
+
+    if schema.has_table("lecciones"):
         try:
             query = (
                 db.query(Unidad)
@@ -352,9 +520,9 @@ def list_lessons(
         except Exception as exc:
             raise HTTPException(status_code=500, detail=f"lessons_list error: {exc}") from exc
 
-    if inspector.has_table("subtemas"):
+    if schema.has_table("subtemas"):
         try:
-            payload, total_lessons = _payload_from_subtemas(db, inspector, area)
+            payload, total_lessons = _payload_from_subtemas(db, schema, area)
             return {
                 "unidades": payload,
                 "total_unidades": len(payload),
@@ -368,17 +536,557 @@ def list_lessons(
     raise HTTPException(status_code=500, detail="lessons_list error: esquema de lecciones no soportado")
 
 
-@router.get('/{lesson_id}')
-def get_lesson_detail(lesson_id: int, db: Session = Depends(get_db)):
+def _build_and_cache(db: Session, cache: CatalogueCache, key: Any, builder, generation: int) -> CatalogueEntry:
+    # Construir y serializar fuera del event loop (run_sync de get_threaded_read_db).
+    return cache.put(key, builder(db, key), generation)
+
+
+def _normalize_area(area: Optional[str]) -> Optional[str]:
+    """Area en minusculas; 400 si no es un valor de ``area_enum`` (tambien es la clave de la cache)."""
+    if area is None or not area.strip():
+        return None
+    normalized = area.strip().lower()
+    if normalized not in AreaEnum.enums:
+        raise HTTPException(status_code=400, detail=f"Area desconocida: {area}")
+    return normalized
+
+
+@router.get("/")
+async def list_lessons(
+    area: Optional[str] = Query(default=None, description="Filter by area identifier"),
+    if_none_match: Optional[str] = Header(default=None),
+    db: ThreadedSession = Depends(get_threaded_read_db),
+):
+    area = _normalize_area(area)
+    if not catalogue_cache_enabled():
+        return await db.run_sync(_build_catalogue, area)
+
+    entry = catalogue_cache.get(area)
+    if entry is None:
+        generation = catalogue_cache.generation
+        entry = await db.run_sync(_build_and_cache, catalogue_cache, area, _build_catalogue, generation)
+    return _cached_response(entry, if_none_match)
+
+
+def _cached_response(entry: CatalogueEntry, if_none_match: Optional[str]) -> Response:
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+_UNIT_FIELDS = ("id", "numero", "titulo", "area", "temas_count", "lecciones_count")
+_TOPIC_FIELDS = ("id", "numero", "titulo", "unidad_id", "lecciones_count")
+_LESSON_FIELDS = ("id", "numero", "nombre", "tema_id", "preview")
+
+_LESSON_TABLE_COLUMNS = {
+    "lecciones": {"id": "id_leccion", "nombre": "nombre"},
+    "subtemas": {"id": "id_subtema", "nombre": "titulo"},
+}
+
+_PREVIEW_SQL = {
+    "lecciones": "SELECT id_leccion AS id, SUBSTR(teoria, 1, 1000) AS preview FROM lecciones WHERE id_leccion IN :ids",
+    "subtemas": (
+        "SELECT id_subtema AS id, contenido AS preview FROM ("
+        " SELECT id_subtema, SUBSTR(contenido, 1, 1000) AS contenido,"
+        " ROW_NUMBER() OVER (PARTITION BY id_subtema ORDER BY id_seccion) AS rn"
+        " FROM secciones"
+        " WHERE id_subtema IN :ids AND contenido IS NOT NULL AND TRIM(contenido) != ''"
+        ") s WHERE rn = 1"
+    ),
+}
+
+
+def _parse_fields(fields: Optional[str], allowed: Tuple[str, ...], default: Tuple[str, ...]) -> Tuple[str, ...]:
+    if not fields:
+        return default
+    requested = tuple(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"fields no soportados: {', '.join(unknown)} (disponibles: {', '.join(allowed)})",
+        )
+    return ("id",) + tuple(f for f in requested if f != "id")
+
+
+def _encode_cursor(values: List[Any]) -> str:
+    raw = json.dumps(values, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: Optional[str]) -> Optional[List[Any]]:
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        values = None
+    if not isinstance(values, list) or not values:
+        raise HTTPException(status_code=400, detail="Cursor invalido")
+    return values
+
+
+def _is_cursor_int(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _lesson_table(schema: SchemaRegistry) -> str:
+    if schema.has_table("lecciones"):
+        return "lecciones"
+    if schema.has_table("subtemas"):
+        return "subtemas"
+    raise HTTPException(status_code=500, detail="lessons_catalogue error: esquema de lecciones no soportado")
+
+
+def _counts_by(db: Session, sql: str, ids: List[Any]) -> Dict[Any, int]:
+    if not ids:
+        return {}
+    stmt = text(sql).bindparams(bindparam("ids", expanding=True))
+    return {row[0]: int(row[1] or 0) for row in db.execute(stmt, {"ids": ids})}
+
+
+def _page_in_memory(rows: List[Any], sort_key, id_col: str, after: Optional[List[Any]], limit: int) -> Tuple[List[Any], bool]:
+    """Paginacion sin columnas de orden natural: ordena en Python y corta despues del cursor."""
+    rows = sorted(rows, key=sort_key)
+    start = 0
+    if after is not None:
+        positions = [i for i, row in enumerate(rows) if row[id_col] == after[-1]]
+        if not positions:
+            raise HTTPException(status_code=400, detail="Cursor invalido")
+        start = positions[0] + 1
+    page = rows[start:start + limit + 1]
+    return page[:limit], len(page) > limit
+
+
+def _project(row: Dict[str, Any], fields: Tuple[str, ...]) -> Dict[str, Any]:
+    return {field: row.get(field) for field in fields}
+
+
+def _require_parent(db: Session, table: str, id_col: str, parent_id: int, label: str) -> None:
+    found = db.execute(text(f"SELECT 1 FROM {table} WHERE {id_col} = :id"), {"id": parent_id}).first()
+    if not found:
+        raise HTTPException(status_code=404, detail=f"{label} no encontrada")
+
+
+def _units_page(db: Session, area: Optional[str], fields: Optional[str]) -> Dict[str, Any]:
+    try:
+        schema = get_schema(db.get_bind())
+        lesson_table = _lesson_table(schema)
+        has_area = "area" in schema.columns("unidades")
+        selected = _parse_fields(fields, _UNIT_FIELDS, ("id", "numero", "titulo", "area"))
+        if area and not has_area:
+            return {"unidades": [], "total_unidades": 0}
+
+        ordered = "numero_ord" in schema.columns("unidades")
+        sql = (
+            "SELECT id_unidad AS id, numero, titulo"
+            + (", area" if has_area else "")
+            + " FROM unidades"
+            + (" WHERE CAST(area AS TEXT) = :area" if area else "")
+            + (" ORDER BY numero_ord NULLS FIRST, titulo, id_unidad" if ordered else "")
+        )
+        rows = [dict(r) for r in db.execute(text(sql), {"area": area} if area else {}).mappings()]
+        if not ordered:
+            rows.sort(key=lambda u: (_coerce_int(u.get("numero")), u.get("titulo") or "", _coerce_int(u.get("id"))))
+
+        ids = [r["id"] for r in rows]
+        if "temas_count" in selected:
+            counts = _counts_by(db, "SELECT id_unidad, COUNT(*) FROM temas WHERE id_unidad IN :ids GROUP BY id_unidad", ids)
+            for r in rows:
+                r["temas_count"] = counts.get(r["id"], 0)
+        if "lecciones_count" in selected:
+            counts = _counts_by(
+                db,
+                f"SELECT t.id_unidad, COUNT(*) FROM temas t JOIN {lesson_table} l ON l.id_tema = t.id_tema "
+                "WHERE t.id_unidad IN :ids GROUP BY t.id_unidad",
+                ids,
+            )
+            for r in rows:
+                r["lecciones_count"] = counts.get(r["id"], 0)
+        for r in rows:
+            if r.get("area") is not None:
+                r["area"] = str(r["area"])
+    except HTTPException:
+        raise
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=f"lessons_units error: {exc}") from exc
+
+    return {"unidades": [_project(r, selected) for r in rows], "total_unidades": len(rows)}
+
+
+@router.get("/units")
+async def list_units(
+    area: Optional[str] = Query(default=None, description="Filter by area identifier"),
+    fields: Optional[str] = Query(default=None, description="Campos separados por coma: " + ",".join(_UNIT_FIELDS)),
+    db: AsyncDB = Depends(get_async_read_db),
+):
+    return await db.run_sync(_units_page, _normalize_area(area), fields)
+
+
+def _unit_topics_page(
+    db: Session, unit_id: int, fields: Optional[str], limit: int, cursor: Optional[List[Any]]
+) -> Dict[str, Any]:
+    try:
+        schema = get_schema(db.get_bind())
+        lesson_table = _lesson_table(schema)
+        selected = _parse_fields(fields, _TOPIC_FIELDS, ("id", "numero", "titulo"))
+
+        base_sql = "SELECT id_tema AS id, id_unidad AS unidad_id, numero, titulo{ord} FROM temas WHERE id_unidad = :parent"
+        params: Dict[str, Any] = {"parent": unit_id}
+        if "numero_ord" in schema.columns("temas"):
+            # Keyset sobre idx_temas_unidad_keyset (id_unidad, numero_ord NULLS FIRST, id_tema):
+            # cada pagina es un rango del indice.
+            sql = base_sql.format(ord=", numero_ord AS orden")
+            if cursor is not None:
+                if len(cursor) != 2 or not _is_cursor_int(cursor[1]) or not (cursor[0] is None or _is_cursor_int(cursor[0])):
+                    raise HTTPException(status_code=400, detail="Cursor invalido")
+                if cursor[0] is None:
+                    sql += " AND (numero_ord IS NOT NULL OR id_tema > :c_id)"
+                else:
+                    sql += " AND (numero_ord, id_tema) > (:c_ord, :c_id)"
+                    params["c_ord"] = cursor[0]
+                params["c_id"] = cursor[1]
+            sql += " ORDER BY numero_ord NULLS FIRST, id_tema LIMIT :limit"
+            params["limit"] = limit + 1
+            rows = [dict(r) for r in db.execute(text(sql), params).mappings()]
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+            next_cursor = _encode_cursor([rows[-1]["orden"], rows[-1]["id"]]) if has_more else None
+        else:
+            all_rows = [dict(r) for r in db.execute(text(base_sql.format(ord="")), params).mappings()]
+            rows, has_more = _page_in_memory(
+                all_rows,
+                lambda t: (_coerce_int(t.get("numero")), t.get("titulo") or "", _coerce_int(t.get("id"))),
+                "id",
+                cursor,
+                limit,
+            )
+            next_cursor = _encode_cursor([rows[-1]["id"]]) if has_more else None
+
+        if not rows and cursor is None:
+            _require_parent(db, "unidades", "id_unidad", unit_id, "Unidad")
+        if "lecciones_count" in selected:
+            counts = _counts_by(
+                db,
+                f"SELECT id_tema, COUNT(*) FROM {lesson_table} WHERE id_tema IN :ids GROUP BY id_tema",
+                [r["id"] for r in rows],
+            )
+            for r in rows:
+                r["lecciones_count"] = counts.get(r["id"], 0)
+    except HTTPException:
+        raise
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=f"lessons_topics error: {exc}") from exc
+
+    return {"temas": [_project(r, selected) for r in rows], "next_cursor": next_cursor}
+
+
+@router.get("/units/{unit_id}/temas")
+async def list_unit_topics(
+    unit_id: int,
+    fields: Optional[str] = Query(default=None, description="Campos separados por coma: " + ",".join(_TOPIC_FIELDS)),
+    limit: int = Query(default=50, ge=1, le=200),
+    after: Optional[str] = Query(default=None, description="Cursor devuelto en next_cursor"),
+    db: AsyncDB = Depends(get_async_read_db),
+):
+    return await db.run_sync(_unit_topics_page, unit_id, fields, limit, _decode_cursor(after))
+
+
+def _topic_lessons_page(
+    db: Session, tema_id: int, fields: Optional[str], limit: int, cursor: Optional[List[Any]]
+) -> Dict[str, Any]:
     try:
-        bind = db.get_bind()
-        inspector = inspect(bind)
+        schema = get_schema(db.get_bind())
+        lesson_table = _lesson_table(schema)
+        cols = _LESSON_TABLE_COLUMNS[lesson_table]
+        selected = _parse_fields(fields, _LESSON_FIELDS, ("id", "numero", "nombre"))
+
+        base_sql = (
+            f"SELECT {cols['id']} AS id, id_tema AS tema_id, numero, {cols['nombre']} AS nombre{{ord}} "
+            f"FROM {lesson_table} WHERE id_tema = :parent"
+        )
+        params: Dict[str, Any] = {"parent": tema_id}
+        if "numero_sort" in schema.columns(lesson_table):
+            # numero_sort (int[]) solo existe en PostgreSQL tras la migracion lesson_numbers;
+            # el orden coincide con el indice (id_tema, numero_sort NULLS FIRST, id).
+            sql = base_sql.format(ord=", numero_sort AS orden")
+            if cursor is not None:
+                ord_ok = cursor[0] is None or (
+                    isinstance(cursor[0], list) and all(v is None or _is_cursor_int(v) for v in cursor[0])
+                )
+                if len(cursor) != 2 or not ord_ok or not _is_cursor_int(cursor[1]):
+                    raise HTTPException(status_code=400, detail="Cursor invalido")
+                if cursor[0] is None:
+                    sql += f" AND (numero_sort IS NOT NULL OR {cols['id']} > :c_id)"
+                else:
+                    sql += f" AND (numero_sort, {cols['id']}) > (CAST(:c_ord AS int[]), :c_id)"
+                    params["c_ord"] = cursor[0]
+                params["c_id"] = cursor[1]
+            sql += f" ORDER BY numero_sort NULLS FIRST, {cols['id']} LIMIT :limit"
+            params["limit"] = limit + 1
+            rows = [dict(r) for r in db.execute(text(sql), params).mappings()]
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+            last_ord = rows[-1]["orden"] if rows else None
+            next_cursor = (
+                _encode_cursor([list(last_ord) if last_ord is not None else None, rows[-1]["id"]]) if has_more else None
+            )
+        else:
+            all_rows = [dict(r) for r in db.execute(text(base_sql.format(ord="")), params).mappings()]
+            rows, has_more = _page_in_memory(
+                all_rows,
+                lambda l: (_lesson_order_key(l.get("numero")), l.get("nombre") or "", _coerce_int(l.get("id"))),
+                "id",
+                cursor,
+                limit,
+            )
+            next_cursor = _encode_cursor([rows[-1]["id"]]) if has_more else None
+
+        if not rows and cursor is None:
+            _require_parent(db, "temas", "id_tema", tema_id, "Tema")
+        if "preview" in selected and rows:
+            stmt = text(_PREVIEW_SQL[lesson_table]).bindparams(bindparam("ids", expanding=True))
+            previews = {row["id"]: row["preview"] for row in db.execute(stmt, {"ids": [r["id"] for r in rows]}).mappings()}
+            for r in rows:
+                r["preview"] = _build_preview(previews.get(r["id"]))
+    except HTTPException:
+        raise
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=f"lessons_topic_lessons error: {exc}") from exc
+
+    return {"lecciones": [_project(r, selected) for r in rows], "next_cursor": next_cursor}
+
+
+@router.get("/temas/{tema_id}/lecciones")
+async def list_topic_lessons(
+    tema_id: int,
+    fields: Optional[str] = Query(default=None, description="Campos separados por coma: " + ",".join(_LESSON_FIELDS)),
+    limit: int = Query(default=50, ge=1, le=200),
+    after: Optional[str] = Query(default=None, description="Cursor devuelto en next_cursor"),
+    db: AsyncDB = Depends(get_async_read_db),
+):
+    return await db.run_sync(_topic_lessons_page, tema_id, fields, limit, _decode_cursor(after))
+
+
+_MAX_BATCH_LESSONS = 500
+
+
+def _parse_ids(raw: str) -> List[int]:
+    ids: List[int] = []
+    for part in (raw or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            ids.append(int(part))
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"id de leccion invalido: {part}")
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        raise HTTPException(status_code=400, detail="ids es obligatorio")
+    if len(ids) > _MAX_BATCH_LESSONS:
+        raise HTTPException(status_code=400, detail=f"Maximo {_MAX_BATCH_LESSONS} lecciones por solicitud")
+    return ids
+
+
+def _fetch_lesson_details(db: Session, schema: SchemaRegistry, lesson_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    if schema.has_table("lecciones"):
+        rows = (
+            db.query(Leccion, Tema, Unidad)
+            .join(Tema, Leccion.id_tema == Tema.id_tema)
+            .join(Unidad, Tema.id_unidad == Unidad.id_unidad)
+            .filter(Leccion.id_leccion.in_(lesson_ids))
+            .all()
+        )
+        return {lesson.id_leccion: _detail_from_models(lesson, topic, unit) for lesson, topic, unit in rows}
+    if schema.has_table("subtemas"):
+        return _details_from_subtemas(db, schema, lesson_ids)
+    raise HTTPException(status_code=500, detail="lessons_batch error: esquema de lecciones no soportado")
+
+
+def _lesson_detail_bodies(db: Session, schema: SchemaRegistry, lesson_ids: List[int]) -> Tuple[List[bytes], List[int]]:
+    """JSON serializado de cada leccion (primero de la cache, el resto en una sola consulta)."""
+    use_cache = catalogue_cache_enabled()
+    entries: Dict[int, CatalogueEntry] = {}
+    if use_cache:
+        for lesson_id in lesson_ids:
+            entry = lesson_detail_cache.get(lesson_id)
+            if entry is not None:
+                entries[lesson_id] = entry
+    pending = [lesson_id for lesson_id in lesson_ids if lesson_id not in entries]
+    if pending:
+        generation = lesson_detail_cache.generation
+        for lesson_id, detail in _fetch_lesson_details(db, schema, pending).items():
+            if use_cache:
+                entries[lesson_id] = lesson_detail_cache.put(lesson_id, detail, generation)
+            else:
+                body = serialize_payload(detail)
+                entries[lesson_id] = CatalogueEntry(body, "", 0.0)
+    bodies = [entries[lesson_id].body for lesson_id in lesson_ids if lesson_id in entries]
+    missing = [lesson_id for lesson_id in lesson_ids if lesson_id not in entries]
+    return bodies, missing
+
+
+_STREAM_CHUNK_SIZE = 50  # lecciones por consulta mientras se escribe la respuesta
+
+
+def _chunk_bodies(db: Session, lesson_ids: List[int]) -> Tuple[List[bytes], List[int]]:
+    return _lesson_detail_bodies(db, get_schema(db.get_bind()), lesson_ids)
+
+
+async def _stream_lessons(db: ThreadedSession, lesson_ids: List[int], extra, error_label: str) -> StreamingResponse:
+    """Escribe {"lecciones": [...], ...} por tandas: cada tanda se consulta y serializa al enviarla.
+
+    ``extra(encontradas, no_encontradas)`` devuelve las claves que van despues de la lista."""
+    chunks = [lesson_ids[i:i + _STREAM_CHUNK_SIZE] for i in range(0, len(lesson_ids), _STREAM_CHUNK_SIZE)]
+    # La primera tanda se resuelve antes de responder: un fallo aqui todavia puede ser un 500.
+    try:
+        first = await db.run_sync(_chunk_bodies, chunks[0]) if chunks else ([], [])
+    except HTTPException:
+        raise
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=f"{error_label} error: {exc}") from exc
+
+    async def _chunks():
+        found = 0
+        missing: List[int] = []
+        yield b'{"lecciones":['
+        for index, chunk in enumerate(chunks):
+            bodies, chunk_missing = first if index == 0 else await db.run_sync(_chunk_bodies, chunk)
+            missing.extend(chunk_missing)
+            for body in bodies:
+                yield body if found == 0 else b"," + body
+                found += 1
+        yield b"]"
+        for key, value in extra(found, missing).items():
+            yield b"," + serialize_payload(key) + b":" + serialize_payload(value)
+        yield b"}"
+
+    return StreamingResponse(_chunks(), media_type="application/json")
+
+
+@router.get("/batch")
+async def get_lessons_batch(
+    ids: str = Query(..., description="Ids de leccion separados por coma"),
+    db: ThreadedSession = Depends(get_threaded_read_db),
+):
+    lesson_ids = _parse_ids(ids)
+    return await _stream_lessons(
+        db,
+        lesson_ids,
+        lambda found, missing: {"total_lecciones": found, "no_encontradas": missing},
+        "lessons_batch",
+    )
+
+
+def _unit_lesson_ids(db: Session, unit_id: int) -> List[int]:
+    try:
+        schema = get_schema(db.get_bind())
+        lesson_table = _lesson_table(schema)
+        cols = _LESSON_TABLE_COLUMNS[lesson_table]
+        rows = db.execute(
+            text(
+                f"SELECT l.{cols['id']} AS id, l.numero, l.{cols['nombre']} AS nombre, "
+                "t.id_tema AS tema_id, t.numero AS tema_numero, t.titulo AS tema_titulo "
+                f"FROM temas t JOIN {lesson_table} l ON l.id_tema = t.id_tema "
+                "WHERE t.id_unidad = :unit_id"
+            ),
+            {"unit_id": unit_id},
+        ).mappings().all()
+        if not rows:
+            _require_parent(db, "unidades", "id_unidad", unit_id, "Unidad")
+    except HTTPException:
+        raise
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=f"lessons_unit_full error: {exc}") from exc
+    ordered = sorted(
+        rows,
+        key=lambda r: (
+            _coerce_int(r.get("tema_numero")),
+            r.get("tema_titulo") or "",
+            _coerce_int(r.get("tema_id")),
+            _lesson_order_key(r.get("numero")),
+            r.get("nombre") or "",
+            _coerce_int(r.get("id")),
+        ),
+    )
+    return [r["id"] for r in ordered]
+
+
+@router.get("/units/{unit_id}/full")
+async def get_unit_lessons(unit_id: int, db: ThreadedSession = Depends(get_threaded_read_db)):
+    lesson_ids = await db.run_sync(_unit_lesson_ids, unit_id)
+    return await _stream_lessons(
+        db,
+        lesson_ids,
+        lambda found, _missing: {"unidad_id": unit_id, "total_lecciones": found},
+        "lessons_unit_full",
+    )
+
+
+def _suggest_catalogue(generation: int) -> Dict[str, Any]:
+    """Catalogo completo de la cache; solo se consulta la BD si no hay copia vigente."""
+    entry = catalogue_cache.get(None) if catalogue_cache_enabled() else None
+    if entry is not None:
+        return json.loads(entry.body)
+    with SessionLocal() as db:
+        catalogue = _build_catalogue(db, None)
+    if catalogue_cache_enabled():
+        catalogue_cache.put(None, catalogue, generation)
+    return catalogue
+
+
+def _rebuild_suggest(generation: int) -> None:
+    try:
+        rebuild_suggest_index(_suggest_catalogue(generation), generation)
+    finally:
+        release_suggest_rebuild()
+
+
+def _rebuild_suggest_in_background(generation: int) -> None:
+    try:
+        _rebuild_suggest(generation)
+    except Exception as exc:
+        logger.warning("No se pudo reconstruir el indice de sugerencias: %s", exc)
+
+
+@router.get("/suggest")
+async def suggest_lessons(
+    background_tasks: BackgroundTasks,
+    q: str = Query(default="", max_length=120),
+    limit: int = Query(default=8, ge=1, le=20),
+):
+    index = get_suggest_index()
+    ttl = catalogue_cache_ttl()
+    stale = index is None or index.generation != catalogue_cache.generation or (
+        ttl and time.time() - index.built_at > ttl
+    )
+    # Reconstruccion tras invalidar el catalogo (recarga del corpus o del esquema) o al vencer el TTL:
+    # la hace una sola peticion y las demas siguen con el indice anterior.
+    if stale and claim_suggest_rebuild():
+        generation = catalogue_cache.generation
+        if index is not None:
+            background_tasks.add_task(_rebuild_suggest_in_background, generation)
+        else:
+            try:
+                await run_in_threadpool(_rebuild_suggest, generation)
+            except HTTPException:
+                raise
+            except Exception as exc:
+                raise HTTPException(status_code=500, detail=f"lessons_suggest error: {exc}") from exc
+    return {"q": q, "sugerencias": suggest(q, limit=limit) or []}
+
+
+def _build_lesson_detail(db: Session, lesson_id: int) -> Dict[str, Any]:
+    try:
+        schema = get_schema(db.get_bind())
     except HTTPException:
         raise
     except Exception as exc:
         raise HTTPException(status_code=500, detail=f'lesson_detail error: {exc}') from exc
 
-    if inspector.has_table("lecciones"):
+    if schema.has_table("lecciones"):
         try:
             query = (
                 db.query(Leccion, Tema, Unidad)
@@ -395,28 +1103,11 @@ def get_lesson_detail(lesson_id: int, db: Session = Depends(get_db)):
         if not result:
             raise HTTPException(status_code=404, detail='Leccion no encontrada')
 
-        lesson, topic, unit = result
-        return {
-            'id': lesson.id_leccion,
-            'numero': lesson.numero,
-            'nombre': lesson.nombre,
-            'teoria': lesson.teoria,
-            'tema': {
-                'id': topic.id_tema,
-                'numero': topic.numero,
-                'titulo': topic.titulo,
-            },
-            'unidad': {
-                'id': unit.id_unidad,
-                'numero': unit.numero,
-                'titulo': unit.titulo,
-                'area': str(getattr(unit, 'area', None)) if getattr(unit, 'area', None) is not None else None,
-            },
-        }
+        return _detail_from_models(*result)
 
-    if inspector.has_table("subtemas"):
+    if schema.has_table("subtemas"):
         try:
-            detail = _detail_from_subtemas(db, inspector, lesson_id)
+            detail = _detail_from_subtemas(db, schema, lesson_id)
         except HTTPException:
             raise
         except Exception as exc:
@@ -427,3 +1118,23 @@ def get_lesson_detail(lesson_id: int, db: Session = Depends(get_db)):
         return detail
 
     raise HTTPException(status_code=500, detail='lesson_detail error: esquema de lecciones no soportado')
+
+
+@router.get('/{lesson_id}')
+async def get_lesson_detail(
+    lesson_id: int,
+    if_none_match: Optional[str] = Header(default=None),
+    db: ThreadedSession = Depends(get_threaded_read_db),
+):
+    # La vista se cuenta despues de encontrar la leccion (un 404 no llega aqui).
+    if not catalogue_cache_enabled():
+        detail = await db.run_sync(_build_lesson_detail, lesson_id)
+        record_lesson_view(lesson_id)
+        return detail
+
+    entry = lesson_detail_cache.get(lesson_id)
+    if entry is None:
+        generation = lesson_detail_cache.generation
+        entry = await db.run_sync(_build_and_cache, lesson_detail_cache, lesson_id, _build_lesson_detail, generation)
+    record_lesson_view(lesson_id)
+    return _cached_response(entry, if_none_match)
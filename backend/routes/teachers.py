@@ -4,7 +4,7 @@ from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 
-from db import get_db
+from db import AsyncDB, get_async_db, get_db
 from utils.accounts_repo import get_user_by_id
 from utils.security import decode_access_token
 from utils.teachers_repo import (
@@ -34,12 +34,7 @@ def _resolve_token(request: Request, authorization: Optional[str]) -> Optional[s
     return None
 
 
-def _teacher_subject(
-    request: Request,
-    authorization: Optional[str] = Header(default=None),
-    db: Session = Depends(get_db),
-) -> int:
-    token = _resolve_token(request, authorization)
+def _authorize_teacher(db: Session, token: Optional[str]) -> int:
     if not token:
         raise HTTPException(status_code=401, detail="Falta token de acceso")
     claims = decode_access_token(token)
@@ -56,14 +51,29 @@ def _teacher_subject(
     return teacher_id
 
 
+def _teacher_subject(
+    request: Request,
+    authorization: Optional[str] = Header(default=None),
+    db: Session = Depends(get_db),
+) -> int:
+    return _authorize_teacher(db, _resolve_token(request, authorization))
+
+
+async def _teacher_subject_async(
+    request: Request,
+    authorization: Optional[str] = Header(default=None),
+    db: AsyncDB = Depends(get_async_db),
+) -> int:
+    return await db.run_sync(_authorize_teacher, _resolve_token(request, authorization))
+
+
 class TeacherProfileUpdate(BaseModel):
     anios: Optional[List[int]] = None
     especialidades: Optional[List[str]] = None
     notas: Optional[str] = None
 
 
-@router.get("/me")
-def teacher_me(teacher_id: int = Depends(_teacher_subject), db: Session = Depends(get_db)):
+def _teacher_overview(db: Session, teacher_id: int):
     profile = get_teacher_profile(db, teacher_id)
     if not profile:
         profile = ensure_teacher_profile(db, teacher_id)
@@ -76,6 +86,11 @@ def teacher_me(teacher_id: int = Depends(_teacher_subject), db: Session = Depend
     }
 
 
+@router.get("/me")
+async def teacher_me(teacher_id: int = Depends(_teacher_subject_async), db: AsyncDB = Depends(get_async_db)):
+    return await db.run_sync(_teacher_overview, teacher_id)
+
+
 @router.put("/me")
 def teacher_update(
     body: TeacherProfileUpdate,
@@ -89,17 +104,17 @@ def teacher_update(
 
 
 @router.get("/me/students")
-def teacher_students(
-    teacher_id: int = Depends(_teacher_subject),
-    db: Session = Depends(get_db),
+async def teacher_students(
+    teacher_id: int = Depends(_teacher_subject_async),
+    db: AsyncDB = Depends(get_async_db),
     q: Optional[str] = Query(default=None, description="Buscar por nombre, email o nivel"),
     anio: Optional[int] = Query(default=None, ge=0),
     especialidad: Optional[str] = Query(default=None),
     limit: int = Query(default=50, ge=1, le=500),
     offset: int = Query(default=0, ge=0),
 ):
-    summary = list_teacher_students(
-        db,
+    summary = await db.run_sync(
+        list_teacher_students,
         teacher_id,
         q=q,
         anio=anio,
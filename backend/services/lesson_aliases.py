@@ -0,0 +1,261 @@
+import logging
+import os
+import re
+import threading
+import unicodedata
+from typing import Any, Dict, Iterable, List, Mapping, NamedTuple, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+def aliases_enabled() -> bool:
+    # El indice (con la teoria de cada leccion) solo se reconstruye al recargar el corpus.
+    from services.lesson_corpus import corpus_enabled
+
+    return corpus_enabled() and os.getenv("LESSON_ALIAS_INDEX", "true").lower() in {"1", "true", "yes"}
+
+
+_ROMAN = {"i": 1, "v": 5, "x": 10, "l": 50, "c": 100}
+# Solo numerales canonicos hasta 199: "civil" o "vic" no son numeros.
+_ROMAN_PATTERN = r"(?=[ivxlc])c?(?:xc|xl|l?x{0,3})(?:ix|iv|v?i{0,3})"
+_ROMAN_RE = re.compile(r"^" + _ROMAN_PATTERN + r"$")
+# Numerales que tambien son palabras ("la leccion vi que..."): solo cuentan escritos en mayusculas.
+_ROMAN_WORDS = {"vi"}
+
+_NUMBER_WORDS = {
+    "uno": 1, "una": 1, "primer": 1, "primero": 1, "primera": 1,
+    "dos": 2, "segundo": 2, "segunda": 2,
+    "tres": 3, "tercer": 3, "tercero": 3, "tercera": 3,
+    "cuatro": 4, "cuarto": 4, "cuarta": 4,
+    "cinco": 5, "quinto": 5, "quinta": 5,
+    "seis": 6, "sexto": 6, "sexta": 6,
+    "siete": 7, "septimo": 7, "septima": 7,
+    "ocho": 8, "octavo": 8, "octava": 8,
+    "nueve": 9, "noveno": 9, "novena": 9,
+    "diez": 10, "decimo": 10, "decima": 10,
+}
+
+
+def _roman_to_int(token: str) -> Optional[int]:
+    if not token or not _ROMAN_RE.match(token):
+        return None
+    total = 0
+    prev = 0
+    for ch in reversed(token):
+        value = _ROMAN[ch]
+        total = total - value if value < prev else total + value
+        prev = max(prev, value)
+    return total if 0 < total < 200 else None
+
+
+def _to_int(token: str) -> Optional[int]:
+    token = (token or "").strip().lower()
+    if token.isdigit():
+        return int(token)
+    if token in _NUMBER_WORDS:
+        return _NUMBER_WORDS[token]
+    return _roman_to_int(token)
+
+
+def _fold(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch)).lower()
+
+
+def _number_parts(value: Any) -> Tuple[int, ...]:
+    raw = str(value or "").strip().replace(" ", "").replace("/", ".").replace("-", ".")
+    parts: List[int] = []
+    for part in raw.split("."):
+        digits = re.sub(r"\D", "", part)
+        if digits:
+            parts.append(int(digits))
+    return tuple(parts)
+
+
+_NUM_TOKEN = (
+    r"(\d{1,3}|\b" + _ROMAN_PATTERN + r"\b|\b(?:"
+    + "|".join(sorted(_NUMBER_WORDS, key=len, reverse=True)) + r")\b)"
+)
+_KEYWORD_RE = {
+    "unidad": re.compile(r"\bunidad(?:es)?\s*(?:n(?:o|um|umero)?\.?\s*)?" + _NUM_TOKEN + r"\b"),
+    "tema": re.compile(r"\btema\s*(?:n(?:o|um|umero)?\.?\s*)?" + _NUM_TOKEN + r"\b"),
+    "leccion": re.compile(r"\bleccion\s*(?:n(?:o|um|umero)?\.?\s*)?" + _NUM_TOKEN + r"\b(?!\s*[./-]\s*\d)"),
+}
+_ORDINAL_TOKEN = r"(" + "|".join(sorted((w for w in _NUMBER_WORDS if w not in {"uno", "una"}), key=len, reverse=True)) + r")"
+# "la cuarta leccion", "segundo tema"
+_ORDINAL_BEFORE_RE = {
+    key: re.compile(r"\b" + _ORDINAL_TOKEN + r"\s+" + key + r"\b") for key in ("unidad", "tema", "leccion")
+}
+_EXPLICIT_RE = re.compile(r"\b(?:unidad|tema|leccion)")
+_BARE_REF_RE = re.compile(r"^\s*\d{1,3}\s*[./-]\s*\d{1,3}(?:\s*[./-]\s*\d{1,3})?\s*[.?!]*\s*$")
+_DOTTED_RE = re.compile(r"(?<![\d.])(\d{1,3})\s*[./-]\s*(\d{1,3})(?:\s*[./-]\s*(\d{1,3}))?(?![\d.])")
+
+
+class LessonRef(NamedTuple):
+    unidad: Optional[int] = None
+    tema: Optional[int] = None
+    leccion: Optional[int] = None
+    numero: Optional[Tuple[int, ...]] = None  # "4.2", "4-2", "4/2" tal como lo escribio el estudiante
+    explicit: bool = False  # menciona unidad/tema/leccion o el mensaje es solo la referencia
+
+    @property
+    def empty(self) -> bool:
+        return self.unidad is None and self.tema is None and self.leccion is None and not self.numero
+
+    @property
+    def text(self) -> Optional[str]:
+        if self.numero:
+            return ".".join(str(p) for p in self.numero)
+        return str(self.leccion) if self.leccion is not None else None
+
+
+def parse_lesson_ref(text: str) -> LessonRef:
+    """Extrae unidad/tema/leccion de cualquier notacion aceptada (4.2, 4-2, 4/2, IV, cuarta...)."""
+    folded = _fold(text)
+    found: Dict[str, Optional[int]] = {}
+    for key, pattern in _KEYWORD_RE.items():
+        match = pattern.search(folded) or _ORDINAL_BEFORE_RE[key].search(folded)
+        token = match.group(1) if match else None
+        if token in _ROMAN_WORDS and not re.search(r"\b" + token.upper() + r"\b", text or ""):
+            token = None
+        found[key] = _to_int(token) if token else None
+    dotted = _DOTTED_RE.search(folded)
+    numero = tuple(int(g) for g in dotted.groups() if g) if dotted else None
+    # "2/3" dentro de un ejercicio no es una referencia a una leccion.
+    explicit = bool(_EXPLICIT_RE.search(folded) or _BARE_REF_RE.match(folded))
+    return LessonRef(found["unidad"], found["tema"], found["leccion"], numero, explicit)
+
+
+class Resolution(NamedTuple):
+    item: Optional[Dict[str, Any]]
+    candidates: List[Dict[str, Any]]
+
+    @property
+    def ambiguous(self) -> bool:
+        return self.item is None and len(self.candidates) > 1
+
+
+class LessonAliasIndex:
+    """Indice en memoria de todas las formas de referirse a una leccion.
+
+    Cada clave (numero completo, unidad+leccion, unidad+tema+leccion, leccion
+    sola) apunta a los items del corpus que la cumplen, asi que resolver una
+    referencia son unas pocas busquedas en diccionarios y nunca una consulta.
+    """
+
+    def __init__(self, items: Iterable[Mapping[str, Any]]) -> None:
+        self._by_numero: Dict[Tuple[int, ...], List[Dict[str, Any]]] = {}
+        self._by_unit_tema_lesson: Dict[Tuple[int, int, int], List[Dict[str, Any]]] = {}
+        self._by_unit_lesson: Dict[Tuple[int, int], List[Dict[str, Any]]] = {}
+        self._by_lesson: Dict[int, List[Dict[str, Any]]] = {}
+        count = 0
+        for raw in items:
+            item = dict(raw)
+            unidad = item.get("unidad")
+            parts = _number_parts(item.get("leccion"))
+            if unidad is None or not parts:
+                continue
+            unidad = int(unidad)
+            tema = parts[-2] if len(parts) > 1 else None
+            if tema is None and item.get("tema_numero") is not None:
+                tema_parts = _number_parts(item.get("tema_numero"))
+                tema = tema_parts[0] if tema_parts else None
+            ordinal = parts[-1]
+            self._by_numero.setdefault(parts, []).append(item)
+            if tema is not None:
+                self._by_unit_tema_lesson.setdefault((unidad, tema, ordinal), []).append(item)
+            self._by_unit_lesson.setdefault((unidad, ordinal), []).append(item)
+            self._by_lesson.setdefault(ordinal, []).append(item)
+            count += 1
+        self.count = count
+        self.keys = (
+            len(self._by_numero) + len(self._by_unit_tema_lesson) + len(self._by_unit_lesson) + len(self._by_lesson)
+        )
+
+    def _candidates(self, ref: LessonRef) -> List[Tuple[float, Dict[str, Any]]]:
+        scored: List[Tuple[float, Dict[str, Any]]] = []
+
+        def _add(score: float, items: Iterable[Dict[str, Any]], unidad: Optional[int] = None) -> None:
+            for it in items:
+                if unidad is None or it.get("unidad") == unidad:
+                    scored.append((score, it))
+
+        numero = ref.numero
+        if numero and len(numero) >= 3:
+            u, t, l = numero[-3], numero[-2], numero[-1]
+            _add(1.0, self._by_unit_tema_lesson.get((u, t, l), ()))
+        elif numero:
+            a, b = numero
+            if ref.unidad is not None:
+                _add(1.0, self._by_unit_tema_lesson.get((ref.unidad, a, b), ()))
+                _add(0.9, self._by_numero.get(numero, ()), unidad=ref.unidad)
+                _add(0.6, self._by_unit_lesson.get((ref.unidad, b), ()))
+            else:
+                # "4.2" sin unidad: numero de leccion 4.2 (en la unidad 4 primero) o unidad 4 leccion 2.
+                _add(0.95, self._by_numero.get(numero, ()), unidad=a)
+                _add(0.9, self._by_numero.get(numero, ()))
+                _add(0.8, self._by_unit_lesson.get((a, b), ()))
+        elif ref.leccion is not None:
+            if ref.unidad is not None and ref.tema is not None:
+                _add(1.0, self._by_unit_tema_lesson.get((ref.unidad, ref.tema, ref.leccion), ()))
+            elif ref.unidad is not None:
+                _add(0.8, self._by_unit_lesson.get((ref.unidad, ref.leccion), ()))
+            elif ref.tema is not None:
+                _add(0.9, self._by_numero.get((ref.tema, ref.leccion), ()))
+            else:
+                _add(0.5, self._by_lesson.get(ref.leccion, ()))
+        return scored
+
+    def resolve(self, ref: LessonRef, max_candidates: int = 6) -> Resolution:
+        best: Dict[Tuple[Any, ...], Tuple[float, Dict[str, Any]]] = {}
+        for score, item in self._candidates(ref):
+            key = (item.get("source"), item.get("id"), item.get("unidad"), item.get("leccion"))
+            if key not in best or best[key][0] < score:
+                best[key] = (score, item)
+        ranked = sorted(
+            best.values(),
+            key=lambda c: (-c[0], c[1].get("unidad") or 0, _number_parts(c[1].get("leccion"))),
+        )
+        candidates = [dict(item, score=score) for score, item in ranked[:max_candidates]]
+        if not candidates:
+            return Resolution(None, [])
+        top = ranked[0][0]
+        if len(ranked) == 1 or ranked[1][0] < top:
+            return Resolution(dict(ranked[0][1]), candidates)
+        return Resolution(None, candidates)
+
+    def info(self) -> Dict[str, Any]:
+        return {"lessons": self.count, "keys": self.keys}
+
+
+_index: Optional[LessonAliasIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_alias_index() -> Optional[LessonAliasIndex]:
+    if not aliases_enabled():
+        return None
+    return _index
+
+
+def rebuild_alias_index(items: Iterable[Mapping[str, Any]]) -> LessonAliasIndex:
+    global _index
+    with _index_lock:
+        index = LessonAliasIndex(items)
+        _index = index
+    logger.info("Indice de alias de lecciones listo: %s", index.info())
+    return index
+
+
+def load_alias_index_at_startup() -> None:
+    if not aliases_enabled() or _index is not None:
+        return
+    from db import SessionLocal
+    from services.lesson_corpus import LessonCorpus
+
+    try:
+        with SessionLocal() as db:
+            rebuild_alias_index(LessonCorpus.load(db, 0).items)
+    except Exception as exc:
+        logger.warning("No se pudo construir el indice de alias de lecciones: %s", exc)
@@ -0,0 +1,257 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+
+def bm25_enabled() -> bool:
+    # El indice solo se reconstruye al recargar el corpus; sin corpus quedaria desactualizado.
+    from services.lesson_corpus import corpus_enabled
+
+    return corpus_enabled() and os.getenv("LESSON_SEARCH_BM25", "true").lower() in {"1", "true", "yes"}
+
+
+_STOPWORDS = frozenset(
+    """
+    a al algo algun alguna algunas alguno algunos ante antes aqui asi aun bajo bien cada casi
+    como con contra cual cuales cuando de del desde donde dos el ella ellas ellos en entre era
+    eran es esa esas ese eso esos esta estan estas este esto estos fue fueron ha hay hasta la
+    las le les lo los mas me mi mientras muy ni no nos o otra otras otro otros para pero poco
+    por porque que quien se sea segun ser si sin sobre solo son su sus tambien tan tanto te
+    tiene tienen todo todos tu un una unas uno unos y ya
+    leccion lecciones tema temas unidad explica explicame dame quiero favor
+    """.split()
+)
+
+_TOKEN_RE = re.compile(r"[0-9a-z]+")
+
+# Peso de cada campo al contar terminos: el titulo pesa mas que la teoria.
+_FIELD_WEIGHTS: Tuple[Tuple[str, float], ...] = (
+    ("titulo", 3.0),
+    ("tema", 2.0),
+    ("objetivo", 1.0),
+    ("formulas", 1.0),
+    ("teoria", 1.0),
+)
+
+
+def _fold(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch)).lower()
+
+
+def _light_stem(word: str) -> str:
+    # Solo unifica singular/plural ("ecuaciones" -> "ecuacion", "raices" -> "raiz").
+    if len(word) <= 4 or word.isdigit():
+        return word
+    if word.endswith("ces"):
+        return word[:-3] + "z"
+    if word.endswith("es") and word[-3] in "lnrd":
+        return word[:-2]
+    if word.endswith("s"):
+        return word[:-1]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """Tokens en espanol sin acentos ni palabras vacias."""
+    return [
+        _light_stem(tok)
+        for tok in _TOKEN_RE.findall(_fold(text))
+        if tok not in _STOPWORDS and (len(tok) > 1 or tok.isdigit())
+    ]
+
+
+def _doc_key(item: Mapping[str, Any]) -> Tuple[Any, ...]:
+    if item.get("id") is not None:
+        return (item.get("source"), item.get("id"))
+    return (item.get("source"), item.get("unidad"), item.get("leccion"), item.get("titulo"))
+
+
+def _doc_hash(item: Mapping[str, Any]) -> str:
+    digest = hashlib.sha1()
+    for field, _weight in _FIELD_WEIGHTS:
+        digest.update(str(item.get(field) or "").encode("utf-8", "replace"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+def _term_counts(item: Mapping[str, Any]) -> Dict[str, float]:
+    counts: Dict[str, float] = {}
+    for field, weight in _FIELD_WEIGHTS:
+        for tok in tokenize(str(item.get(field) or "")):
+            counts[tok] = counts.get(tok, 0.0) + weight
+    return counts
+
+
+class BM25Index:
+    """Indice BM25 en memoria sobre las lecciones del corpus.
+
+    Las listas de postings se guardan en formato CSR (``indptr``/``doc_ids``/
+    ``weights``) con el peso BM25 de cada par termino-documento ya calculado,
+    asi una consulta solo suma segmentos con ``np.bincount``.
+    """
+
+    def __init__(
+        self,
+        items: Iterable[Mapping[str, Any]],
+        previous: Optional["BM25Index"] = None,
+        k1: float = 1.5,
+        b: float = 0.75,
+    ) -> None:
+        started = time.perf_counter()
+        self.k1 = k1
+        self.b = b
+        self.built_at = time.time()
+
+        old_cache = previous._cache if previous is not None else {}
+        cache: Dict[Tuple[Any, ...], Tuple[str, Dict[str, float]]] = {}
+        docs: List[Dict[str, Any]] = []
+        doc_counts: List[Dict[str, float]] = []
+        reused = 0
+        for item in items:
+            key = _doc_key(item)
+            if key in cache:
+                continue
+            digest = _doc_hash(item)
+            cached = old_cache.get(key)
+            if cached is not None and cached[0] == digest:
+                counts = cached[1]
+                reused += 1
+            else:
+                counts = _term_counts(item)
+            cache[key] = (digest, counts)
+            docs.append(dict(item))
+            doc_counts.append(counts)
+        self._cache = cache
+        self.docs: Tuple[Dict[str, Any], ...] = tuple(docs)
+        self.reused = reused
+        self.tokenized = len(docs) - reused
+
+        n_docs = len(docs)
+        vocab: Dict[str, int] = {}
+        postings: List[List[Tuple[int, float]]] = []
+        doc_len = np.zeros(n_docs, dtype=np.float32)
+        for doc_id, counts in enumerate(doc_counts):
+            doc_len[doc_id] = sum(counts.values())
+            for term, tf in counts.items():
+                term_id = vocab.get(term)
+                if term_id is None:
+                    term_id = len(postings)
+                    vocab[term] = term_id
+                    postings.append([])
+                postings[term_id].append((doc_id, tf))
+
+        indptr = np.zeros(len(postings) + 1, dtype=np.int64)
+        for term_id, plist in enumerate(postings):
+            indptr[term_id + 1] = indptr[term_id] + len(plist)
+        doc_ids = np.fromiter((d for plist in postings for d, _tf in plist), dtype=np.int32, count=int(indptr[-1]))
+        tfs = np.fromiter((tf for plist in postings for _d, tf in plist), dtype=np.float32, count=int(indptr[-1]))
+
+        df = np.diff(indptr).astype(np.float32)
+        idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        avgdl = float(doc_len.mean()) if n_docs else 0.0
+        norm = k1 * (1.0 - b + b * doc_len / avgdl) if avgdl > 0 else np.full(n_docs, k1, dtype=np.float32)
+        term_of_posting = np.repeat(np.arange(len(postings), dtype=np.int32), np.diff(indptr))
+        weights = idf[term_of_posting] * tfs * (k1 + 1.0) / (tfs + norm[doc_ids])
+
+        self._vocab = vocab
+        self._indptr = indptr
+        self._doc_ids = doc_ids
+        self._weights = weights.astype(np.float32)
+        self._units = np.array(
+            [d.get("unidad") if d.get("unidad") is not None else -1 for d in docs], dtype=np.int64
+        )
+        self.build_ms = (time.perf_counter() - started) * 1000.0
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def search(self, query: str, limit: int = 3, unidad: Optional[int] = None) -> List[Dict[str, Any]]:
+        term_ids = sorted({self._vocab[t] for t in tokenize(query) if t in self._vocab})
+        if not term_ids or not self.docs:
+            return []
+        if len(term_ids) == 1:
+            start, end = self._indptr[term_ids[0]], self._indptr[term_ids[0] + 1]
+            docs = self._doc_ids[start:end]
+            weights = self._weights[start:end]
+        else:
+            docs = np.concatenate([self._doc_ids[self._indptr[t]:self._indptr[t + 1]] for t in term_ids])
+            weights = np.concatenate([self._weights[self._indptr[t]:self._indptr[t + 1]] for t in term_ids])
+        scores = np.bincount(docs, weights=weights, minlength=len(self.docs))
+        if unidad is not None:
+            scores[self._units != int(unidad)] = 0.0
+        candidates = np.flatnonzero(scores > 0)
+        if candidates.size == 0:
+            return []
+        k = min(max(1, limit), candidates.size)
+        if candidates.size > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        order = candidates[np.argsort(-scores[candidates], kind="stable")]
+        results: List[Dict[str, Any]] = []
+        for doc_id in order:
+            item = dict(self.docs[doc_id])
+            item["score"] = float(scores[doc_id])
+            results.append(item)
+        return results
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "docs": len(self.docs),
+            "terms": len(self._vocab),
+            "postings": int(self._doc_ids.size),
+            "reused": self.reused,
+            "tokenized": self.tokenized,
+            "build_ms": round(self.build_ms, 2),
+            "built_at": self.built_at,
+        }
+
+
+_index: Optional[BM25Index] = None
+_index_lock = threading.Lock()
+
+
+def get_bm25_index() -> Optional[BM25Index]:
+    if not bm25_enabled():
+        return None
+    return _index
+
+
+def rebuild_bm25_index(items: Iterable[Mapping[str, Any]]) -> BM25Index:
+    """Reconstruye el indice reutilizando los tokens de las lecciones sin cambios."""
+    global _index
+    with _index_lock:
+        index = BM25Index(items, previous=_index)
+        _index = index
+    logger.info("Indice BM25 de lecciones listo: %s", index.info())
+    return index
+
+
+def search_bm25(query: str, limit: int = 3, unidad: Optional[int] = None) -> Optional[List[Dict[str, Any]]]:
+    """Top-k por BM25. None si el indice no esta cargado."""
+    index = get_bm25_index()
+    if index is None or not len(index):
+        return None
+    return index.search(query, limit=limit, unidad=unidad)
+
+
+def load_bm25_index_at_startup() -> None:
+    if not bm25_enabled() or _index is not None:
+        return
+    from db import SessionLocal
+    from services.lesson_corpus import LessonCorpus
+
+    try:
+        with SessionLocal() as db:
+            rebuild_bm25_index(LessonCorpus.load(db, 0).items)
+    except Exception as exc:
+        logger.warning("No se pudo construir el indice BM25 de lecciones: %s", exc)
@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, NamedTuple, Optional
+
+from fastapi.encoders import jsonable_encoder
+
+
+def catalogue_cache_enabled() -> bool:
+    return os.getenv("LESSON_CATALOGUE_CACHE", "true").lower() in {"1", "true", "yes"}
+
+
+def catalogue_cache_ttl() -> float:
+    # Red de seguridad para cambios hechos fuera del servidor (scripts de seed).
+    try:
+        return max(0.0, float(os.getenv("LESSON_CATALOGUE_TTL", "300")))
+    except ValueError:
+        return 300.0
+
+
+def catalogue_cache_size() -> int:
+    # Una entrada por area conocida mas el catalogo completo.
+    try:
+        return max(1, int(os.getenv("LESSON_CATALOGUE_CACHE_SIZE", "8")))
+    except ValueError:
+        return 8
+
+
+def lesson_detail_cache_size() -> int:
+    try:
+        return max(1, int(os.getenv("LESSON_DETAIL_CACHE_SIZE", "512")))
+    except ValueError:
+        return 512
+
+
+def serialize_payload(payload: Any) -> bytes:
+    """JSON con el mismo formato que ``JSONResponse`` de FastAPI."""
+    return json.dumps(
+        jsonable_encoder(payload),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def etag_for(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == "*" or candidate == etag:
+            return True
+    return False
+
+
+class CatalogueEntry(NamedTuple):
+    body: bytes
+    etag: str
+    built_at: float
+
+
+class CatalogueCache:
+    """Respuestas JSON ya serializadas (catalogo por ``area``, detalle por leccion).
+
+    Las entradas se descartan con ``invalidate()`` (recarga del corpus o del
+    esquema) o al vencer ``LESSON_CATALOGUE_TTL``. El ETag es el hash del
+    contenido, asi que reconstruir una respuesta sin cambios no invalida las
+    copias de los navegadores. Con ``max_entries`` se expulsa la menos usada.
+    """
+
+    def __init__(self, max_entries: Optional[Callable[[], int]] = None) -> None:
+        self._entries: "OrderedDict[Hashable, CatalogueEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._max_entries = max_entries
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[CatalogueEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            ttl = catalogue_cache_ttl()
+            if entry is not None and ttl and time.time() - entry.built_at > ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: Hashable, payload: Any, generation: int) -> CatalogueEntry:
+        body = serialize_payload(payload)
+        entry = CatalogueEntry(body, etag_for(body), time.time())
+        with self._lock:
+            # Si hubo una invalidacion mientras se construia, no se guarda la copia vieja.
+            if generation == self.generation:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                limit = self._max_entries() if self._max_entries is not None else None
+                while limit is not None and len(self._entries) > limit:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return entry
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._entries = OrderedDict()
+
+    def info(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": catalogue_cache_enabled(),
+            "generation": self.generation,
+            "entries": len(self._entries),
+            "bytes": sum(len(e.body) for e in self._entries.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+        }
+
+
+catalogue_cache = CatalogueCache(max_entries=catalogue_cache_size)
+lesson_detail_cache = CatalogueCache(max_entries=lesson_detail_cache_size)
+
+
+def invalidate_catalogue_cache() -> None:
+    catalogue_cache.invalidate()
+    lesson_detail_cache.invalidate()
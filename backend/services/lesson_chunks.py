@@ -0,0 +1,223 @@
+import math
+import os
+import re
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Mapping, NamedTuple, Optional, Set, Tuple
+
+from services.lesson_bm25 import tokenize
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return max(1, int(os.getenv(name, str(default))))
+    except ValueError:
+        return default
+
+
+def chunk_tokens() -> int:
+    return _env_int("LESSON_CHUNK_TOKENS", 180)
+
+
+def chunk_overlap() -> int:
+    return _env_int("LESSON_CHUNK_OVERLAP", 40)
+
+
+def context_token_budget() -> int:
+    return _env_int("CHAT_CONTEXT_TOKEN_BUDGET", 900)
+
+
+_TOKEN_PIECE_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+def estimate_tokens(text: str) -> int:
+    """Aproximacion del numero de tokens del modelo (~1.3 por palabra en espanol, 1 por simbolo)."""
+    if not text:
+        return 0
+    words = symbols = 0
+    for piece in _TOKEN_PIECE_RE.findall(text):
+        if piece[0].isalnum() or piece[0] == "_":
+            words += 1
+        else:
+            symbols += 1
+    return int(math.ceil(words * 1.3)) + symbols
+
+
+# Bloques que nunca se parten: $$...$$, \[...\], $...$ y lineas que son solo una formula.
+_FORMULA_RE = re.compile(
+    r"\$\$.+?\$\$|\\\[.+?\\\]|\$[^$\n]+\$|^(?![^\n]*[.!?]\s)[ \t]*[^\n]*=[^\n]*$",
+    re.DOTALL | re.MULTILINE,
+)
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+|\n\s*\n")
+
+
+class Passage(NamedTuple):
+    index: int
+    text: str
+    tokens: int
+    overlap: int = 0  # caracteres iniciales repetidos del pasaje anterior
+
+
+def _units(text: str) -> List[str]:
+    """Oraciones del texto; cada formula queda pegada a la oracion que la introduce."""
+    units: List[str] = []
+    pos = 0
+    for match in _FORMULA_RE.finditer(text):
+        prose = text[pos:match.start()]
+        units.extend(part.strip() for part in _SENTENCE_END_RE.split(prose) if part and part.strip())
+        formula = match.group(0).strip()
+        if formula:
+            if units and not re.search(r"[.!?]$", units[-1]):
+                units[-1] = f"{units[-1]} {formula}"
+            else:
+                units.append(formula)
+        pos = match.end()
+    units.extend(part.strip() for part in _SENTENCE_END_RE.split(text[pos:]) if part and part.strip())
+    return units
+
+
+@lru_cache(maxsize=4096)
+def chunk_text(text: str, max_tokens: int, overlap: int) -> Tuple[Passage, ...]:
+    """Parte el texto en pasajes solapados de como mucho ``max_tokens`` (salvo formulas muy largas)."""
+    units = [(u, estimate_tokens(u)) for u in _units(text or "")]
+    passages: List[Passage] = []
+    current: List[Tuple[str, int]] = []
+    current_tokens = 0
+    carried_chars = 0
+    for unit, tokens in units:
+        if current and current_tokens + tokens > max_tokens:
+            passages.append(Passage(len(passages), " ".join(u for u, _t in current), current_tokens, carried_chars))
+            carried: List[Tuple[str, int]] = []
+            carried_tokens = 0
+            for prev in reversed(current):
+                if carried_tokens + prev[1] > overlap or carried_tokens + prev[1] + tokens > max_tokens:
+                    break
+                carried.insert(0, prev)
+                carried_tokens += prev[1]
+            current, current_tokens = carried, carried_tokens
+            carried_chars = sum(len(u) + 1 for u, _t in carried)
+        current.append((unit, tokens))
+        current_tokens += tokens
+    if current:
+        passages.append(Passage(len(passages), " ".join(u for u, _t in current), current_tokens, carried_chars))
+    return tuple(passages)
+
+
+def lesson_passages(item: Mapping[str, Any]) -> Tuple[Passage, ...]:
+    return chunk_text(str(item.get("teoria") or "").strip(), chunk_tokens(), chunk_overlap())
+
+
+def prime_passages(items: Iterable[Mapping[str, Any]]) -> int:
+    """Trocea por adelantado la teoria de todas las lecciones (se llama al cargar el corpus)."""
+    count = 0
+    for item in items:
+        count += len(lesson_passages(item))
+    return count
+
+
+def _clean(value: Any) -> str:
+    return str(value).strip() if value is not None else ""
+
+
+def _header(item: Mapping[str, Any]) -> str:
+    titulo = _clean(item.get("titulo")) or "Sin titulo"
+    tema = _clean(item.get("tema"))
+    suffix = f" (Tema: {tema})" if tema else ""
+    return f"Unidad {item.get('unidad') or '?'} - Leccion {item.get('leccion') or '?'}: {titulo}{suffix}"
+
+
+def pack_lesson_context(items: List[Mapping[str, Any]], query: Optional[str], budget: Optional[int] = None) -> str:
+    """Arma el contexto de BD con los pasajes mas relevantes que caben en ``budget`` tokens.
+
+    Cada leccion aporta su encabezado, objetivo y formulas (si caben) y los
+    pasajes de teoria con mejor puntaje frente a la pregunta.
+    """
+    budget = budget or context_token_budget()
+    query_terms = set(tokenize(query or ""))
+
+    fields: Dict[int, Dict[str, str]] = {}
+    pool: List[Tuple[int, Passage, Set[str]]] = []
+    for rank, item in enumerate(items):
+        fields[rank] = {
+            "objetivo": _clean(item.get("objetivo")),
+            "formulas": _clean(item.get("formulas")),
+        }
+        for passage in lesson_passages(item):
+            pool.append((rank, passage, query_terms.intersection(tokenize(passage.text))))
+
+    # Los terminos de la pregunta que aparecen en pocos pasajes pesan mas.
+    df: Dict[str, int] = {}
+    for _rank, _passage, matched in pool:
+        for term in matched:
+            df[term] = df.get(term, 0) + 1
+    candidates: List[Tuple[float, int, Passage]] = []
+    for rank, passage, matched in pool:
+        score = sum(math.log(1.0 + len(pool) / df[t]) for t in matched)
+        score += 1.0 / (1 + rank) + (0.25 if passage.index == 0 else 0.0)
+        candidates.append((score, rank, passage))
+    candidates.sort(key=lambda c: (-c[0], c[1], c[2].index))
+
+    used = 0
+    chosen: Dict[int, List[Passage]] = {}
+
+    def _include_item(rank: int) -> bool:
+        nonlocal used
+        header_cost = estimate_tokens(_header(items[rank]))
+        if used + header_cost > budget:
+            return False
+        used += header_cost
+        # Objetivo y formulas solo si caben.
+        for key, value in fields[rank].items():
+            cost = estimate_tokens(value)
+            if value and used + cost <= budget:
+                used += cost
+            else:
+                fields[rank][key] = ""
+        chosen[rank] = []
+        return True
+
+    if items:
+        _include_item(0)
+    for _score, rank, passage in candidates:
+        if rank not in chosen and not _include_item(rank):
+            continue
+        if used + passage.tokens > budget:
+            continue
+        chosen[rank].append(passage)
+        used += passage.tokens
+    for rank in range(len(items)):
+        if rank not in chosen:
+            _include_item(rank)
+    if 0 in chosen and not any(chosen.values()):
+        first = lesson_passages(items[0])
+        remaining = max(0, budget - used) * 4
+        if first and remaining > 3:
+            text = first[0].text[: remaining - 3] + "..."
+            chosen[0].append(Passage(0, text, estimate_tokens(text)))
+
+    blocks: List[str] = []
+    for rank in sorted(chosen):
+        lines = [_header(items[rank])]
+        if fields[rank]["objetivo"]:
+            lines.append(f"Objetivo principal: {fields[rank]['objetivo']}")
+        selected = sorted(chosen[rank], key=lambda p: p.index)
+        if selected:
+            parts: List[str] = []
+            prev_index: Optional[int] = None
+            for passage in selected:
+                if prev_index is not None and passage.index == prev_index + 1:
+                    # Pasajes contiguos: no repetir el solapamiento.
+                    parts.append(passage.text[passage.overlap:])
+                else:
+                    if prev_index is not None:
+                        parts.append("[...]")
+                    parts.append(passage.text)
+                prev_index = passage.index
+            lines.append("Teoria base: " + " ".join(parts))
+        if fields[rank]["formulas"]:
+            lines.append(f"Formulas clave: {fields[rank]['formulas']}")
+        actividades = _clean(items[rank].get("actividades"))
+        if actividades and used + estimate_tokens(actividades) <= budget:
+            lines.append(f"Actividades sugeridas: {actividades}")
+            used += estimate_tokens(actividades)
+        blocks.append("\n".join(lines))
+    return "\n\n---\n\n".join(blocks)
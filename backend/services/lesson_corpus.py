@@ -0,0 +1,238 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from services.lesson_aliases import aliases_enabled, rebuild_alias_index
+from services.lesson_bm25 import bm25_enabled, rebuild_bm25_index
+from services.lesson_catalogue import invalidate_catalogue_cache
+from services.lesson_chunks import prime_passages
+from utils.schema_registry import get_schema
+
+
+logger = logging.getLogger(__name__)
+
+
+def corpus_enabled() -> bool:
+    return os.getenv("LESSON_CORPUS_CACHE", "true").lower() in {"1", "true", "yes"}
+
+
+def _norm_lesson_str(s: str) -> str:
+    return s.strip().replace(" ", "").replace("/", ".").replace("-", ".")
+
+
+def _as_int(value: Any) -> Optional[int]:
+    try:
+        return int(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+
+
+_LESSONS_SQL = """
+    SELECT {id_col} AS id,
+           unit_number AS unidad,
+           lesson_number AS leccion,
+           COALESCE(lesson_title,'') AS titulo,
+           COALESCE(objective,'') AS objetivo,
+           COALESCE(theory,'') AS teoria,
+           COALESCE(key_formulas,'') AS formulas,
+           COALESCE(suggested_activities,'') AS actividades
+    FROM lessons
+"""
+
+_LECCIONES_SQL = """
+    SELECT l.id_leccion AS id,
+           u.numero AS unidad,
+           t.numero AS tema_numero,
+           l.numero AS leccion,
+           COALESCE(l.nombre,'') AS titulo,
+           COALESCE(t.titulo,'') AS tema,
+           COALESCE(l.teoria,'') AS teoria
+    FROM lecciones l
+    JOIN temas t ON l.id_tema=t.id_tema
+    JOIN unidades u ON t.id_unidad=u.id_unidad
+"""
+
+
+class LessonCorpus:
+    """Instantanea inmutable del curriculo usada por el chat en modo lecciones.
+
+    Reproduce en memoria las mismas reglas de ``_fetch_teoria_from_db``:
+    primero la tabla ``lessons`` y despues ``lecciones``/``temas``/``unidades``.
+    """
+
+    def __init__(self, lessons_rows: List[Dict[str, Any]], lecciones_rows: List[Dict[str, Any]], version: int) -> None:
+        self.version = version
+        self.loaded_at = time.time()
+
+        lessons_items: List[Dict[str, Any]] = []
+        lessons_exact: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        lessons_by_unit: Dict[str, List[Tuple[str, str, Dict[str, Any]]]] = {}
+        for row in lessons_rows:
+            if row.get("unidad") is None:
+                continue
+            unit_key = str(row["unidad"])
+            raw_number = str(row.get("leccion") or "")
+            item = {
+                "id": row.get("id"),
+                "source": "lessons",
+                "unidad": _as_int(row["unidad"]),
+                "leccion": row.get("leccion"),
+                "titulo": row.get("titulo") or "",
+                "tema": "",
+                "teoria": row.get("teoria") or "",
+                "objetivo": row.get("objetivo") or "",
+                "formulas": row.get("formulas") or "",
+                "actividades": row.get("actividades") or "",
+            }
+            lessons_items.append(item)
+            norm = _norm_lesson_str(raw_number)
+            lessons_exact.setdefault((unit_key, norm), item)
+            lessons_by_unit.setdefault(unit_key, []).append((raw_number, norm, item))
+        for entries in lessons_by_unit.values():
+            entries.sort(key=lambda e: e[0])
+
+        lecciones_items: List[Dict[str, Any]] = []
+        lecciones_exact: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        lecciones_by_suffix: Dict[Tuple[str, int], Dict[str, Any]] = {}
+        suffix_candidates: Dict[Tuple[str, int], List[Tuple[int, Dict[str, Any]]]] = {}
+        for row in lecciones_rows:
+            if row.get("unidad") is None:
+                continue
+            unit_key = str(row["unidad"])
+            numero = str(row.get("leccion") or "")
+            item = {
+                "id": row.get("id"),
+                "source": "lecciones",
+                "unidad": _as_int(row["unidad"]),
+                "tema_numero": row.get("tema_numero"),
+                "leccion": row.get("leccion"),
+                "titulo": row.get("titulo") or "",
+                "tema": row.get("tema") or "",
+                "teoria": row.get("teoria") or "",
+                "objetivo": "",
+                "formulas": "",
+                "actividades": "",
+            }
+            lecciones_items.append(item)
+            lecciones_exact.setdefault((unit_key, numero), item)
+            parts = numero.split(".")
+            suffix = _as_int(parts[1]) if len(parts) > 1 else None
+            if suffix is not None:
+                tema_order = _as_int(row.get("tema_numero"))
+                suffix_candidates.setdefault((unit_key, suffix), []).append(
+                    (tema_order if tema_order is not None else 0, item)
+                )
+        for key, candidates in suffix_candidates.items():
+            candidates.sort(key=lambda c: c[0])
+            lecciones_by_suffix[key] = candidates[0][1]
+
+        self._lessons_exact = MappingProxyType(lessons_exact)
+        self._lessons_by_unit = MappingProxyType({k: tuple(v) for k, v in lessons_by_unit.items()})
+        self._lecciones_exact = MappingProxyType(lecciones_exact)
+        self._lecciones_by_suffix = MappingProxyType(lecciones_by_suffix)
+        self.items: Tuple[Mapping[str, Any], ...] = tuple(
+            MappingProxyType(it) for it in lessons_items + lecciones_items
+        )
+
+        digest = hashlib.sha256()
+        for it in self.items:
+            digest.update(repr(sorted(it.items())).encode("utf-8", "replace"))
+        self.fingerprint = digest.hexdigest()[:16]
+
+    @classmethod
+    def load(cls, db: Session, version: int) -> "LessonCorpus":
+        schema = get_schema(db.get_bind())
+        lessons_rows: List[Dict[str, Any]] = []
+        lecciones_rows: List[Dict[str, Any]] = []
+        if schema.has_table("lessons"):
+            id_col = "id" if "id" in schema.columns("lessons") else "NULL"
+            lessons_rows = [dict(r) for r in db.execute(text(_LESSONS_SQL.format(id_col=id_col))).mappings().all()]
+        if schema.has_table("lecciones"):
+            lecciones_rows = [dict(r) for r in db.execute(text(_LECCIONES_SQL)).mappings().all()]
+        return cls(lessons_rows, lecciones_rows, version)
+
+    def lookup(self, unidad: Optional[int], leccion: Optional[int], tema: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        if unidad is None or leccion is None:
+            return None
+        unit_key = str(unidad)
+        lnum = f"{unidad}.{leccion}"
+        lnum_full = f"{tema}.{leccion}" if tema is not None else None
+
+        found: Optional[Dict[str, Any]] = None
+        strategy = "lessons_tema_leccion" if lnum_full is not None else "lessons_leccion"
+        if lnum_full is not None:
+            found = self._lessons_exact.get((unit_key, _norm_lesson_str(lnum_full)))
+        else:
+            suffix = f".{leccion}"
+            for _raw, norm, item in self._lessons_by_unit.get(unit_key, ()):
+                if norm.endswith(suffix) or norm == str(leccion):
+                    found = item
+                    break
+        if found is None:
+            strategy = "lecciones_numero"
+            found = self._lecciones_exact.get((unit_key, lnum_full if lnum_full is not None else lnum))
+        if found is None:
+            strategy = "lecciones_sufijo"
+            found = self._lecciones_by_suffix.get((unit_key, int(leccion)))
+        if found is None:
+            return None
+        result = dict(found)
+        result["leccion"] = result.get("leccion") or lnum
+        result["estrategia"] = strategy
+        return result
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "fingerprint": self.fingerprint,
+            "loaded_at": self.loaded_at,
+            "lessons": len(self._lessons_exact),
+            "lecciones": len(self._lecciones_exact),
+            "total": len(self.items),
+        }
+
+
+_corpus: Optional[LessonCorpus] = None
+_corpus_lock = threading.Lock()
+
+
+def get_lesson_corpus() -> Optional[LessonCorpus]:
+    if not corpus_enabled():
+        return None
+    return _corpus
+
+
+def reload_lesson_corpus(db: Session) -> LessonCorpus:
+    """Construye una nueva instantanea y la publica de forma atomica."""
+    global _corpus
+    with _corpus_lock:
+        version = (_corpus.version + 1) if _corpus is not None else 1
+        corpus = LessonCorpus.load(db, version)
+        _corpus = corpus
+    logger.info("Corpus de lecciones cargado: %s", corpus.info())
+    invalidate_catalogue_cache()
+    prime_passages(corpus.items)
+    if aliases_enabled():
+        rebuild_alias_index(corpus.items)
+    if bm25_enabled():
+        rebuild_bm25_index(corpus.items)
+    return corpus
+
+
+def load_lesson_corpus_at_startup() -> None:
+    if not corpus_enabled():
+        return
+    from db import SessionLocal
+
+    try:
+        with SessionLocal() as db:
+            reload_lesson_corpus(db)
+    except Exception as exc:
+        logger.warning("No se pudo cargar el corpus de lecciones; se usara la BD directamente: %s", exc)
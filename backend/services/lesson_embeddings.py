@@ -0,0 +1,229 @@
+import json
+import logging
+import os
+import threading
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_EMBEDDINGS_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_VECTORS_FILE = "lesson_vectors.npy"
+_META_FILE = "lesson_vectors.json"
+
+
+def semantic_enabled() -> bool:
+    return os.getenv("LESSON_SEARCH_SEMANTIC", "false").lower() in {"1", "true", "yes"}
+
+
+def embeddings_model_name() -> str:
+    return (os.getenv("LESSON_EMBEDDINGS_MODEL") or DEFAULT_EMBEDDINGS_MODEL).strip()
+
+
+def embeddings_dir() -> str:
+    return os.getenv("LESSON_EMBEDDINGS_DIR") or os.path.join(_BACKEND_DIR, "embeddings")
+
+
+def semantic_min_score() -> float:
+    try:
+        return float(os.getenv("LESSON_SEMANTIC_MIN_SCORE", "0.35"))
+    except ValueError:
+        return 0.35
+
+
+def passage_text(item: Mapping[str, Any], max_chars: int = 2000) -> str:
+    """Texto que representa a una leccion: titulo, tema, objetivo y el inicio de la teoria."""
+    parts = [item.get("titulo"), item.get("tema"), item.get("objetivo"), item.get("teoria")]
+    text = ". ".join(str(p).strip() for p in parts if p and str(p).strip())
+    return text[:max_chars]
+
+
+@lru_cache(maxsize=1)
+def _load_encoder(model_name: str):
+    # Import diferido: torch/transformers solo se cargan si la busqueda semantica esta activa.
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name)
+    model.to("cpu")
+    model.eval()
+    return torch, tokenizer, model
+
+
+def encode(texts: List[str], model_name: Optional[str] = None, batch_size: int = 32) -> np.ndarray:
+    """Embeddings normalizados (mean pooling) en CPU. Devuelve float32 de forma (n, dim)."""
+    torch, tokenizer, model = _load_encoder(model_name or embeddings_model_name())
+    chunks: List[np.ndarray] = []
+    with torch.no_grad():
+        for start in range(0, len(texts), batch_size):
+            batch = tokenizer(
+                texts[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=256,
+                return_tensors="pt",
+            )
+            output = model(**batch).last_hidden_state
+            mask = batch["attention_mask"].unsqueeze(-1).to(output.dtype)
+            pooled = (output * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+            pooled = torch.nn.functional.normalize(pooled, p=2, dim=1)
+            chunks.append(pooled.cpu().numpy().astype(np.float32))
+    if not chunks:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.vstack(chunks)
+
+
+@lru_cache(maxsize=256)
+def _encode_query(model_name: str, query: str) -> np.ndarray:
+    return encode([query], model_name=model_name)[0]
+
+
+def build_embeddings(items: Iterable[Mapping[str, Any]], fingerprint: Optional[str] = None, out_dir: Optional[str] = None) -> Dict[str, Any]:
+    """Calcula los embeddings de las lecciones y los guarda en float16 (.npy) junto a sus metadatos."""
+    out_dir = out_dir or embeddings_dir()
+    os.makedirs(out_dir, exist_ok=True)
+    model_name = embeddings_model_name()
+    docs: List[Dict[str, Any]] = []
+    texts: List[str] = []
+    for item in items:
+        text = passage_text(item)
+        if not text:
+            continue
+        docs.append({k: item.get(k) for k in ("id", "source", "unidad", "leccion", "titulo", "tema", "teoria", "objetivo", "formulas", "actividades")})
+        texts.append(text)
+    vectors = encode(texts, model_name=model_name).astype(np.float16)
+
+    # Escritura atomica: los workers en marcha siguen leyendo el archivo anterior.
+    vectors_path = os.path.join(out_dir, _VECTORS_FILE)
+    meta_path = os.path.join(out_dir, _META_FILE)
+    tmp_vectors = vectors_path + ".tmp.npy"
+    np.save(tmp_vectors, vectors)
+    meta = {
+        "model": model_name,
+        "dim": int(vectors.shape[1]) if vectors.ndim == 2 else 0,
+        "count": len(docs),
+        "fingerprint": fingerprint,
+        "docs": docs,
+    }
+    with open(meta_path + ".tmp", "w", encoding="utf-8") as fh:
+        json.dump(meta, fh, ensure_ascii=False)
+    os.replace(tmp_vectors, vectors_path)
+    os.replace(meta_path + ".tmp", meta_path)
+    return {k: v for k, v in meta.items() if k != "docs"}
+
+
+class SemanticIndex:
+    """Vectores de lecciones abiertos con ``np.memmap`` (solo lectura, paginas compartidas entre workers)."""
+
+    def __init__(self, vectors: np.ndarray, meta: Dict[str, Any]) -> None:
+        self.vectors = vectors
+        self.model = meta.get("model") or embeddings_model_name()
+        self.fingerprint = meta.get("fingerprint")
+        self.docs: Tuple[Dict[str, Any], ...] = tuple(meta.get("docs") or ())
+        if len(self.docs) != int(vectors.shape[0]):
+            raise ValueError("lesson_vectors.npy y lesson_vectors.json no coinciden")
+        self._units = np.array(
+            [d.get("unidad") if d.get("unidad") is not None else -1 for d in self.docs], dtype=np.int64
+        )
+
+    @classmethod
+    def open(cls, directory: Optional[str] = None) -> "SemanticIndex":
+        directory = directory or embeddings_dir()
+        with open(os.path.join(directory, _META_FILE), encoding="utf-8") as fh:
+            meta = json.load(fh)
+        vectors = np.load(os.path.join(directory, _VECTORS_FILE), mmap_mode="r")
+        return cls(vectors, meta)
+
+    def search(self, query: str, limit: int = 3, min_score: Optional[float] = None, unidad: Optional[int] = None) -> List[Dict[str, Any]]:
+        if not query or not self.docs:
+            return []
+        q = _encode_query(self.model, query.strip()).astype(np.float32)
+        scores = np.asarray(self.vectors @ q, dtype=np.float32)
+        if unidad is not None:
+            scores[self._units != int(unidad)] = -np.inf
+        threshold = semantic_min_score() if min_score is None else min_score
+        k = min(max(1, limit), scores.shape[0])
+        top = np.argpartition(-scores, k - 1)[:k] if scores.shape[0] > k else np.arange(scores.shape[0])
+        top = top[np.argsort(-scores[top], kind="stable")]
+        results: List[Dict[str, Any]] = []
+        for doc_id in top:
+            score = float(scores[doc_id])
+            if score < threshold:
+                break
+            item = dict(self.docs[doc_id])
+            item["score"] = score
+            results.append(item)
+        return results
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "count": len(self.docs),
+            "dim": int(self.vectors.shape[1]) if self.vectors.ndim == 2 else 0,
+            "fingerprint": self.fingerprint,
+        }
+
+
+_index: Optional[SemanticIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_semantic_index() -> Optional[SemanticIndex]:
+    if not semantic_enabled():
+        return None
+    return _index
+
+
+def reload_semantic_index() -> Optional[SemanticIndex]:
+    global _index
+    with _index_lock:
+        _index = SemanticIndex.open()
+    logger.info("Indice semantico de lecciones abierto: %s", _index.info())
+    return _index
+
+
+def search_semantic(query: str, limit: int = 3, unidad: Optional[int] = None) -> List[Dict[str, Any]]:
+    index = get_semantic_index()
+    if index is None:
+        return []
+    try:
+        return index.search(query, limit=limit, unidad=unidad)
+    except Exception as exc:
+        logger.warning("Busqueda semantica de lecciones fallo: %s", exc)
+        return []
+
+
+def load_semantic_index_at_startup() -> None:
+    global _index
+    if not semantic_enabled():
+        return
+    try:
+        index = reload_semantic_index()
+    except FileNotFoundError:
+        logger.warning(
+            "LESSON_SEARCH_SEMANTIC activo pero no hay embeddings en %s; ejecuta utils/build_lesson_embeddings.py",
+            embeddings_dir(),
+        )
+        return
+    except Exception as exc:
+        logger.warning("No se pudo abrir el indice semantico de lecciones: %s", exc)
+        return
+    # El modelo se carga (y si hace falta se descarga) aqui y no en la primera consulta del chat.
+    try:
+        _encode_query(index.model, "leccion")
+    except Exception as exc:
+        with _index_lock:
+            _index = None
+        logger.warning("No se pudo cargar el modelo %s; busqueda semantica desactivada: %s", index.model, exc)
+        return
+    from services.lesson_corpus import get_lesson_corpus
+
+    corpus = get_lesson_corpus()
+    if corpus is not None and index.fingerprint and index.fingerprint != corpus.fingerprint:
+        logger.warning("Los embeddings de lecciones son de otra version del curriculo; vuelve a generarlos")
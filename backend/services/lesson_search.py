@@ -0,0 +1,277 @@
+import logging
+import os
+import re
+import unicodedata
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from utils.schema_registry import get_schema
+
+
+logger = logging.getLogger(__name__)
+
+TS_CONFIG = "public.es_unaccent"
+
+
+def fulltext_enabled() -> bool:
+    return os.getenv("LESSON_SEARCH_FULLTEXT", "true").lower() in {"1", "true", "yes"}
+
+
+def fuzzy_enabled() -> bool:
+    return os.getenv("LESSON_SEARCH_FUZZY", "true").lower() in {"1", "true", "yes"}
+
+
+def fuzzy_threshold() -> float:
+    try:
+        return float(os.getenv("LESSON_FUZZY_THRESHOLD", "0.3"))
+    except ValueError:
+        return 0.3
+
+
+def _has_tsv(db: Session, table: str) -> bool:
+    if not fulltext_enabled():
+        return False
+    try:
+        return "search_tsv" in get_schema(db.get_bind()).columns(table)
+    except Exception:
+        return False
+
+
+def fulltext_available(db: Session) -> bool:
+    """True si alguna de las busquedas de texto completo de PostgreSQL esta disponible."""
+    return all(_has_tsv(db, t) for t in ("lecciones", "temas", "unidades")) or _has_tsv(db, "lessons")
+
+
+def _safe_rollback(db: Session) -> None:
+    try:
+        db.rollback()
+    except Exception:
+        pass
+
+
+# Cada rama filtra una sola tabla con ``@@`` para que use su indice GIN; un OR
+# sobre el join obliga a recorrer todo el resultado del join.
+_LECCIONES_FTS_SQL = f"""
+    WITH hits AS (
+        SELECT l.id_leccion
+        FROM lecciones l
+        WHERE l.search_tsv @@ websearch_to_tsquery('{TS_CONFIG}', :q)
+        UNION
+        SELECT l.id_leccion
+        FROM temas t
+        JOIN lecciones l ON l.id_tema=t.id_tema
+        WHERE t.search_tsv @@ websearch_to_tsquery('{TS_CONFIG}', :q)
+        UNION
+        SELECT l.id_leccion
+        FROM unidades u
+        JOIN temas t ON t.id_unidad=u.id_unidad
+        JOIN lecciones l ON l.id_tema=t.id_tema
+        WHERE u.search_tsv @@ websearch_to_tsquery('{TS_CONFIG}', :q)
+    )
+    SELECT u.numero AS unidad, l.numero AS leccion,
+           COALESCE(l.nombre,'') AS titulo,
+           COALESCE(t.titulo,'') AS tema,
+           COALESCE(l.teoria,'') AS teoria,
+           ts_rank_cd(l.search_tsv || t.search_tsv || u.search_tsv, websearch_to_tsquery('{TS_CONFIG}', :q)) AS score
+    FROM hits h
+    JOIN lecciones l ON l.id_leccion=h.id_leccion
+    JOIN temas t ON l.id_tema=t.id_tema
+    JOIN unidades u ON t.id_unidad=u.id_unidad
+    ORDER BY score DESC, u.numero ASC, l.numero ASC
+    LIMIT :lim
+"""
+
+_LESSONS_FTS_SQL = f"""
+    SELECT unit_number AS unidad, lesson_number AS leccion,
+           COALESCE(lesson_title,'') AS titulo, COALESCE(objective,'') AS objetivo,
+           COALESCE(theory,'') AS teoria, COALESCE(key_formulas,'') AS formulas,
+           COALESCE(suggested_activities,'') AS actividades,
+           ts_rank_cd(search_tsv, q) AS score
+    FROM lessons, websearch_to_tsquery('{TS_CONFIG}', :q) q
+    WHERE search_tsv @@ q {{unit_filter}}
+    ORDER BY score DESC
+    LIMIT :lim
+"""
+
+
+def search_lecciones_fulltext(db: Session, query: str, limit: int) -> Optional[List[Dict[str, Any]]]:
+    """Busqueda rankeada en lecciones/temas/unidades. None si no hay indice de texto completo."""
+    schema_ok = all(_has_tsv(db, t) for t in ("lecciones", "temas", "unidades"))
+    if not schema_ok:
+        return None
+    try:
+        rows = db.execute(text(_LECCIONES_FTS_SQL), {"q": query, "lim": max(1, limit)}).mappings().all()
+    except Exception as exc:
+        logger.warning("Busqueda de texto completo en lecciones fallo; se usa ILIKE: %s", exc)
+        _safe_rollback(db)
+        return None
+    return [
+        {
+            "unidad": int(r["unidad"]),
+            "leccion": r["leccion"],
+            "titulo": r["titulo"] or "",
+            "tema": r["tema"] or "",
+            "teoria": r["teoria"] or "",
+            "objetivo": "",
+            "formulas": "",
+            "actividades": "",
+            "score": float(r["score"] or 0.0),
+        }
+        for r in rows
+    ]
+
+
+def search_lessons_table_fulltext(db: Session, query: str, unidad: Optional[int], limit: int) -> Optional[List[Dict[str, Any]]]:
+    """Busqueda rankeada en la tabla ``lessons``. None si no hay indice de texto completo."""
+    if not _has_tsv(db, "lessons"):
+        return None
+    params: Dict[str, Any] = {"q": query, "lim": max(1, limit)}
+    unit_filter = ""
+    if unidad is not None:
+        unit_filter = "AND CAST(unit_number AS VARCHAR)=:wu"
+        params["wu"] = str(unidad)
+    try:
+        rows = db.execute(text(_LESSONS_FTS_SQL.format(unit_filter=unit_filter)), params).mappings().all()
+    except Exception as exc:
+        logger.warning("Busqueda de texto completo en lessons fallo; se usa ILIKE: %s", exc)
+        _safe_rollback(db)
+        return None
+    return [
+        {
+            "unidad": int(r["unidad"]),
+            "leccion": r["leccion"] or "",
+            "titulo": r["titulo"] or "",
+            "tema": "",
+            "teoria": r["teoria"] or "",
+            "objetivo": r["objetivo"] or "",
+            "formulas": r["formulas"] or "",
+            "actividades": r["actividades"] or "",
+            "score": float(r["score"] or 0.0),
+        }
+        for r in rows
+    ]
+
+
+# Palabras de relleno que el estudiante antepone al titulo ("leccion de ...").
+_FUZZY_FILLER = {
+    "leccion", "lecciones", "tema", "temas", "unidad", "clase", "de", "del", "la", "el", "los",
+    "las", "un", "una", "sobre", "acerca", "que", "es", "son", "explica", "explicame", "dame",
+    "quiero", "ver", "repasar", "estudiar", "por", "favor", "me", "y", "en", "a", "con",
+}
+
+
+def fuzzy_term(query: str) -> str:
+    """Normaliza la consulta como lo hace ``f_unaccent(lower(...))`` y quita el relleno."""
+    folded = unicodedata.normalize("NFKD", query or "")
+    folded = "".join(ch for ch in folded if not unicodedata.combining(ch)).lower()
+    words = [w for w in re.split(r"[^0-9a-z]+", folded) if w and w not in _FUZZY_FILLER]
+    return " ".join(words)
+
+
+def _fuzzy_available(db: Session) -> bool:
+    if not fuzzy_enabled():
+        return False
+    try:
+        schema = get_schema(db.get_bind())
+    except Exception:
+        return False
+    return schema.has_extension("pg_trgm") and schema.has_function("f_unaccent")
+
+
+_FUZZY_LECCIONES_SQL = """
+    SELECT * FROM (
+        SELECT 'leccion' AS kind, l.id_leccion AS id, u.numero AS unidad, l.numero AS leccion,
+               COALESCE(l.nombre,'') AS titulo, COALESCE(t.titulo,'') AS tema,
+               COALESCE(l.teoria,'') AS teoria,
+               similarity(public.f_unaccent(lower(l.nombre)), :term) AS score
+        FROM lecciones l
+        JOIN temas t ON l.id_tema=t.id_tema
+        JOIN unidades u ON t.id_unidad=u.id_unidad
+        WHERE public.f_unaccent(lower(l.nombre)) % :term
+        UNION ALL
+        (
+            SELECT DISTINCT ON (t.id_tema)
+                   'tema' AS kind, l.id_leccion AS id, u.numero AS unidad, l.numero AS leccion,
+                   COALESCE(l.nombre,'') AS titulo, COALESCE(t.titulo,'') AS tema,
+                   COALESCE(l.teoria,'') AS teoria,
+                   similarity(public.f_unaccent(lower(t.titulo)), :term) AS score
+            FROM temas t
+            JOIN unidades u ON t.id_unidad=u.id_unidad
+            JOIN lecciones l ON l.id_tema=t.id_tema
+            WHERE public.f_unaccent(lower(t.titulo)) % :term
+            ORDER BY t.id_tema, l.numero
+        )
+    ) candidates
+    ORDER BY score DESC
+    LIMIT :lim
+"""
+
+_FUZZY_LESSONS_SQL = """
+    SELECT 'lesson' AS kind, {id_col} AS id, unit_number AS unidad, lesson_number AS leccion,
+           COALESCE(lesson_title,'') AS titulo, COALESCE(objective,'') AS objetivo,
+           COALESCE(theory,'') AS teoria, COALESCE(key_formulas,'') AS formulas,
+           COALESCE(suggested_activities,'') AS actividades,
+           similarity(public.f_unaccent(lower(lesson_title)), :term) AS score
+    FROM lessons
+    WHERE public.f_unaccent(lower(lesson_title)) % :term
+    ORDER BY score DESC
+    LIMIT :lim
+"""
+
+
+def fuzzy_title_candidates(db: Session, query: str, limit: int = 3, threshold: Optional[float] = None) -> List[Dict[str, Any]]:
+    """Top-k de lecciones cuyo titulo (o el de su tema) se parece a la consulta, con su puntaje.
+
+    Usa indices ``pg_trgm`` (migracion ``trigram``); devuelve [] si no estan disponibles.
+    """
+    term = fuzzy_term(query)
+    if len(term) < 3 or not _fuzzy_available(db):
+        return []
+    schema = get_schema(db.get_bind())
+    limit = max(1, limit)
+    params = {"term": term, "lim": limit}
+    candidates: List[Dict[str, Any]] = []
+    try:
+        db.execute(
+            text("SELECT set_config('pg_trgm.similarity_threshold', :t, true)"),
+            {"t": str(threshold if threshold is not None else fuzzy_threshold())},
+        )
+        if schema.has_table("lecciones"):
+            for r in db.execute(text(_FUZZY_LECCIONES_SQL), params).mappings().all():
+                candidates.append({
+                    "kind": r["kind"],
+                    "id": r["id"],
+                    "unidad": int(r["unidad"]),
+                    "leccion": r["leccion"],
+                    "titulo": r["titulo"] or "",
+                    "tema": r["tema"] or "",
+                    "teoria": r["teoria"] or "",
+                    "objetivo": "",
+                    "formulas": "",
+                    "actividades": "",
+                    "score": float(r["score"] or 0.0),
+                })
+        if schema.has_table("lessons"):
+            id_col = "id" if "id" in schema.columns("lessons") else "NULL"
+            for r in db.execute(text(_FUZZY_LESSONS_SQL.format(id_col=id_col)), params).mappings().all():
+                candidates.append({
+                    "kind": r["kind"],
+                    "id": r["id"],
+                    "unidad": int(r["unidad"]),
+                    "leccion": r["leccion"] or "",
+                    "titulo": r["titulo"] or "",
+                    "tema": "",
+                    "teoria": r["teoria"] or "",
+                    "objetivo": r["objetivo"] or "",
+                    "formulas": r["formulas"] or "",
+                    "actividades": r["actividades"] or "",
+                    "score": float(r["score"] or 0.0),
+                })
+    except Exception as exc:
+        logger.warning("Busqueda por similitud de titulos fallo: %s", exc)
+        _safe_rollback(db)
+        return []
+    candidates.sort(key=lambda c: c["score"], reverse=True)
+    return candidates[:limit]
@@ -0,0 +1,254 @@
+import bisect
+import heapq
+import logging
+import re
+import threading
+import time
+import unicodedata
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+_STOPWORDS = frozenset("a al con de del el en la las lo los para por un una y".split())
+_WORD_RE = re.compile(r"[0-9a-z]+(?:\.[0-9]+)*")
+_KIND_WEIGHT = {"leccion": 2, "tema": 1, "unidad": 0}
+
+
+def _fold(text: Any) -> str:
+    decomposed = unicodedata.normalize("NFKD", str(text or ""))
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch)).lower()
+
+
+def _words(text: Any) -> List[str]:
+    return [w for w in _WORD_RE.findall(_fold(text)) if w not in _STOPWORDS]
+
+
+def normalize_query(text: str) -> str:
+    return " ".join(_words(text))
+
+
+class SuggestIndex:
+    """Autocompletado por prefijo sobre titulos y numeros del catalogo.
+
+    Cada titulo se indexa desde cada una de sus palabras ("sistemas ecuaciones
+    lineales", "ecuaciones lineales", "lineales") sin acentos ni palabras
+    vacias. Las claves viven en una lista ordenada, asi que un prefijo es un
+    rango contiguo que se encuentra con dos ``bisect``.
+    """
+
+    def __init__(self, catalogue: Mapping[str, Any], generation: int = 0) -> None:
+        started = time.perf_counter()
+        self.generation = generation
+        self.built_at = time.time()
+        self.docs: List[Dict[str, Any]] = []
+        self._doc_index: Dict[Tuple[str, Any], int] = {}
+        self._parents: Dict[int, Tuple[Optional[int], Optional[int]]] = {}
+        pairs: List[Tuple[str, int, int]] = []
+
+        def _add(doc: Dict[str, Any], aliases: List[str]) -> int:
+            doc_id = len(self.docs)
+            self.docs.append(doc)
+            self._doc_index[(doc["tipo"], doc["id"])] = doc_id
+            words = _words(doc.get("titulo"))
+            for start in range(len(words)):
+                pairs.append((" ".join(words[start:]), doc_id, start))
+            for alias in aliases:
+                key = " ".join(_words(alias))
+                if key:
+                    pairs.append((key, doc_id, 0))
+            return doc_id
+
+        for unidad in catalogue.get("unidades") or []:
+            u_doc = _add(
+                {"tipo": "unidad", "id": unidad.get("id"), "titulo": unidad.get("titulo"), "numero": unidad.get("numero")},
+                [f"unidad {unidad.get('numero')}"] if unidad.get("numero") is not None else [],
+            )
+            for tema in unidad.get("temas") or []:
+                t_doc = _add(
+                    {
+                        "tipo": "tema",
+                        "id": tema.get("id"),
+                        "titulo": tema.get("titulo"),
+                        "numero": tema.get("numero"),
+                        "unidad_id": unidad.get("id"),
+                        "unidad_numero": unidad.get("numero"),
+                    },
+                    [f"tema {tema.get('numero')}"] if tema.get("numero") is not None else [],
+                )
+                for leccion in tema.get("lecciones") or []:
+                    numero = leccion.get("numero")
+                    aliases = [str(numero), f"leccion {numero}"] if numero is not None else []
+                    l_doc = _add(
+                        {
+                            "tipo": "leccion",
+                            "id": leccion.get("id"),
+                            "titulo": leccion.get("nombre"),
+                            "numero": numero,
+                            "tema_id": tema.get("id"),
+                            "unidad_numero": unidad.get("numero"),
+                        },
+                        aliases,
+                    )
+                    self._parents[l_doc] = (t_doc, u_doc)
+
+        pairs.sort()
+        self._keys = [p[0] for p in pairs]
+        self._key_docs = [p[1] for p in pairs]
+        self._key_offsets = [p[2] for p in pairs]
+        self._title_len = [len(str(d.get("titulo") or "")) for d in self.docs]
+        self.build_ms = (time.perf_counter() - started) * 1000.0
+
+    def doc_id(self, tipo: str, item_id: Any) -> Optional[int]:
+        return self._doc_index.get((tipo, item_id))
+
+    def parents(self, doc_id: int) -> Tuple[Optional[int], Optional[int]]:
+        return self._parents.get(doc_id, (None, None))
+
+    def suggest(self, query: str, limit: int = 8, popularity: Optional[Mapping[int, int]] = None) -> List[Dict[str, Any]]:
+        prefix = normalize_query(query)
+        if not prefix:
+            return []
+        lo = bisect.bisect_left(self._keys, prefix)
+        hi = bisect.bisect_left(self._keys, prefix + "\uffff", lo)
+        if lo == hi:
+            return []
+        popularity = popularity or {}
+        best: Dict[int, int] = {}
+        for pos in range(lo, hi):
+            doc_id = self._key_docs[pos]
+            offset = self._key_offsets[pos]
+            if doc_id not in best or offset < best[doc_id]:
+                best[doc_id] = offset
+        top = heapq.nsmallest(
+            max(1, limit),
+            best.items(),
+            key=lambda kv: (
+                -popularity.get(kv[0], 0),
+                kv[1] > 0,  # coincide con el inicio del titulo o numero
+                -_KIND_WEIGHT.get(self.docs[kv[0]]["tipo"], 0),
+                self._title_len[kv[0]],
+                kv[0],
+            ),
+        )
+        return [dict(self.docs[doc_id], popularidad=popularity.get(doc_id, 0)) for doc_id, _offset in top]
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "docs": len(self.docs),
+            "keys": len(self._keys),
+            "generation": self.generation,
+            "build_ms": round(self.build_ms, 2),
+            "built_at": self.built_at,
+        }
+
+
+_index: Optional[SuggestIndex] = None
+_index_lock = threading.Lock()
+# Vistas por (tipo, id); sobreviven a las reconstrucciones del indice.
+_views: Dict[Tuple[str, Any], int] = {}
+_popularity: Dict[int, int] = {}
+# Respuestas recientes (instante, sugerencias); se vacia al reconstruir el indice.
+# La popularidad puede ir hasta _RESULTS_TTL segundos por detras de las vistas.
+_results: Dict[Tuple[str, int], Tuple[float, List[Dict[str, Any]]]] = {}
+_RESULTS_MAX = 2048
+_RESULTS_TTL = 30.0
+# Una sola reconstruccion a la vez; mientras tanto se sigue respondiendo con el indice anterior.
+_rebuild_pending = False
+
+
+def get_suggest_index() -> Optional[SuggestIndex]:
+    return _index
+
+
+def claim_suggest_rebuild() -> bool:
+    """True si el llamador debe reconstruir el indice (nadie mas lo esta haciendo)."""
+    global _rebuild_pending
+    with _index_lock:
+        if _rebuild_pending:
+            return False
+        _rebuild_pending = True
+        return True
+
+
+def release_suggest_rebuild() -> None:
+    global _rebuild_pending
+    with _index_lock:
+        _rebuild_pending = False
+
+
+def _recompute_popularity(index: SuggestIndex) -> Dict[int, int]:
+    popularity: Dict[int, int] = {}
+    for (tipo, item_id), count in _views.items():
+        doc_id = index.doc_id(tipo, item_id)
+        if doc_id is None:
+            continue
+        for target in (doc_id,) + index.parents(doc_id):
+            if target is not None:
+                popularity[target] = popularity.get(target, 0) + count
+    return popularity
+
+
+def rebuild_suggest_index(catalogue: Mapping[str, Any], generation: int = 0) -> SuggestIndex:
+    global _index, _popularity
+    index = SuggestIndex(catalogue, generation)
+    with _index_lock:
+        _popularity = _recompute_popularity(index)
+        _index = index
+        _results.clear()
+    logger.info("Indice de sugerencias de lecciones listo: %s", index.info())
+    return index
+
+
+def record_lesson_view(lesson_id: Any) -> None:
+    """Suma una vista a la leccion y a su tema y unidad (popularidad de las sugerencias).
+
+    Solo cuenta lecciones del indice, asi ``_views`` no crece con ids inventados.
+    """
+    with _index_lock:
+        index = _index
+        if index is None:
+            return
+        doc_id = index.doc_id("leccion", lesson_id)
+        if doc_id is None:
+            return
+        _views[("leccion", lesson_id)] = _views.get(("leccion", lesson_id), 0) + 1
+        for target in (doc_id,) + index.parents(doc_id):
+            if target is not None:
+                _popularity[target] = _popularity.get(target, 0) + 1
+
+
+def suggest(query: str, limit: int = 8) -> Optional[List[Dict[str, Any]]]:
+    index = _index
+    if index is None:
+        return None
+    key = (normalize_query(query), limit)
+    now = time.monotonic()
+    with _index_lock:
+        entry = _results.get(key)
+    if entry is not None and now - entry[0] < _RESULTS_TTL:
+        cached = entry[1]
+    else:
+        cached = index.suggest(key[0], limit=limit, popularity=_popularity)
+        with _index_lock:
+            # Si el indice cambio mientras tanto, esta respuesta ya no se guarda.
+            if index is _index:
+                if len(_results) >= _RESULTS_MAX:
+                    _results.clear()
+                _results[key] = (now, cached)
+    return [dict(item) for item in cached]
+
+
+def load_suggest_index_at_startup() -> None:
+    if _index is not None:
+        return
+    from db import SessionLocal
+    from routes.lessons import _build_catalogue
+    from services.lesson_catalogue import catalogue_cache
+
+    try:
+        with SessionLocal() as db:
+            rebuild_suggest_index(_build_catalogue(db, None), catalogue_cache.generation)
+    except Exception as exc:
+        logger.warning("No se pudo construir el indice de sugerencias de lecciones: %s", exc)
@@ -0,0 +1,171 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Deque, Dict, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(str(os.getenv(name, default)).strip())
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(str(os.getenv(name, default)).strip())
+    except (TypeError, ValueError):
+        return default
+
+
+def speculative_enabled() -> bool:
+    return os.getenv("CHAT_SPECULATIVE_FINAL_ANSWER", "false").lower() in {"1", "true", "yes"}
+
+
+class SpeculativeTask:
+    """Respuesta generada en segundo plano y ligada a un estado concreto de la sesion."""
+
+    def __init__(self, key: str, history_len: int, future: Future) -> None:
+        self.key = key
+        self.history_len = history_len
+        self.future = future
+        self.created_at = time.monotonic()
+
+    def matches(self, key: str, history_len: int) -> bool:
+        return self.key == key and self.history_len == history_len
+
+
+class SpeculativeRunner:
+    """Ejecuta llamadas especulativas al modelo con tope de concurrencia y de costo.
+
+    - ``max_inflight`` limita las generaciones simultaneas.
+    - ``max_per_minute`` limita cuantas se lanzan por minuto (tope de costo).
+    Las tareas ya iniciadas no pueden abortarse en el cliente de OpenAI; al
+    cancelarlas solo se descarta su resultado.
+    """
+
+    def __init__(self, max_workers: int, max_inflight: int, max_per_minute: int) -> None:
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._max_workers = max(1, max_workers)
+        self._max_inflight = max(0, max_inflight)
+        self._max_per_minute = max(0, max_per_minute)
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._launched: Deque[float] = deque()
+        self._counters: Dict[str, int] = {
+            "started": 0,
+            "completed": 0,
+            "failed": 0,
+            "hits": 0,
+            "misses": 0,
+            "cancelled": 0,
+            "skipped_inflight": 0,
+            "skipped_rate": 0,
+        }
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self._max_workers,
+                thread_name_prefix="speculative",
+            )
+        return self._executor
+
+    def _reserve_slot(self) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            while self._launched and now - self._launched[0] > 60.0:
+                self._launched.popleft()
+            if self._inflight >= self._max_inflight:
+                self._counters["skipped_inflight"] += 1
+                return False
+            if len(self._launched) >= self._max_per_minute:
+                self._counters["skipped_rate"] += 1
+                return False
+            self._inflight += 1
+            self._launched.append(now)
+            self._counters["started"] += 1
+            return True
+
+    def _release_slot(self, future: Future) -> None:
+        with self._lock:
+            self._inflight = max(0, self._inflight - 1)
+            if future.cancelled():
+                return
+            if future.exception() is not None:
+                self._counters["failed"] += 1
+            else:
+                self._counters["completed"] += 1
+
+    def submit(self, key: str, history_len: int, fn: Callable[..., str], *args: Any) -> Optional[SpeculativeTask]:
+        if not self._reserve_slot():
+            return None
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except RuntimeError as exc:
+            logger.warning("No se pudo lanzar la generacion especulativa: %s", exc)
+            with self._lock:
+                self._inflight = max(0, self._inflight - 1)
+            return None
+        future.add_done_callback(self._release_slot)
+        return SpeculativeTask(key, history_len, future)
+
+    def cancel(self, task: Optional[SpeculativeTask]) -> None:
+        if task is None:
+            return
+        # Si ya termino, cancel() devuelve False y no cuenta como cancelada.
+        if task.future.cancel():
+            with self._lock:
+                self._counters["cancelled"] += 1
+
+    def take(self, task: Optional[SpeculativeTask], key: str, history_len: int, wait_seconds: float) -> Optional[str]:
+        """Devuelve el texto especulado si sigue siendo valido; None en caso contrario."""
+        if task is None or not task.matches(key, history_len):
+            self.cancel(task)
+            with self._lock:
+                self._counters["misses"] += 1
+            return None
+        try:
+            result = task.future.result(timeout=max(0.0, wait_seconds))
+        except FutureTimeoutError:
+            result = None
+        except Exception as exc:
+            logger.info("Generacion especulativa descartada: %s", exc)
+            result = None
+        with self._lock:
+            if result and str(result).strip():
+                self._counters["hits"] += 1
+                return result
+            self._counters["misses"] += 1
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+            inflight = self._inflight
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            "enabled": speculative_enabled(),
+            "inflight": inflight,
+            "max_inflight": self._max_inflight,
+            "max_per_minute": self._max_per_minute,
+            "hit_rate": round(counters["hits"] / lookups, 4) if lookups else None,
+            **counters,
+        }
+
+
+final_answer_runner = SpeculativeRunner(
+    max_workers=_env_int("CHAT_SPECULATIVE_WORKERS", 2),
+    max_inflight=_env_int("CHAT_SPECULATIVE_MAX_INFLIGHT", 4),
+    max_per_minute=_env_int("CHAT_SPECULATIVE_MAX_PER_MINUTE", 30),
+)
+
+
+def speculative_wait_seconds() -> float:
+    return _env_float("CHAT_SPECULATIVE_WAIT_SECONDS", 30.0)
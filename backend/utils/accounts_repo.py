@@ -1,9 +1,10 @@
 import os
 from typing import Any, Dict, Optional, Tuple, List
 
-from sqlalchemy import MetaData, Table, inspect, select, or_, and_, join, func
+from sqlalchemy import Table, select, or_, and_, join, func
 from sqlalchemy.engine import Engine
 from sqlalchemy.orm import Session
+from utils.schema_registry import coerce_to_column, get_schema
 from utils.security import hash_password
 
 
@@ -33,8 +34,7 @@ def _env(name: str, default: Optional[str] = None) -> Optional[str]:
 
 def _reflect_table(engine: Engine, name: str) -> Optional[Table]:
     try:
-        md = MetaData()
-        return Table(name, md, autoload_with=engine)
+        return get_schema(engine).table(name)
     except Exception:
         return None
 
@@ -230,6 +230,17 @@ def list_alumnos(db: Session, q: Optional[str], limit: int, offset: int) -> Dict
     return {"count": len(items), "items": items}
 
 
+def _id_condition(tbl: Table, col_name: Optional[str], value: Any) -> Optional[Any]:
+    """``col == value`` con el id ya convertido al tipo de la columna; None si no puede coincidir."""
+    col = tbl.c.get(col_name) if col_name else None
+    if col is None:
+        return None
+    try:
+        return col == coerce_to_column(col, value)
+    except ValueError:
+        return None
+
+
 def get_alumno_by_id(db: Session, alumno_id: Any) -> Optional[Dict[str, Any]]:
     engine = db.get_bind()
     u, um = reflect_user_table(engine)
@@ -240,14 +251,12 @@ def get_alumno_by_id(db: Session, alumno_id: Any) -> Optional[Dict[str, Any]]:
     # Si no hay tabla de usuarios reflejada, intentar por PK y luego por FK de usuario
     if u is None:
         # Intento 1: buscar por PK de alumno
-        row = db.execute(select(a).where(getattr(a.c, am["pk"]) == alumno_id).limit(1)).fetchone()
+        cond = _id_condition(a, am["pk"], alumno_id)
+        row = db.execute(select(a).where(cond).limit(1)).fetchone() if cond is not None else None
         if not row:
             # Intento 2: buscar por FK a usuario (si existe)
-            try:
-                cond = getattr(a.c, am["user_fk"]) == alumno_id
-                row = db.execute(select(a).where(cond).limit(1)).fetchone()
-            except Exception:
-                row = None
+            cond = _id_condition(a, am["user_fk"], alumno_id)
+            row = db.execute(select(a).where(cond).limit(1)).fetchone() if cond is not None else None
         if not row:
             return None
         m = row._mapping
@@ -270,16 +279,12 @@ def get_alumno_by_id(db: Session, alumno_id: Any) -> Optional[Dict[str, Any]]:
         getattr(a.c, am["especialidad"]).label("especialidad"),
     ]
     # Intento 1: por PK del alumno
-    qry_pk = select(*cols).select_from(j).where(getattr(a.c, am["pk"]) == alumno_id).limit(1)
-    row = db.execute(qry_pk).fetchone()
+    cond_pk = _id_condition(a, am["pk"], alumno_id)
+    row = db.execute(select(*cols).select_from(j).where(cond_pk).limit(1)).fetchone() if cond_pk is not None else None
     if not row:
         # Intento 2: por FK del usuario (permite pasar user_id)
-        try:
-            cond_fk = getattr(a.c, am["user_fk"]) == alumno_id
-            qry_fk = select(*cols).select_from(j).where(cond_fk).limit(1)
-            row = db.execute(qry_fk).fetchone()
-        except Exception:
-            row = None
+        cond_fk = _id_condition(a, am["user_fk"], alumno_id)
+        row = db.execute(select(*cols).select_from(j).where(cond_fk).limit(1)).fetchone() if cond_fk is not None else None
     if not row:
         return None
     return dict(row._mapping)
@@ -0,0 +1,32 @@
+"""Genera offline los embeddings de las lecciones para la busqueda semantica.
+
+    python utils/build_lesson_embeddings.py
+
+Lee el curriculo de la BD, lo codifica con LESSON_EMBEDDINGS_MODEL en CPU y
+escribe lesson_vectors.npy (float16) y lesson_vectors.json en
+LESSON_EMBEDDINGS_DIR. Los servidores los abren con np.memmap al iniciar.
+"""
+import os
+import sys
+
+if __package__ in (None, ""):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def main() -> int:
+    from db import SessionLocal
+    from services.lesson_corpus import LessonCorpus
+    from services.lesson_embeddings import build_embeddings, embeddings_dir
+
+    with SessionLocal() as db:
+        corpus = LessonCorpus.load(db, 0)
+    if not corpus.items:
+        print("No hay lecciones en la base de datos.")
+        return 1
+    info = build_embeddings(corpus.items, fingerprint=corpus.fingerprint)
+    print(f"[OK] {info['count']} lecciones, dim {info['dim']}, modelo {info['model']} -> {embeddings_dir()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,223 @@
+"""Migraciones opcionales de PostgreSQL para acelerar las busquedas de lecciones.
+
+Cada migracion es idempotente y puede aplicarse por separado:
+
+    python utils/db_migrations.py             # aplica todas
+    python utils/db_migrations.py fulltext_es # aplica solo una
+
+Si una extension no esta disponible la migracion falla sin tocar el resto y
+el backend sigue usando las consultas de respaldo (ILIKE, CAST a texto).
+"""
+import os
+import sys
+from typing import Dict, List
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+if __package__ in (None, ""):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# Busqueda de texto completo en espanol, insensible a acentos.
+# La configuracion es_unaccent aplica unaccent antes del stemmer spanish.
+_FULLTEXT_ES: List[str] = [
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    """
+    DO $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'es_unaccent') THEN
+            CREATE TEXT SEARCH CONFIGURATION public.es_unaccent (COPY = pg_catalog.spanish);
+            ALTER TEXT SEARCH CONFIGURATION public.es_unaccent
+                ALTER MAPPING FOR hword, hword_part, word WITH unaccent, spanish_stem;
+        END IF;
+    END
+    $$
+    """,
+    """
+    DO $$
+    BEGIN
+        IF to_regclass('public.lecciones') IS NOT NULL THEN
+            ALTER TABLE lecciones ADD COLUMN IF NOT EXISTS search_tsv tsvector
+                GENERATED ALWAYS AS (
+                    setweight(to_tsvector('public.es_unaccent', coalesce(nombre, '')), 'A')
+                    || setweight(to_tsvector('public.es_unaccent', coalesce(numero, '')), 'A')
+                    || setweight(to_tsvector('public.es_unaccent', coalesce(teoria, '')), 'C')
+                ) STORED;
+            CREATE INDEX IF NOT EXISTS idx_lecciones_search_tsv ON lecciones USING GIN (search_tsv);
+        END IF;
+        IF to_regclass('public.temas') IS NOT NULL THEN
+            ALTER TABLE temas ADD COLUMN IF NOT EXISTS search_tsv tsvector
+                GENERATED ALWAYS AS (
+                    setweight(to_tsvector('public.es_unaccent', coalesce(titulo, '')), 'B')
+                ) STORED;
+            CREATE INDEX IF NOT EXISTS idx_temas_search_tsv ON temas USING GIN (search_tsv);
+        END IF;
+        IF to_regclass('public.unidades') IS NOT NULL THEN
+            ALTER TABLE unidades ADD COLUMN IF NOT EXISTS search_tsv tsvector
+                GENERATED ALWAYS AS (
+                    setweight(to_tsvector('public.es_unaccent', coalesce(titulo, '')), 'B')
+                ) STORED;
+            CREATE INDEX IF NOT EXISTS idx_unidades_search_tsv ON unidades USING GIN (search_tsv);
+        END IF;
+        IF to_regclass('public.lessons') IS NOT NULL THEN
+            ALTER TABLE lessons ADD COLUMN IF NOT EXISTS search_tsv tsvector
+                GENERATED ALWAYS AS (
+                    setweight(to_tsvector('public.es_unaccent', coalesce(lesson_title, '')), 'A')
+                    || setweight(to_tsvector('public.es_unaccent', coalesce(lesson_number::text, '')), 'A')
+                    || setweight(to_tsvector('public.es_unaccent', coalesce(objective, '')), 'B')
+                    || setweight(to_tsvector('public.es_unaccent', coalesce(key_formulas, '')), 'B')
+                    || setweight(to_tsvector('public.es_unaccent', coalesce(theory, '')), 'C')
+                ) STORED;
+            CREATE INDEX IF NOT EXISTS idx_lessons_search_tsv ON lessons USING GIN (search_tsv);
+        END IF;
+    END
+    $$
+    """,
+]
+
+
+# Busqueda tolerante a errores de escritura en titulos de lecciones y temas.
+# f_unaccent es un envoltorio IMMUTABLE de unaccent para poder indexarlo.
+_TRIGRAM: List[str] = [
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    CREATE OR REPLACE FUNCTION public.f_unaccent(text) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+    AS $func$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $func$
+    """,
+    """
+    DO $$
+    BEGIN
+        IF to_regclass('public.lecciones') IS NOT NULL THEN
+            CREATE INDEX IF NOT EXISTS idx_lecciones_nombre_trgm
+                ON lecciones USING GIN (public.f_unaccent(lower(nombre)) gin_trgm_ops);
+        END IF;
+        IF to_regclass('public.temas') IS NOT NULL THEN
+            CREATE INDEX IF NOT EXISTS idx_temas_titulo_trgm
+                ON temas USING GIN (public.f_unaccent(lower(titulo)) gin_trgm_ops);
+        END IF;
+        IF to_regclass('public.lessons') IS NOT NULL THEN
+            CREATE INDEX IF NOT EXISTS idx_lessons_title_trgm
+                ON lessons USING GIN (public.f_unaccent(lower(lesson_title)) gin_trgm_ops);
+        END IF;
+    END
+    $$
+    """,
+]
+
+
+# Numeracion normalizada de unidades/temas/lecciones en columnas enteras indexables.
+# lesson_num_parts('4-2') = {4,2}: mismas reglas que _norm_lesson_str en el backend.
+# Las columnas *_sort (int[]) dan el orden natural directamente en ORDER BY.
+_LESSON_NUMBERS: List[str] = [
+    r"""
+    CREATE OR REPLACE FUNCTION public.lesson_num_parts(txt text) RETURNS int[]
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE
+    AS $func$
+        SELECT array_agg(NULLIF(regexp_replace(part, '\D', '', 'g'), '')::int ORDER BY pos)
+        FROM unnest(string_to_array(
+            replace(replace(replace(btrim(coalesce(txt, '')), ' ', ''), '/', '.'), '-', '.'), '.'
+        )) WITH ORDINALITY AS p(part, pos)
+    $func$
+    """,
+    """
+    DO $$
+    BEGIN
+        IF to_regclass('public.unidades') IS NOT NULL THEN
+            ALTER TABLE unidades ADD COLUMN IF NOT EXISTS numero_ord int
+                GENERATED ALWAYS AS ((public.lesson_num_parts(numero::text))[1]) STORED;
+            CREATE INDEX IF NOT EXISTS idx_unidades_numero_ord ON unidades (numero_ord);
+        END IF;
+        IF to_regclass('public.temas') IS NOT NULL THEN
+            ALTER TABLE temas ADD COLUMN IF NOT EXISTS numero_ord int
+                GENERATED ALWAYS AS ((public.lesson_num_parts(numero::text))[1]) STORED;
+            -- Mismo orden que la paginacion por cursor de GET /lessons/units/{id}/temas.
+            DROP INDEX IF EXISTS idx_temas_unidad_numero_ord;
+            CREATE INDEX IF NOT EXISTS idx_temas_unidad_keyset ON temas (id_unidad, numero_ord NULLS FIRST, id_tema);
+        END IF;
+        IF to_regclass('public.lecciones') IS NOT NULL THEN
+            ALTER TABLE lecciones ADD COLUMN IF NOT EXISTS numero_sort int[]
+                GENERATED ALWAYS AS (public.lesson_num_parts(numero::text)) STORED;
+            ALTER TABLE lecciones ADD COLUMN IF NOT EXISTS tema_ord int
+                GENERATED ALWAYS AS (
+                    CASE WHEN cardinality(public.lesson_num_parts(numero::text)) > 1
+                         THEN (public.lesson_num_parts(numero::text))[1] END
+                ) STORED;
+            ALTER TABLE lecciones ADD COLUMN IF NOT EXISTS leccion_ord int
+                GENERATED ALWAYS AS (
+                    (public.lesson_num_parts(numero::text))[cardinality(public.lesson_num_parts(numero::text))]
+                ) STORED;
+            CREATE INDEX IF NOT EXISTS idx_lecciones_ord ON lecciones (leccion_ord, tema_ord);
+            DROP INDEX IF EXISTS idx_lecciones_tema_sort;
+            CREATE INDEX IF NOT EXISTS idx_lecciones_tema_keyset ON lecciones (id_tema, numero_sort NULLS FIRST, id_leccion);
+        END IF;
+        IF to_regclass('public.subtemas') IS NOT NULL THEN
+            ALTER TABLE subtemas ADD COLUMN IF NOT EXISTS numero_sort int[]
+                GENERATED ALWAYS AS (public.lesson_num_parts(numero::text)) STORED;
+            DROP INDEX IF EXISTS idx_subtemas_tema_sort;
+            CREATE INDEX IF NOT EXISTS idx_subtemas_tema_keyset ON subtemas (id_tema, numero_sort NULLS FIRST, id_subtema);
+        END IF;
+        IF to_regclass('public.lessons') IS NOT NULL THEN
+            ALTER TABLE lessons ADD COLUMN IF NOT EXISTS unit_ord int
+                GENERATED ALWAYS AS ((public.lesson_num_parts(unit_number::text))[1]) STORED;
+            ALTER TABLE lessons ADD COLUMN IF NOT EXISTS lesson_tema_ord int
+                GENERATED ALWAYS AS (
+                    CASE WHEN cardinality(public.lesson_num_parts(lesson_number::text)) > 1
+                         THEN (public.lesson_num_parts(lesson_number::text))[1] END
+                ) STORED;
+            ALTER TABLE lessons ADD COLUMN IF NOT EXISTS lesson_ord int
+                GENERATED ALWAYS AS (
+                    (public.lesson_num_parts(lesson_number::text))[cardinality(public.lesson_num_parts(lesson_number::text))]
+                ) STORED;
+            ALTER TABLE lessons ADD COLUMN IF NOT EXISTS lesson_sort int[]
+                GENERATED ALWAYS AS (public.lesson_num_parts(lesson_number::text)) STORED;
+            CREATE INDEX IF NOT EXISTS idx_lessons_unit_lesson_ord ON lessons (unit_ord, lesson_ord, lesson_tema_ord);
+        END IF;
+    END
+    $$
+    """,
+]
+
+
+MIGRATIONS: Dict[str, List[str]] = {
+    "fulltext_es": _FULLTEXT_ES,
+    "trigram": _TRIGRAM,
+    "lesson_numbers": _LESSON_NUMBERS,
+}
+
+
+def apply_migration(engine: Engine, name: str) -> None:
+    statements = MIGRATIONS[name]
+    with engine.begin() as conn:
+        for stmt in statements:
+            conn.execute(text(stmt))
+
+
+def main(argv: List[str]) -> int:
+    from db import engine
+    from utils.schema_registry import schema_registry
+
+    names = argv or list(MIGRATIONS)
+    unknown = [n for n in names if n not in MIGRATIONS]
+    if unknown:
+        print(f"Migraciones desconocidas: {', '.join(unknown)}. Disponibles: {', '.join(MIGRATIONS)}")
+        return 2
+    failed = 0
+    for name in names:
+        try:
+            apply_migration(engine, name)
+            print(f"[OK] {name}")
+        except Exception as exc:
+            failed += 1
+            print(f"[ERROR] {name}: {exc}")
+    schema_registry.refresh(engine)
+    if failed:
+        print("Algunas migraciones fallaron; el backend seguira usando las consultas de respaldo.")
+    print("Recuerda ejecutar POST /admin/schema/refresh en los servidores en marcha.")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
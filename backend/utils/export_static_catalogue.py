@@ -0,0 +1,177 @@
+"""Exporta el catalogo de lecciones como JSON estatico para servirlo desde un CDN.
+
+    python utils/export_static_catalogue.py --out ../frontend/static-lessons
+    python utils/export_static_catalogue.py --out dist/lessons --area precalculo --area estadistica
+
+Usa el mismo codigo que GET /lessons/ y GET /lessons/{id}. Cada archivo lleva
+el hash de su contenido en el nombre (se puede cachear para siempre) y se
+escribe tambien comprimido en .gz y, si esta instalado el paquete ``brotli``,
+en .br. manifest.json apunta a los archivos vigentes y es lo unico que el
+frontend debe pedir sin cache.
+
+Al terminar se borran de ``--out`` los archivos exportados que no estan en el
+nuevo manifest ni en el anterior (los clientes con el manifest previo siguen
+encontrando sus archivos); ``--no-prune`` los conserva todos.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+if __package__ in (None, ""):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import brotli  # type: ignore
+except ImportError:  # pragma: no cover - dependencia opcional
+    brotli = None
+
+
+_BATCH_SIZE = 500
+
+
+def _write_variants(out_dir: str, relative: str, body: bytes) -> None:
+    path = os.path.join(out_dir, relative)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as fh:
+        fh.write(body)
+    # mtime fijo: la misma entrada produce el mismo .gz
+    with open(path + ".gz", "wb") as fh:
+        fh.write(gzip.compress(body, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(path + ".br", "wb") as fh:
+            fh.write(brotli.compress(body, quality=11))
+
+
+def _export_file(out_dir: str, stem: str, payload: Any) -> Dict[str, Any]:
+    from services.lesson_catalogue import serialize_payload
+
+    body = serialize_payload(payload)
+    digest = hashlib.sha1(body).hexdigest()
+    relative = f"{stem}.{digest[:12]}.json"
+    _write_variants(out_dir, relative, body)
+    return {"path": relative.replace(os.sep, "/"), "etag": f'"{digest}"', "bytes": len(body)}
+
+
+def _lesson_ids(catalogue: Dict[str, Any]) -> List[int]:
+    ids: List[int] = []
+    for unidad in catalogue.get("unidades") or []:
+        for tema in unidad.get("temas") or []:
+            for leccion in tema.get("lecciones") or []:
+                if leccion.get("id") is not None:
+                    ids.append(leccion["id"])
+    return list(dict.fromkeys(ids))
+
+
+def _chunks(values: List[int], size: int) -> Iterable[List[int]]:
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+# Nombres que genera _export_file: catalogue[-area].<hash>.json y lessons/<id>.<hash>.json (+ .gz/.br).
+_EXPORTED_RE = re.compile(r"^(?:catalogue(?:-[^/]+)?|lessons/\d+)\.[0-9a-f]{12}\.json(?:\.gz|\.br)?$")
+
+
+def _manifest_paths(manifest: Optional[Dict[str, Any]]) -> Set[str]:
+    paths: Set[str] = set()
+    for section in ("catalogue", "lessons"):
+        for entry in ((manifest or {}).get(section) or {}).values():
+            if isinstance(entry, dict) and entry.get("path"):
+                paths.add(entry["path"])
+    return paths
+
+
+def _read_manifest(out_dir: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(out_dir, "manifest.json"), encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def prune_exported(out_dir: str, keep: Set[str]) -> int:
+    """Borra los archivos exportados (y sus .gz/.br) cuyo JSON no esta en ``keep``."""
+    removed = 0
+    for root, _dirs, files in os.walk(out_dir):
+        for name in files:
+            relative = os.path.relpath(os.path.join(root, name), out_dir).replace(os.sep, "/")
+            if not _EXPORTED_RE.match(relative):
+                continue
+            base = re.sub(r"\.(?:gz|br)$", "", relative)
+            if base in keep:
+                continue
+            os.remove(os.path.join(root, name))
+            removed += 1
+    return removed
+
+
+def export_catalogue(out_dir: str, areas: Optional[List[str]] = None, prune: bool = True) -> Dict[str, Any]:
+    from db import SessionLocal
+    from routes.lessons import _build_catalogue, _fetch_lesson_details
+    from utils.schema_registry import get_schema
+
+    previous = _read_manifest(out_dir)
+    manifest: Dict[str, Any] = {
+        "generated_at": int(time.time()),
+        "compression": ["gzip"] + (["br"] if brotli is not None else []),
+        "catalogue": {},
+        "lessons": {},
+    }
+    with SessionLocal() as db:
+        schema = get_schema(db.get_bind())
+        full = _build_catalogue(db, None)
+        manifest["catalogue"]["*"] = _export_file(out_dir, "catalogue", full)
+        for area in areas or []:
+            manifest["catalogue"][area] = _export_file(out_dir, f"catalogue-{area}", _build_catalogue(db, area))
+
+        ids = _lesson_ids(full)
+        for batch in _chunks(ids, _BATCH_SIZE):
+            details = _fetch_lesson_details(db, schema, batch)
+            for lesson_id in batch:
+                if lesson_id in details:
+                    entry = _export_file(out_dir, os.path.join("lessons", str(lesson_id)), details[lesson_id])
+                    manifest["lessons"][str(lesson_id)] = entry
+
+    # La version cambia solo si cambia algun archivo.
+    version = hashlib.sha1()
+    for key in sorted(manifest["catalogue"]):
+        version.update(manifest["catalogue"][key]["etag"].encode())
+    for key in sorted(manifest["lessons"], key=int):
+        version.update(manifest["lessons"][key]["etag"].encode())
+    manifest["version"] = version.hexdigest()[:16]
+
+    tmp_path = os.path.join(out_dir, "manifest.json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as fh:
+        json.dump(manifest, fh, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, os.path.join(out_dir, "manifest.json"))
+    if prune:
+        manifest["pruned"] = prune_exported(out_dir, _manifest_paths(manifest) | _manifest_paths(previous))
+    return manifest
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description="Exporta el catalogo de lecciones como JSON estatico")
+    parser.add_argument("--out", required=True, help="Carpeta de salida")
+    parser.add_argument("--area", action="append", default=[], help="Exportar tambien el catalogo de un area")
+    parser.add_argument("--no-prune", action="store_true", help="No borrar los archivos de exportaciones anteriores")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.out, exist_ok=True)
+    manifest = export_catalogue(args.out, args.area, prune=not args.no_prune)
+    if brotli is None:
+        print("[WARN] brotli no esta instalado; solo se generaron archivos .gz")
+    print(
+        f"[OK] version {manifest['version']}: {len(manifest['catalogue'])} catalogo(s), "
+        f"{len(manifest['lessons'])} lecciones -> {args.out}"
+        + (f" ({manifest['pruned']} archivos antiguos borrados)" if manifest.get("pruned") else "")
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,194 @@
+import bisect
+import threading
+import time
+from typing import Any, Dict, Optional, Type
+
+from sqlalchemy import event
+from sqlalchemy.exc import DisconnectionError, TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import Pool
+
+
+# Limites (ms) del histograma de espera por una conexion libre.
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class PoolMetrics:
+    """Contadores de un pool de conexiones alimentados por sus eventos.
+
+    La espera de ``checkout`` la mide el propio pool (ver ``timed_pool_class``):
+    SQLAlchemy no tiene un evento antes de pedir la conexion.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.pool: Optional[Pool] = None
+        self._lock = threading.Lock()
+        self.wait_counts = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        self.wait_total_ms = 0.0
+        self.wait_max_ms = 0.0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.pre_pings = 0
+        self.pre_ping_failures = 0
+        self.max_in_use = 0
+
+    def record_wait(self, elapsed_ms: float, timed_out: bool = False) -> None:
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+                return
+            self.wait_counts[bisect.bisect_left(WAIT_BUCKETS_MS, elapsed_ms)] += 1
+            self.wait_total_ms += elapsed_ms
+            self.wait_max_ms = max(self.wait_max_ms, elapsed_ms)
+
+    def _wait_percentile(self, fraction: float) -> Optional[float]:
+        total = sum(self.wait_counts)
+        if not total:
+            return None
+        target = fraction * total
+        seen = 0
+        for index, count in enumerate(self.wait_counts):
+            seen += count
+            if seen >= target:
+                # Limite superior del bucket; el ultimo es abierto.
+                return float(WAIT_BUCKETS_MS[index]) if index < len(WAIT_BUCKETS_MS) else self.wait_max_ms
+        return self.wait_max_ms
+
+    def info(self) -> Dict[str, Any]:
+        pool = self.pool
+        status: Dict[str, Any] = {}
+        if pool is not None:
+            for key in ("size", "checkedin", "checkedout", "overflow"):
+                getter = getattr(pool, key, None)
+                if callable(getter):
+                    try:
+                        status[key] = getter()
+                    except Exception:
+                        pass
+            status["max_overflow"] = getattr(pool, "_max_overflow", None)
+            status["timeout"] = getattr(pool, "_timeout", None)
+            status["recycle"] = getattr(pool, "_recycle", None)
+            status["pre_ping"] = getattr(pool, "_pre_ping", None)
+        waits = sum(self.wait_counts)
+        overflow = status.get("overflow")
+        labels = [f"<={b}ms" for b in WAIT_BUCKETS_MS] + [f">{WAIT_BUCKETS_MS[-1]}ms"]
+        return {
+            "pool": status,
+            "in_use": status.get("checkedout"),
+            "max_in_use": self.max_in_use,
+            # QueuePool.overflow() arranca en -pool_size; aqui solo las conexiones extra abiertas.
+            "overflow": max(0, overflow) if isinstance(overflow, int) else None,
+            "checkouts": self.checkouts,
+            "connects": self.connects,
+            "invalidations": self.invalidations,
+            "timeouts": self.timeouts,
+            "pre_pings": self.pre_pings,
+            "pre_ping_failures": self.pre_ping_failures,
+            "checkout_wait_ms": {
+                "histogram": dict(zip(labels, self.wait_counts)),
+                "avg": round(self.wait_total_ms / waits, 3) if waits else None,
+                "p50": self._wait_percentile(0.5),
+                "p95": self._wait_percentile(0.95),
+                "p99": self._wait_percentile(0.99),
+                "max": round(self.wait_max_ms, 3),
+            },
+        }
+
+
+_registry: Dict[str, PoolMetrics] = {}
+_timed_classes: Dict[type, type] = {}
+
+
+def timed_pool_class(base: Type[Pool]) -> Type[Pool]:
+    """Subclase de ``base`` que mide cuanto espera cada checkout por una conexion libre."""
+    cached = _timed_classes.get(base)
+    if cached is not None:
+        return cached
+
+    class _TimedPool(base):  # type: ignore[valid-type,misc]
+        _mb_metrics: Optional[PoolMetrics] = None
+
+        def _do_get(self):  # type: ignore[override]
+            started = time.perf_counter()
+            try:
+                conn = super()._do_get()
+            except PoolTimeoutError:
+                if self._mb_metrics is not None:
+                    self._mb_metrics.record_wait(0.0, timed_out=True)
+                raise
+            metrics = self._mb_metrics
+            if metrics is not None:
+                metrics.record_wait((time.perf_counter() - started) * 1000.0)
+            return conn
+
+    _TimedPool.__name__ = f"Timed{base.__name__}"
+    _timed_classes[base] = _TimedPool
+    return _TimedPool
+
+
+def _ping(dbapi_connection: Any) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("SELECT 1")
+    finally:
+        cursor.close()
+
+
+def instrument_engine(name: str, engine: Any, idle_ping_seconds: Optional[float] = None) -> PoolMetrics:
+    """Registra los eventos del pool de ``engine`` (o ``AsyncEngine.sync_engine``) bajo ``name``.
+
+    Con ``idle_ping_seconds`` hace el pre-ping solo a las conexiones que
+    llevaban mas de esos segundos sin usarse (el motor debe crearse sin
+    ``pool_pre_ping``); una conexion caida se descarta y el pool abre otra.
+    """
+    sync_engine = getattr(engine, "sync_engine", engine)
+    pool = sync_engine.pool
+    metrics = PoolMetrics(name)
+    metrics.pool = pool
+    if hasattr(type(pool), "_mb_metrics"):
+        pool._mb_metrics = metrics
+
+    @event.listens_for(pool, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        metrics.connects += 1
+
+    @event.listens_for(pool, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        if idle_ping_seconds is not None:
+            last_used = connection_record.info.get("mb_checked_in_at")
+            if last_used is not None and time.monotonic() - last_used > idle_ping_seconds:
+                metrics.pre_pings += 1
+                try:
+                    _ping(dbapi_connection)
+                except Exception as exc:
+                    metrics.pre_ping_failures += 1
+                    raise DisconnectionError(f"pre-ping fallido: {exc}") from exc
+        with metrics._lock:
+            metrics.checkouts += 1
+            try:
+                metrics.max_in_use = max(metrics.max_in_use, pool.checkedout())
+            except Exception:
+                pass
+
+    @event.listens_for(pool, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        connection_record.info["mb_checked_in_at"] = time.monotonic()
+
+    @event.listens_for(pool, "invalidate")
+    def _on_invalidate(dbapi_connection, connection_record, exception):
+        metrics.invalidations += 1
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _on_error(context):
+        # Fallos del pre-ping nativo (pool_pre_ping=True).
+        if getattr(context, "is_pre_ping", False):
+            metrics.pre_ping_failures += 1
+
+    _registry[name] = metrics
+    return metrics
+
+
+def pool_metrics_info() -> Dict[str, Any]:
+    return {name: metrics.info() for name, metrics in _registry.items()}
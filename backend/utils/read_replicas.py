@@ -0,0 +1,150 @@
+import hashlib
+import itertools
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+def parse_hosts(raw: str, default_port: str) -> List[Tuple[str, str]]:
+    """``"replica1,replica2:5433"`` -> ``[("replica1", default_port), ("replica2", "5433")]``."""
+    hosts: List[Tuple[str, str]] = []
+    for part in (raw or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        host, _sep, port = part.rpartition(":") if ":" in part else (part, "", "")
+        hosts.append((host.strip(), port.strip() or default_port))
+    return hosts
+
+
+def client_key(request: Any) -> Optional[str]:
+    """Identifica al cliente (token o cookie de acceso; si no, su IP) sin guardar el token."""
+    if request is None:
+        return None
+    token = None
+    try:
+        auth = request.headers.get("authorization") or ""
+        parts = auth.split()
+        if len(parts) == 2 and parts[0].lower() == "bearer":
+            token = parts[1]
+        token = token or request.cookies.get("access_token")
+    except Exception:
+        token = None
+    if token:
+        return "t:" + hashlib.sha1(token.encode("utf-8")).hexdigest()
+    client = getattr(request, "client", None)
+    return f"ip:{client.host}" if client is not None and client.host else None
+
+
+class Replica:
+    def __init__(self, host: str, port: str) -> None:
+        self.host = host
+        self.port = port
+        self.label = f"{host}:{port}"
+        self.session_factory: Any = None
+        self.async_session_factory: Any = None
+        self.unhealthy_until = 0.0
+        self.failures = 0
+        self.selected = 0
+        self.last_error: Optional[str] = None
+
+    def healthy(self, now: float) -> bool:
+        return now >= self.unhealthy_until
+
+
+class ReplicaSet:
+    """Replicas de lectura en round-robin.
+
+    Cada sesion se asigna a una replica sin conectar; una replica que falla
+    al abrir la conexion (en la primera consulta) queda fuera ``retry_seconds``
+    (el doble en cada fallo seguido, hasta 10 minutos); mientras no haya
+    ninguna sana las lecturas van al primario.
+    """
+
+    def __init__(self, hosts: List[Tuple[str, str]], retry_seconds: float = 30.0) -> None:
+        self.replicas = [Replica(host, port) for host, port in hosts]
+        self.retry_seconds = retry_seconds
+        self._cycle = itertools.count()
+        self._lock = threading.Lock()
+        self.primary_fallbacks = 0
+
+    def __len__(self) -> int:
+        return len(self.replicas)
+
+    def candidates(self) -> List[Replica]:
+        """Replicas sanas, empezando por la siguiente en el turno."""
+        if not self.replicas:
+            return []
+        now = time.monotonic()
+        start = next(self._cycle) % len(self.replicas)
+        ordered = self.replicas[start:] + self.replicas[:start]
+        healthy = [r for r in ordered if r.healthy(now)]
+        if not healthy:
+            with self._lock:
+                self.primary_fallbacks += 1
+        return healthy
+
+    def mark_selected(self, replica: Replica) -> None:
+        with self._lock:
+            replica.selected += 1
+
+    def mark_ok(self, replica: Replica) -> None:
+        with self._lock:
+            replica.failures = 0
+
+    def mark_failed(self, replica: Replica, exc: BaseException) -> None:
+        with self._lock:
+            replica.failures += 1
+            backoff = min(600.0, self.retry_seconds * (2 ** (replica.failures - 1)))
+            replica.unhealthy_until = time.monotonic() + backoff
+            replica.last_error = str(exc)[:200]
+        logger.warning("Replica %s no disponible (%s); fuera %.0f s", replica.label, exc, backoff)
+
+    def info(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "replicas": [
+                {
+                    "host": r.label,
+                    "healthy": r.healthy(now),
+                    "retry_in": round(max(0.0, r.unhealthy_until - now), 1),
+                    "failures": r.failures,
+                    "selected": r.selected,
+                    "last_error": r.last_error,
+                }
+                for r in self.replicas
+            ],
+            "primary_fallbacks": self.primary_fallbacks,
+        }
+
+
+class StickyWrites:
+    """Clientes que escribieron hace menos de ``seconds``: leen del primario (read-your-writes)."""
+
+    def __init__(self, seconds: float) -> None:
+        self.seconds = seconds
+        self._until: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def mark(self, key: str) -> None:
+        if not key or self.seconds <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if len(self._until) > 10000:
+                self._until = {k: v for k, v in self._until.items() if v > now}
+            self._until[key] = now + self.seconds
+
+    def active(self, key: Optional[str]) -> bool:
+        if not key:
+            return False
+        until = self._until.get(key)
+        return until is not None and until > time.monotonic()
+
+    def info(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {"seconds": self.seconds, "active_clients": sum(1 for v in self._until.values() if v > now)}
@@ -0,0 +1,200 @@
+import logging
+import threading
+import time
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from sqlalchemy import MetaData, Table, inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+
+logger = logging.getLogger(__name__)
+
+
+def _engine_of(bind: Any) -> Engine:
+    if isinstance(bind, Connection):
+        bind = bind.engine
+    if getattr(bind.dialect, "is_async", False):
+        # Sesiones de get_async_db: se refleja con el motor sincrono, que sirve fuera de run_sync.
+        from db import engine
+
+        return engine
+    return bind
+
+
+class SchemaRegistry:
+    """Catalogo del esquema reflejado una sola vez y compartido por todas las rutas.
+
+    Guarda la existencia de tablas, sus columnas, PKs y los objetos ``Table``
+    reflejados. Solo vuelve a consultar el catalogo en ``refresh()``.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self._engine: Optional[Engine] = None
+        self._tables: FrozenSet[str] = frozenset()
+        self._extensions: FrozenSet[str] = frozenset()
+        self._functions: FrozenSet[str] = frozenset()
+        self._columns: Dict[str, FrozenSet[str]] = {}
+        self._pks: Dict[str, List[str]] = {}
+        self._reflected: Dict[str, Optional[Table]] = {}
+        self._metadata = MetaData()
+        self._loaded_at: Optional[float] = None
+        self.version = 0
+
+    def refresh(self, bind: Any) -> "SchemaRegistry":
+        engine = _engine_of(bind)
+        insp = inspect(engine)
+        names = set(insp.get_table_names())
+        try:
+            names.update(insp.get_view_names())
+        except Exception:
+            pass
+        extensions, functions = self._load_pg_catalog(engine)
+        with self._lock:
+            self._engine = engine
+            self._tables = frozenset(names)
+            self._extensions = extensions
+            self._functions = functions
+            self._columns = {}
+            self._pks = {}
+            self._reflected = {}
+            self._metadata = MetaData()
+            self._loaded_at = time.time()
+            self.version += 1
+        logger.info("Esquema reflejado: %d tablas (version %d)", len(names), self.version)
+        return self
+
+    @staticmethod
+    def _load_pg_catalog(engine: Engine) -> Tuple[FrozenSet[str], FrozenSet[str]]:
+        if engine.dialect.name != "postgresql":
+            return frozenset(), frozenset()
+        try:
+            with engine.connect() as conn:
+                extensions = {r[0] for r in conn.execute(text("SELECT extname FROM pg_extension"))}
+                functions = {
+                    r[0]
+                    for r in conn.execute(
+                        text(
+                            "SELECT p.proname FROM pg_proc p "
+                            "JOIN pg_namespace n ON n.oid = p.pronamespace "
+                            "WHERE n.nspname = 'public'"
+                        )
+                    )
+                }
+            return frozenset(extensions), frozenset(functions)
+        except Exception as exc:
+            logger.warning("No se pudieron leer extensiones/funciones de PostgreSQL: %s", exc)
+            return frozenset(), frozenset()
+
+    def ensure(self, bind: Any) -> "SchemaRegistry":
+        if self._loaded_at is None:
+            with self._lock:
+                if self._loaded_at is None:
+                    self.refresh(bind)
+        return self
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded_at is not None
+
+    def table_names(self) -> FrozenSet[str]:
+        return self._tables
+
+    def has_table(self, name: str) -> bool:
+        return name in self._tables
+
+    def has_extension(self, name: str) -> bool:
+        return name in self._extensions
+
+    def has_function(self, name: str) -> bool:
+        return name in self._functions
+
+    def columns(self, name: str) -> FrozenSet[str]:
+        if not self.has_table(name):
+            return frozenset()
+        cached = self._columns.get(name)
+        if cached is not None:
+            return cached
+        with self._lock:
+            cached = self._columns.get(name)
+            if cached is None:
+                tbl = self.table(name)
+                if tbl is not None:
+                    cached = frozenset(c.name for c in tbl.columns)
+                else:
+                    cached = frozenset(col["name"] for col in inspect(self._engine).get_columns(name))
+                self._columns[name] = cached
+        return cached
+
+    def pk_columns(self, name: str) -> List[str]:
+        if not self.has_table(name):
+            return []
+        cached = self._pks.get(name)
+        if cached is not None:
+            return list(cached)
+        with self._lock:
+            cached = self._pks.get(name)
+            if cached is None:
+                tbl = self.table(name)
+                if tbl is not None and tbl.primary_key is not None and len(tbl.primary_key.columns):
+                    cached = [c.name for c in tbl.primary_key.columns]
+                else:
+                    pk = inspect(self._engine).get_pk_constraint(name) or {}
+                    cached = list(pk.get("constrained_columns") or [])
+                self._pks[name] = cached
+        return list(cached)
+
+    def table(self, name: str) -> Optional[Table]:
+        if not name or not self.has_table(name):
+            return None
+        if name in self._reflected:
+            return self._reflected[name]
+        with self._lock:
+            if name not in self._reflected:
+                try:
+                    self._reflected[name] = Table(name, self._metadata, autoload_with=self._engine)
+                except Exception as exc:
+                    logger.warning("No se pudo reflejar la tabla %s: %s", name, exc)
+                    self._reflected[name] = None
+        return self._reflected[name]
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "loaded_at": self._loaded_at,
+            "tables": sorted(self._tables),
+            "extensions": sorted(self._extensions),
+            "reflected": sorted(name for name, tbl in self._reflected.items() if tbl is not None),
+        }
+
+
+schema_registry = SchemaRegistry()
+
+
+def get_schema(bind: Any) -> SchemaRegistry:
+    """Devuelve el registro global, reflejando el esquema en el primer uso."""
+    return schema_registry.ensure(bind)
+
+
+def load_schema_registry_at_startup() -> None:
+    from db import engine
+
+    try:
+        schema_registry.refresh(engine)
+    except Exception as exc:
+        logger.warning("No se pudo reflejar el esquema al iniciar; se reintentara en la primera peticion: %s", exc)
+
+
+def coerce_to_column(column: Any, value: Any) -> Any:
+    """Convierte un id recibido como texto (ruta de la URL) al tipo Python de la columna.
+
+    asyncpg no castea: ``'5'`` contra una PK entera falla en Postgres en vez de no coincidir.
+    Lanza ``ValueError`` si el texto no puede ser de ese tipo (por ejemplo ``'abc'`` para un entero).
+    """
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return value
+    if python_type is int and isinstance(value, str):
+        return int(value.strip())
+    return value
@@ -0,0 +1,264 @@
+import json
+import logging
+import logging.handlers
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Deque, Dict, List, Optional
+
+from utils.sql_instrumentation import add_statement_observer
+
+
+logger = logging.getLogger(__name__)
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def slow_query_enabled() -> bool:
+    return os.getenv("SLOW_QUERY_LOG", "true").lower() in {"1", "true", "yes"}
+
+
+def slow_query_ms() -> float:
+    return max(0.0, _env_float("SLOW_QUERY_MS", 200.0))
+
+
+def explain_sample_rate() -> float:
+    return min(1.0, max(0.0, _env_float("SLOW_QUERY_EXPLAIN_RATE", 0.1)))
+
+
+def explain_cooldown() -> float:
+    # Como mucho un EXPLAIN por forma de consulta en este intervalo.
+    return max(0.0, _env_float("SLOW_QUERY_EXPLAIN_COOLDOWN", 300.0))
+
+
+def _log_path() -> str:
+    default = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "logs", "slow_queries.log")
+    return os.getenv("SLOW_QUERY_LOG_PATH", default)
+
+
+_MAX_SHAPES = 2000
+_RECENT = 50
+_EXPLAIN_TIMEOUT_MS = 5000
+
+
+def redact(value: Any) -> Any:
+    """Numeros, fechas y nulos se conservan; el texto (emails, hashes, busquedas) solo deja su largo."""
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, (str, bytes)):
+        return f"<{type(value).__name__} len={len(value)}>"
+    if isinstance(value, dict):
+        return {k: redact(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        items = list(value)
+        return [redact(v) for v in items[:10]] + ([f"<+{len(items) - 10}>"] if len(items) > 10 else [])
+    return f"<{type(value).__name__}>"
+
+
+_DOLLAR_PARAM_RE = re.compile(r"\$(\d+)")
+
+
+def _to_driver_call(statement: str, parameters: Any, paramstyle: str):
+    """Adapta una consulta de asyncpg ($1, $2...) al estilo de psycopg2 (%s)."""
+    if paramstyle != "numeric_dollar":
+        return statement, parameters
+    params = list(parameters or ())
+    ordered: List[Any] = []
+
+    def _sub(match: "re.Match[str]") -> str:
+        ordered.append(params[int(match.group(1)) - 1])
+        return "%s"
+
+    return _DOLLAR_PARAM_RE.sub(_sub, statement.replace("%", "%%")), tuple(ordered)
+
+
+class SlowQuerySampler:
+    """Tiempo acumulado por forma de consulta y muestras de las lentas con su plan.
+
+    Cada consulta que supera ``SLOW_QUERY_MS`` se escribe (parametros
+    redactados) en un log rotativo. Una fraccion ``SLOW_QUERY_EXPLAIN_RATE``
+    de los SELECT lentos se repite con ``EXPLAIN (ANALYZE, BUFFERS)`` en otra
+    conexion y en un hilo aparte, para no alargar la peticion.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.shapes: Dict[str, Dict[str, Any]] = {}
+        self.recent: Deque[Dict[str, Any]] = deque(maxlen=_RECENT)
+        self._last_explain: Dict[str, float] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+        self._file_logger: Optional[logging.Logger] = None
+        self.slow_count = 0
+        self.explains = 0
+        self.explain_errors = 0
+
+    def _get_file_logger(self) -> logging.Logger:
+        if self._file_logger is None:
+            path = _log_path()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            file_logger = logging.getLogger(f"{__name__}.file")
+            file_logger.propagate = False
+            file_logger.setLevel(logging.INFO)
+            if not file_logger.handlers:
+                handler = logging.handlers.RotatingFileHandler(
+                    path,
+                    maxBytes=max(1024, int(_env_float("SLOW_QUERY_LOG_BYTES", 5 * 1024 * 1024))),
+                    backupCount=max(1, int(_env_float("SLOW_QUERY_LOG_BACKUPS", 3))),
+                    encoding="utf-8",
+                )
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                file_logger.addHandler(handler)
+            self._file_logger = file_logger
+        return self._file_logger
+
+    def observe(self, conn: Any, statement: str, shape: str, parameters: Any, executemany: bool, elapsed_ms: float) -> None:
+        if not slow_query_enabled() or conn.info.get("mb_explain") or statement.lstrip()[:7].upper() == "EXPLAIN":
+            return
+        with self._lock:
+            entry = self.shapes.get(shape)
+            if entry is None:
+                if len(self.shapes) >= _MAX_SHAPES:
+                    # Se descarta la forma con menos tiempo acumulado.
+                    del self.shapes[min(self.shapes, key=lambda k: self.shapes[k]["total_ms"])]
+                entry = self.shapes[shape] = {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "slow": 0}
+            entry["count"] += 1
+            entry["total_ms"] += elapsed_ms
+            entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+            is_slow = elapsed_ms >= slow_query_ms()
+            if is_slow:
+                entry["slow"] += 1
+                self.slow_count += 1
+        if is_slow:
+            self._record_slow(conn, shape, statement, parameters, executemany, elapsed_ms)
+
+    def _record_slow(self, conn: Any, shape: str, statement: str, parameters: Any, executemany: bool, elapsed_ms: float) -> None:
+        sample = {
+            "ts": round(time.time(), 3),
+            "ms": round(elapsed_ms, 2),
+            "statement": shape,
+            "params": redact(parameters),
+            "engine": str(conn.engine.url.host or conn.engine.url.database or ""),
+        }
+        with self._lock:
+            self.recent.append(sample)
+        if self._should_explain(shape, statement, executemany):
+            self._submit_explain(conn, shape, statement, parameters, sample)
+        else:
+            self._write(sample)
+
+    def _should_explain(self, shape: str, statement: str, executemany: bool) -> bool:
+        # ANALYZE ejecuta la consulta: solo SELECT y solo en PostgreSQL.
+        keyword = (statement.split(None, 1) or [""])[0].upper()
+        if executemany or keyword not in {"SELECT", "WITH"}:
+            return False
+        if random.random() >= explain_sample_rate():
+            return False
+        now = time.monotonic()
+        with self._lock:
+            last = self._last_explain.get(shape)
+            if last is not None and now - last < explain_cooldown():
+                return False
+            if self._pending >= 4:
+                return False
+            self._last_explain[shape] = now
+            self._pending += 1
+        return True
+
+    def _submit_explain(self, conn: Any, shape: str, statement: str, parameters: Any, sample: Dict[str, Any]) -> None:
+        engine = conn.engine
+        if engine.dialect.name != "postgresql":
+            with self._lock:
+                self._pending -= 1
+            self._write(sample)
+            return
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slow-query-explain")
+            executor = self._executor
+        paramstyle = engine.dialect.paramstyle
+        if getattr(engine.dialect, "is_async", False):
+            # El plan se saca con el motor sincrono (psycopg2) contra la misma BD.
+            from db import engine as explain_engine
+        else:
+            explain_engine = engine
+        executor.submit(self._run_explain, explain_engine, statement, parameters, paramstyle, sample)
+
+    def _run_explain(self, engine: Any, statement: str, parameters: Any, paramstyle: str, sample: Dict[str, Any]) -> None:
+        try:
+            sql, params = _to_driver_call(statement, parameters, paramstyle)
+            with engine.connect() as explain_conn:
+                explain_conn.info["mb_explain"] = True
+                try:
+                    with explain_conn.begin() as tx:
+                        explain_conn.exec_driver_sql(f"SET LOCAL statement_timeout = {_EXPLAIN_TIMEOUT_MS}")
+                        rows = explain_conn.exec_driver_sql("EXPLAIN (ANALYZE, BUFFERS) " + sql, params or ()).fetchall()
+                        tx.rollback()
+                finally:
+                    explain_conn.info.pop("mb_explain", None)
+            sample["plan"] = [row[0] for row in rows]
+            with self._lock:
+                self.explains += 1
+        except Exception as exc:
+            sample["plan_error"] = str(exc)[:300]
+            with self._lock:
+                self.explain_errors += 1
+        finally:
+            with self._lock:
+                self._pending -= 1
+            self._write(sample)
+
+    def _write(self, sample: Dict[str, Any]) -> None:
+        try:
+            self._get_file_logger().info(json.dumps(sample, ensure_ascii=False, default=str))
+        except Exception as exc:
+            logger.warning("No se pudo escribir el log de consultas lentas: %s", exc)
+
+    def top(self, limit: int = 20, order: str = "total_ms") -> List[Dict[str, Any]]:
+        with self._lock:
+            items = [dict(v, statement=k) for k, v in self.shapes.items()]
+        for item in items:
+            item["mean_ms"] = round(item["total_ms"] / item["count"], 3) if item["count"] else None
+            item["total_ms"] = round(item["total_ms"], 2)
+            item["max_ms"] = round(item["max_ms"], 2)
+        key = order if order in {"total_ms", "max_ms", "count", "slow", "mean_ms"} else "total_ms"
+        items.sort(key=lambda it: -(it.get(key) or 0))
+        return items[:limit]
+
+    def info(self, limit: int = 20, order: str = "total_ms") -> Dict[str, Any]:
+        with self._lock:
+            recent = list(self.recent)[-10:]
+        return {
+            "enabled": slow_query_enabled(),
+            "threshold_ms": slow_query_ms(),
+            "explain_rate": explain_sample_rate(),
+            "log_path": _log_path(),
+            "shapes": len(self.shapes),
+            "slow": self.slow_count,
+            "explains": self.explains,
+            "explain_errors": self.explain_errors,
+            "top": self.top(limit, order),
+            "recent_slow": list(reversed(recent)),
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self.shapes = {}
+            self.recent.clear()
+            self.slow_count = 0
+            self.explains = 0
+            self.explain_errors = 0
+            self._last_explain = {}
+
+
+slow_query_sampler = SlowQuerySampler()
+add_statement_observer(slow_query_sampler.observe)
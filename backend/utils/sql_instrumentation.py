@@ -0,0 +1,186 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import event
+
+
+logger = logging.getLogger(__name__)
+
+
+def sql_instrumentation_enabled() -> bool:
+    return os.getenv("SQL_INSTRUMENTATION", "true").lower() in {"1", "true", "yes"}
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return max(1, int(os.getenv(name, str(default))))
+    except ValueError:
+        return default
+
+
+def query_budget() -> int:
+    return _env_int("SQL_QUERY_BUDGET", 25)
+
+
+def repeat_threshold() -> int:
+    return _env_int("SQL_REPEAT_THRESHOLD", 5)
+
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?\b")
+_PARAM_RE = re.compile(r"%\(\w+\)s|%s|\$\d+|:\w+|\?")
+_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """Consulta sin literales ni parametros: dos ejecuciones con distinto id tienen la misma forma."""
+    shape = _STRING_RE.sub("?", statement or "")
+    shape = _PARAM_RE.sub("?", shape)
+    shape = _NUMBER_RE.sub("?", shape)
+    shape = _IN_LIST_RE.sub("(?...)", shape)
+    return _SPACE_RE.sub(" ", shape).strip()
+
+
+class RequestSQLStats:
+    """Consultas de una peticion: cuantas, cuanto tiempo y cuantas veces se repite cada forma."""
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_ms = 0.0
+        self.shapes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, shape: str, elapsed_ms: float) -> None:
+        with self._lock:
+            self.queries += 1
+            self.db_ms += elapsed_ms
+            self.shapes[shape] = self.shapes.get(shape, 0) + 1
+
+    def repeated(self, threshold: int) -> List[Dict[str, Any]]:
+        return [
+            {"count": count, "statement": shape[:200]}
+            for shape, count in sorted(self.shapes.items(), key=lambda kv: -kv[1])
+            if count > threshold
+        ]
+
+    def flags(self) -> List[str]:
+        flags: List[str] = []
+        if self.queries > query_budget():
+            flags.append("query_budget")
+        if any(count > repeat_threshold() for count in self.shapes.values()):
+            flags.append("repeated_statement")
+        return flags
+
+
+_current: ContextVar[Optional[RequestSQLStats]] = ContextVar("mathbot_sql_stats", default=None)
+
+
+def current_sql_stats() -> Optional[RequestSQLStats]:
+    return _current.get()
+
+
+# Funciones (conn, statement, shape, parameters, executemany, elapsed_ms) llamadas tras cada consulta.
+_observers: List[Callable[..., None]] = []
+
+
+def add_statement_observer(fn: Callable[..., None]) -> None:
+    if fn not in _observers:
+        _observers.append(fn)
+
+
+def instrument_sql(engine: Any) -> None:
+    """Suma cada consulta de ``engine`` (o ``AsyncEngine.sync_engine``) a la peticion en curso."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("mb_query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get("mb_query_started")
+        if not started:
+            return
+        elapsed_ms = (time.perf_counter() - started.pop()) * 1000.0
+        stats = _current.get()
+        if stats is None and not _observers:
+            return
+        # La forma se calcula una sola vez por consulta y se comparte con los observadores.
+        shape = statement_shape(statement)
+        if stats is not None:
+            stats.record(shape, elapsed_ms)
+        for observer in _observers:
+            try:
+                observer(conn, statement, shape, parameters, executemany, elapsed_ms)
+            except Exception:
+                logger.debug("Observador de consultas fallo", exc_info=True)
+
+
+class SQLTimingMiddleware:
+    """Middleware ASGI: ``Server-Timing`` con las consultas de cada peticion y un log JSON por peticion.
+
+    Se marca la peticion cuando supera ``SQL_QUERY_BUDGET`` consultas o repite
+    la misma forma de consulta mas de ``SQL_REPEAT_THRESHOLD`` veces (N+1).
+    """
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope.get("type") != "http" or not sql_instrumentation_enabled():
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestSQLStats()
+        token = _current.set(stats)
+        status = {"code": 500}
+
+        async def _send(message) -> None:
+            if message["type"] == "http.response.start":
+                status["code"] = message.get("status", 500)
+                total_ms = (time.perf_counter() - stats.started) * 1000.0
+                timing = (
+                    f'db;dur={stats.db_ms:.1f};desc="{stats.queries} consultas", '
+                    f"app;dur={total_ms:.1f}"
+                )
+                if stats.flags():
+                    timing += f', sql-flag;desc="{"+".join(stats.flags())}"'
+                headers = list(message.get("headers") or [])
+                headers.append((b"server-timing", timing.encode("latin-1")))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            _current.reset(token)
+            self._log(scope, stats, status["code"])
+
+    @staticmethod
+    def _log(scope, stats: RequestSQLStats, status_code: int) -> None:
+        flags = stats.flags()
+        if not stats.queries and not flags:
+            return
+        record = {
+            "event": "sql_request",
+            "method": scope.get("method"),
+            "path": scope.get("path"),
+            "status": status_code,
+            "queries": stats.queries,
+            "db_ms": round(stats.db_ms, 2),
+            "total_ms": round((time.perf_counter() - stats.started) * 1000.0, 2),
+        }
+        if flags:
+            record["flags"] = flags
+            record["repeated"] = stats.repeated(repeat_threshold())
+            logger.warning(json.dumps(record, ensure_ascii=False))
+        else:
+            logger.info(json.dumps(record, ensure_ascii=False))
@@ -14,7 +14,6 @@ from sqlalchemy import (
     and_,
     delete as sa_delete,
     func,
-    inspect,
     or_,
     select,
     update as sa_update,
@@ -26,6 +25,7 @@ from utils.accounts_repo import (
     reflect_alumnos_table,
     reflect_user_table,
 )
+from utils.schema_registry import get_schema
 
 
 _DEF_TEACHER_TABLE = "docentes"
@@ -73,14 +73,14 @@ def get_teacher_students_mapping() -> Dict[str, str]:
 
 
 def _ensure_teacher_tables(engine: Engine) -> None:
-    insp = inspect(engine)
+    schema = get_schema(engine)
     tm = get_teacher_mapping()
     lm = get_teacher_students_mapping()
     metadata = MetaData()
 
     created = False
 
-    if not insp.has_table(tm["table"]):
+    if not schema.has_table(tm["table"]):
         Table(
             tm["table"],
             metadata,
@@ -93,7 +93,7 @@ def _ensure_teacher_tables(engine: Engine) -> None:
         )
         created = True
 
-    if not insp.has_table(lm["table"]):
+    if not schema.has_table(lm["table"]):
         Table(
             lm["table"],
             metadata,
@@ -106,28 +106,19 @@ def _ensure_teacher_tables(engine: Engine) -> None:
 
     if created:
         metadata.create_all(engine)
+        schema.refresh(engine)
 
 
 def reflect_teacher_table(engine: Engine) -> Tuple[Optional[Table], Dict[str, str]]:
     _ensure_teacher_tables(engine)
     tm = get_teacher_mapping()
-    metadata = MetaData()
-    try:
-        table = Table(tm["table"], metadata, autoload_with=engine)
-        return table, tm
-    except Exception:
-        return None, tm
+    return get_schema(engine).table(tm["table"]), tm
 
 
 def reflect_teacher_students_table(engine: Engine) -> Tuple[Optional[Table], Dict[str, str]]:
     _ensure_teacher_tables(engine)
     lm = get_teacher_students_mapping()
-    metadata = MetaData()
-    try:
-        table = Table(lm["table"], metadata, autoload_with=engine)
-        return table, lm
-    except Exception:
-        return None, lm
+    return get_schema(engine).table(lm["table"]), lm
 
 
 def _normalize_years(values: Optional[Sequence[Any]]) -> List[int]:
@@ -1,10 +1,12 @@
 import os
 from typing import List, Optional, Tuple, Dict, Any
 
-from sqlalchemy import MetaData, Table, inspect, select, or_, text
+from sqlalchemy import Table, select, or_
 from sqlalchemy.engine import Engine
 from sqlalchemy.orm import Session
 
+from utils.schema_registry import coerce_to_column, get_schema
+
 
 _LIKELY_USER_TABLES = [
     # prioridad: alumnos
@@ -30,8 +32,7 @@ _EMAIL_COLS = ["correo", "correo_electronico", "email", "mail"]
 
 def _choose_users_table_name(engine: Engine) -> Optional[str]:
     configured = (os.getenv("USERS_TABLE") or os.getenv("ALUMNOS_TABLE") or "").strip()
-    insp = inspect(engine)
-    tables = set(insp.get_table_names(schema="public"))
+    tables = get_schema(engine).table_names()
     if configured:
         if configured in tables:
             return configured
@@ -46,12 +47,13 @@ def reflect_users_table(engine: Engine) -> Tuple[Optional[Table], Optional[str],
     table_name = _choose_users_table_name(engine)
     if not table_name:
         return None, None, []
-    md = MetaData()
-    tbl = Table(table_name, md, autoload_with=engine, schema=None)
+    schema = get_schema(engine)
+    tbl = schema.table(table_name)
+    if tbl is None:
+        return None, None, []
 
     # Primary key column (first pk if composite)
-    insp = inspect(engine)
-    pk_cols = insp.get_pk_constraint(table_name, schema=None).get("constrained_columns") or []
+    pk_cols = schema.pk_columns(table_name)
     pk = pk_cols[0] if pk_cols else None
 
     # Safe columns: all except sensitive
@@ -84,7 +86,12 @@ def get_user_by_id(db: Session, user_id: Any) -> Optional[Dict[str, Any]]:
     tbl, pk, safe = reflect_users_table(engine)
     if tbl is None or not pk:
         return None
-    q = select(tbl).where(getattr(tbl.c, pk) == user_id).limit(1)
+    col = getattr(tbl.c, pk)
+    try:
+        user_id = coerce_to_column(col, user_id)
+    except ValueError:
+        return None
+    q = select(tbl).where(col == user_id).limit(1)
     row = db.execute(q).fetchone()
     if not row:
         return None
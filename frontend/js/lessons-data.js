@@ -222,6 +222,306 @@
 
 
 
+  // Carpeta con el catalogo exportado por utils/export_static_catalogue.py (CDN / hosting estatico)
+
+
+
+  function getStaticBase(){
+
+
+
+    try {
+
+
+
+      const saved = window.MATHBOT_STATIC_LESSONS || localStorage.getItem('mb_static_lessons');
+
+
+
+      return saved ? String(saved).replace(/\/+$/, '') : '';
+
+
+
+    } catch (err) {
+
+
+
+      return '';
+
+
+
+    }
+
+
+
+  }
+
+
+
+
+
+
+
+  // Ultimo manifest.json leido: tambien indica donde esta el detalle de cada leccion
+
+
+
+  let staticManifest = null;
+
+
+
+
+
+
+
+  async function fetchStaticManifest(staticBase){
+
+
+
+    const manifestResp = await fetch(`${staticBase}/manifest.json`, { cache: 'no-cache' });
+
+
+
+    if (!manifestResp.ok) {
+
+
+
+      throw new Error(`HTTP ${manifestResp.status}`);
+
+
+
+    }
+
+
+
+    staticManifest = await manifestResp.json();
+
+
+
+    return staticManifest;
+
+
+
+  }
+
+
+
+
+
+
+
+  async function fetchStaticCatalogue(staticBase){
+
+
+
+    const manifest = await fetchStaticManifest(staticBase);
+
+
+
+    const entry = manifest && manifest.catalogue && manifest.catalogue['*'];
+
+
+
+    if (!entry || !entry.path) {
+
+
+
+      throw new Error('manifest sin catalogo');
+
+
+
+    }
+
+
+
+    const resp = await fetch(`${staticBase}/${entry.path}`);
+
+
+
+    if (!resp.ok) {
+
+
+
+      throw new Error(`HTTP ${resp.status}`);
+
+
+
+    }
+
+
+
+    return resp.json();
+
+
+
+  }
+
+
+
+
+
+
+
+  async function fetchCataloguePayload(apiBase){
+
+
+
+    const staticBase = getStaticBase();
+
+
+
+    if (staticBase) {
+
+
+
+      try {
+
+
+
+        return await fetchStaticCatalogue(staticBase);
+
+
+
+      } catch (err) {
+
+
+
+        console.warn('MathBotLessons static catalogue unavailable, using API', err);
+
+
+
+      }
+
+
+
+    }
+
+
+
+    const resp = await fetch(`${apiBase}/lessons/`);
+
+
+
+    if (!resp.ok) {
+
+
+
+      throw new Error(`HTTP ${resp.status}`);
+
+
+
+    }
+
+
+
+    return resp.json();
+
+
+
+  }
+
+
+
+
+
+
+
+  // Detalle de una leccion: el archivo del manifest estatico si existe; si no, la API
+
+
+
+  async function fetchLessonDetail(lessonId){
+
+
+
+    const staticBase = getStaticBase();
+
+
+
+    if (staticBase) {
+
+
+
+      try {
+
+
+
+        const manifest = staticManifest || await fetchStaticManifest(staticBase);
+
+
+
+        const entry = manifest && manifest.lessons && manifest.lessons[String(lessonId)];
+
+
+
+        if (entry && entry.path) {
+
+
+
+          const staticResp = await fetch(`${staticBase}/${entry.path}`);
+
+
+
+          if (staticResp.ok) {
+
+
+
+            return await staticResp.json();
+
+
+
+          }
+
+
+
+        }
+
+
+
+      } catch (err) {
+
+
+
+        console.warn('MathBotLessons static lesson unavailable, using API', err);
+
+
+
+      }
+
+
+
+    }
+
+
+
+    const resp = await fetch(`${getApiBase()}/lessons/${lessonId}`);
+
+
+
+    if (!resp.ok) {
+
+
+
+      throw new Error(`HTTP ${resp.status}`);
+
+
+
+    }
+
+
+
+    return resp.json();
+
+
+
+  }
+
+
+
+
+
+
+
   function getCachedRawLessons(){
 
 
@@ -621,31 +921,11 @@ function applyNormalizedData(normalized) {
 
 
 
-      const url = `${apiBase}/lessons/`;
-
-
-
       try {
 
 
 
-        const resp = await fetch(url);
-
-
-
-        if (!resp.ok) {
-
-
-
-          throw new Error(`HTTP ${resp.status}`);
-
-
-
-        }
-
-
-
-        const payload = await resp.json();
+        const payload = await fetchCataloguePayload(apiBase);
 
 
 
@@ -893,6 +1173,10 @@ function applyNormalizedData(normalized) {
 
 
 
+    fetchLessonDetail,
+
+
+
     getUnitsByArea,
 
 
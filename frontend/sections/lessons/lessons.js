@@ -4050,7 +4050,7 @@ window.initLessonsSection = function() {
 
 
 
-  async function openLesson(unitId, topicId, lesson) {
+  // Con lessons-data.js cargado el detalle sale del catalogo estatico (CDN) cuando esta exportado
 
 
 
@@ -4058,7 +4058,7 @@ window.initLessonsSection = function() {
 
 
 
-    const unit = getUnitById(unitId);
+  async function fetchLessonDetail(lessonId) {
 
 
 
@@ -4066,7 +4066,7 @@ window.initLessonsSection = function() {
 
 
 
-    const topic = getTopicById(unit, topicId);
+    if (window.MathBotLessons && typeof window.MathBotLessons.fetchLessonDetail === 'function') {
 
 
 
@@ -4074,7 +4074,7 @@ window.initLessonsSection = function() {
 
 
 
-    if (!unit || !topic) {
+      return window.MathBotLessons.fetchLessonDetail(lessonId);
 
 
 
@@ -4082,7 +4082,7 @@ window.initLessonsSection = function() {
 
 
 
-      openUnitsView();
+    }
 
 
 
@@ -4090,7 +4090,7 @@ window.initLessonsSection = function() {
 
 
 
-      return;
+    const response = await fetch(`${API_BASE}/lessons/${lessonId}`);
 
 
 
@@ -4098,8 +4098,7 @@ window.initLessonsSection = function() {
 
 
 
-    }
-
+    if (!response.ok) {
 
 
 
@@ -4107,6 +4106,7 @@ window.initLessonsSection = function() {
 
 
 
+      throw new Error(`HTTP ${response.status}`);
 
 
 
@@ -4114,7 +4114,7 @@ window.initLessonsSection = function() {
 
 
 
-    state.view = 'lesson-detail';
+    }
 
 
 
@@ -4122,7 +4122,7 @@ window.initLessonsSection = function() {
 
 
 
-    state.currentUnitId = unitId;
+    return response.json();
 
 
 
@@ -4130,7 +4130,7 @@ window.initLessonsSection = function() {
 
 
 
-    state.currentTopicId = topicId;
+  }
 
 
 
@@ -4138,7 +4138,6 @@ window.initLessonsSection = function() {
 
 
 
-    state.currentLessonId = lesson.id;
 
 
 
@@ -4147,6 +4146,7 @@ window.initLessonsSection = function() {
 
 
 
+  async function openLesson(unitId, topicId, lesson) {
 
 
 
@@ -4154,7 +4154,7 @@ window.initLessonsSection = function() {
 
 
 
-    const cacheKey = cacheKeyFor(lesson.id);
+    const unit = getUnitById(unitId);
 
 
 
@@ -4162,7 +4162,7 @@ window.initLessonsSection = function() {
 
 
 
-    const cached = cacheKey !== null ? state.lessonCache.get(cacheKey) : null;
+    const topic = getTopicById(unit, topicId);
 
 
 
@@ -4170,7 +4170,7 @@ window.initLessonsSection = function() {
 
 
 
-    if (cached) {
+    if (!unit || !topic) {
 
 
 
@@ -4178,7 +4178,7 @@ window.initLessonsSection = function() {
 
 
 
-      render();
+      openUnitsView();
 
 
 
@@ -4210,7 +4210,7 @@ window.initLessonsSection = function() {
 
 
 
-    render();
+    state.view = 'lesson-detail';
 
 
 
@@ -4218,7 +4218,7 @@ window.initLessonsSection = function() {
 
 
 
-    setStatus('Cargando leccion...', 'loading');
+    state.currentUnitId = unitId;
 
 
 
@@ -4226,6 +4226,7 @@ window.initLessonsSection = function() {
 
 
 
+    state.currentTopicId = topicId;
 
 
 
@@ -4233,8 +4234,8 @@ window.initLessonsSection = function() {
 
 
 
+    state.currentLessonId = lesson.id;
 
-    try {
 
 
 
@@ -4242,7 +4243,6 @@ window.initLessonsSection = function() {
 
 
 
-      const response = await fetch(`${API_BASE}/lessons/${lesson.id}`);
 
 
 
@@ -4250,7 +4250,7 @@ window.initLessonsSection = function() {
 
 
 
-      if (!response.ok) {
+    const cacheKey = cacheKeyFor(lesson.id);
 
 
 
@@ -4258,7 +4258,7 @@ window.initLessonsSection = function() {
 
 
 
-        throw new Error(`HTTP ${response.status}`);
+    const cached = cacheKey !== null ? state.lessonCache.get(cacheKey) : null;
 
 
 
@@ -4266,7 +4266,71 @@ window.initLessonsSection = function() {
 
 
 
-      }
+    if (cached) {
+
+
+
+
+
+
+
+      render();
+
+
+
+
+
+
+
+      return;
+
+
+
+
+
+
+
+    }
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+    render();
+
+
+
+
+
+
+
+    setStatus('Cargando leccion...', 'loading');
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+    try {
 
 
 
@@ -4274,7 +4338,7 @@ window.initLessonsSection = function() {
 
 
 
-      const detail = await response.json();
+      const detail = await fetchLessonDetail(lesson.id);
 
 
 